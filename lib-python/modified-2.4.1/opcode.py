@@ -191,5 +191,12 @@ EXTENDED_ARG = 143
 def_op('CALL_LIKELY_BUILTIN', 144)    # #args + (#kwargs << 8)
 def_op('LOOKUP_METHOD', 145)          # Index in name list
 def_op('CALL_METHOD', 146)            # #args not including 'self'
+# pypy modification, superinstructions (pypy/interpreter/superinstructions.py)
+def_op('LOAD_FAST_LOAD_FAST', 147)    # Local variable number
+haslocal.append(147)
+def_op('LOAD_FAST_LOAD_ATTR', 148)    # Local variable number
+haslocal.append(148)
+def_op('COMPARE_OP_JUMP_IF_FALSE', 149)   # Comparison operator
+hascompare.append(149)
 
 del def_op, name_op, jrel_op, jabs_op
@@ -1,10 +1,11 @@
 from __future__ import generators
 
-from types import FunctionType
+from types import FunctionType, CodeType
 from pypy.tool.ansi_print import ansi_log, raise_nicer_exception
 from pypy.annotation import model as annmodel
 from pypy.tool.pairtype import pair
 from pypy.annotation.bookkeeper import Bookkeeper
+from pypy.annotation.worklist import SCHEDULES, FixpointProfile
 from pypy.annotation import signature
 from pypy.objspace.flow.model import Variable, Constant
 from pypy.objspace.flow.model import FunctionGraph
@@ -17,6 +18,30 @@ from pypy.tool.error import format_blocked_annotation_error, format_someobject_e
 
 FAIL = object()
 
+def flowed_from(func):
+    """Return what the flow graph of 'func' is built from: its bytecode,
+    constants and names, its default arguments and the content of its
+    closure.  Unlike the code object itself, this ignores the line
+    numbers, so that adding a line to a module does not make all the
+    functions below it look changed.
+    """
+    from pypy.objspace.flow.objspace import extract_cell_content
+    if func.func_closure is None:
+        closure = None
+    else:
+        closure = tuple([extract_cell_content(c) for c in func.func_closure])
+    return (_flowed_from_code(func.func_code), func.func_defaults, closure)
+
+def _flowed_from_code(code):
+    consts = []
+    for const in code.co_consts:
+        if isinstance(const, CodeType):   # nested function or class body
+            const = _flowed_from_code(const)
+        consts.append(const)
+    return (code.co_argcount, code.co_flags, code.co_code, tuple(consts),
+            code.co_names, code.co_varnames, code.co_freevars,
+            code.co_cellvars)
+
 class RPythonAnnotator(object):
     """Block annotator for RPython.
     See description in doc/translation.txt."""
@@ -41,6 +66,13 @@ class RPythonAnnotator(object):
         self.notify = {}        # {block: {positions-to-reflow-from-when-done}}
         self.fixed_graphs = {}  # set of graphs not to annotate again
         self.blocked_blocks = {} # set of {blocked_block: graph}
+        # --- the following information is recorded for incremental
+        # --- re-annotation, see reflow_changed_graphs()
+        self.dependencies = {}  # {graph: {graphs-reading-its-result: True}}
+        self.flowed_code = {}   # {graph: flowed_from() of its function}
+        self.dead_blocks = {}   # set of blocks of the rebuilt graphs
+        self.reflowing = None   # set of graphs being re-annotated
+        self.deferred_reflows = {}  # set of position_keys put aside
         # --- the following information is recorded for debugging only ---
         # --- and only if annotation.model.DEBUG is kept to True
         self.why_not_annotated = {} # {block: (exc_type, exc_value, traceback)}
@@ -58,6 +90,12 @@ class RPythonAnnotator(object):
         self.return_bindings = {} # map return Variables to their graphs
         # --- end of debugging information ---
         self.frozen = False
+        config = translator.config.translation
+        self.schedule = SCHEDULES[config.annotation_schedule]()
+        if config.profile_annotation:
+            self.profile = FixpointProfile()
+        else:
+            self.profile = None
         if policy is None:
             from pypy.annotation.policy import AnnotatorPolicy
             self.policy = AnnotatorPolicy()
@@ -69,8 +107,11 @@ class RPythonAnnotator(object):
 
     def __getstate__(self):
         attrs = """translator pendingblocks bindings annotated links_followed
-        notify bookkeeper frozen policy added_blocks""".split()
+        notify bookkeeper frozen policy added_blocks
+        dependencies flowed_code dead_blocks reflowing
+        schedule profile""".split()
         ret = self.__dict__.copy()
+        ret.pop('flowin_block', None)    # only for debugging
         for key, value in ret.items():
             if key not in attrs:
                 assert type(value) is dict, (
@@ -233,17 +274,22 @@ class RPythonAnnotator(object):
             for a in cells:
                 assert isinstance(a, annmodel.SomeObject)
             if block not in self.annotated:
+                if block is graph.startblock and graph not in self.flowed_code:
+                    func = getattr(graph, 'func', None)
+                    if func is not None:
+                        self.flowed_code[graph] = flowed_from(func)
                 self.bindinputargs(graph, block, cells, called_from_graph)
             else:
                 self.mergeinputargs(graph, block, cells, called_from_graph)
             if not self.annotated[block]:
                 self.pendingblocks[block] = graph
+                self.schedule.add(block, graph)
 
     def complete(self):
         """Process pending blocks until none is left."""
         while True:
             while self.pendingblocks:
-                block, graph = self.pendingblocks.popitem()
+                block, graph = self.schedule.pop(self.pendingblocks)
                 if annmodel.DEBUG:
                     self.flowin_block = block # we need to keep track of block
                 self.processblock(graph, block)
@@ -319,6 +365,10 @@ class RPythonAnnotator(object):
     def setbinding(self, arg, s_value, called_from_graph=None, where=None):
         if arg in self.bindings:
             assert s_value.contains(self.bindings[arg])
+            if self.profile is not None and s_value != self.bindings[arg]:
+                position_key = where or getattr(self.bookkeeper,
+                                                'position_key', None)
+                self.profile.generalized(arg, position_key and position_key[0])
             # for debugging purposes, record the history of bindings that
             # have been given to this variable
             if annmodel.DEBUG:
@@ -371,6 +421,7 @@ class RPythonAnnotator(object):
             parent_graph, parent_block, parent_index = position_key = whence
             tag = parent_block, parent_index
             self.translator.update_call_graph(parent_graph, graph, tag)
+            self.dependencies.setdefault(graph, {})[parent_graph] = True
         else:
             position_key = None
         self._register_returnvar(graph)
@@ -401,8 +452,139 @@ class RPythonAnnotator(object):
 
     def reflowfromposition(self, position_key):
         graph, block, index = position_key
+        if block in self.dead_blocks:
+            return    # from a graph replaced by reflow_changed_graphs()
+        if self.reflowing is not None and graph not in self.reflowing:
+            # during reflow_changed_graphs(), only reflow the graphs that
+            # are being re-annotated; the others are done at the end
+            self.deferred_reflows[position_key] = True
+            return
         self.reflowpendingblock(graph, block)
 
+    #___ incremental re-annotation _________________________
+
+    def find_changed_graphs(self):
+        """Return the graphs whose function no longer has the code,
+        default arguments or closure that they were flowed from.  This is
+        the case after the annotator was reloaded from a saved state and
+        the sources were edited."""
+        return [graph for graph, flowed in self.flowed_code.items()
+                      if flowed_from(graph.func) != flowed]
+
+    def reflow_changed_graphs(self, graphs):
+        """Incremental annotation: flow the given graphs again from the
+        current code of their functions, and then, as long as the return
+        annotation of a reflowed graph did not simply stay the same or get
+        more general, reflow its callers too.  All other graphs keep their
+        annotations, which are only generalized if needed, as usual.  The
+        graph objects themselves are kept (and updated in-place) because
+        the rest of the annotator and the bookkeeper refer to them.
+
+        Note that the annotations of instance attributes are never made
+        smaller.  Returns the set of graphs that have been reflowed.
+        """
+        assert not self.frozen
+        for graph in graphs:
+            if graph in self.fixed_graphs:
+                raise AnnotatorError("%s was already rtyped, cannot "
+                                     "annotate it again" % (graph,))
+        saved = self.added_blocks
+        self.added_blocks = {}
+        self.reflowing = reflowed = {}
+        try:
+            todo = dict.fromkeys(graphs)
+            rebuild = True
+            while todo:
+                old_results = {}
+                for graph in todo:
+                    old_results[graph] = self.binding(graph.getreturnvar(),
+                                                      None)
+                    reflowed[graph] = True
+                for graph in todo:
+                    if rebuild:
+                        self._rebuild_graph(graph)
+                    else:
+                        self._forget_bindings(graph)
+                        self.addpendinggraph(graph, self._inputcells(graph))
+                self.complete()
+                rebuild = False
+                todo = {}
+                for graph, s_old in old_results.items():
+                    s_new = self.binding(graph.getreturnvar())
+                    if s_old is not None and s_new.contains(s_old):
+                        continue    # the callers can be reflowed normally
+                    for caller in self.dependencies.get(graph, {}):
+                        if (caller not in reflowed and
+                            caller not in self.fixed_graphs):
+                            todo[caller] = True
+            # now the positions that have been put aside
+            self.reflowing = None
+            for position_key in self.deferred_reflows.keys():
+                if position_key[0] not in reflowed:
+                    self.reflowfromposition(position_key)
+            self.complete()
+
+            new_blocks = {}
+            for graph in graphs:
+                for block in graph.iterblocks():
+                    new_blocks[block] = True
+            self.simplify(block_subset=new_blocks)
+        finally:
+            self.added_blocks = saved
+            self.reflowing = None
+            self.deferred_reflows.clear()
+        return reflowed
+
+    def _inputcells(self, graph):
+        return [self.binding(v) for v in graph.getargs()]
+
+    def _forget_bindings(self, graph):
+        # forget everything about the graph, apart from the annotations
+        # of its input arguments
+        for block in graph.iterblocks():
+            self.annotated.pop(block, None)
+            self.pendingblocks.pop(block, None)
+            self.blocked_blocks.pop(block, None)
+            for v in block.getvariables():
+                if block is not graph.startblock or v not in block.inputargs:
+                    self.bindings.pop(v, None)
+        for link in graph.iterlinks():
+            self.links_followed.pop(link, None)
+            for v in link.getextravars():
+                self.bindings.pop(v, None)
+
+    def _rebuild_graph(self, graph):
+        # build a fresh graph from the current code and move its content
+        # into 'graph'; the old blocks are forgotten
+        newgraph = self.translator.buildflowgraph(graph.func)
+        self.translator.graphs.remove(newgraph)
+        if (newgraph.signature != graph.signature or
+            len(newgraph.getargs()) != len(graph.getargs())):
+            raise AnnotatorError("the signature of %s changed, cannot "
+                                 "annotate it incrementally" % (graph,))
+        inputcells = self._inputcells(graph)
+        self._forget_bindings(graph)
+        for block in graph.iterblocks():
+            self.dead_blocks[block] = True
+        for v in graph.getargs():
+            self.bindings.pop(v, None)
+        callpositions = self.notify.pop(graph.returnblock, None)
+        if callpositions is not None:
+            self.notify[newgraph.returnblock] = callpositions
+        callgraph = self.translator.callgraph
+        for key, (caller, callee) in callgraph.items():
+            if caller is graph:
+                del callgraph[key]
+
+        name, tag = graph.name, graph.tag
+        graph.startblock = newgraph.startblock
+        graph.returnblock = newgraph.returnblock
+        graph.exceptblock = newgraph.exceptblock
+        graph.__dict__.update(newgraph.__dict__)
+        graph.name, graph.tag = name, tag
+        self.flowed_code[graph] = flowed_from(graph.func)
+        self.addpendinggraph(graph, inputcells)
+
 
     #___ simplification (should be moved elsewhere?) _______
 
@@ -471,6 +653,8 @@ class RPythonAnnotator(object):
         self.annotated[block] = graph
         if block in self.blocked_blocks:
             del self.blocked_blocks[block]
+        if self.profile is not None:
+            start = self.profile.start_block()
         try:
             self.flowin(graph, block)
         except BlockedInference, e:
@@ -481,6 +665,8 @@ class RPythonAnnotator(object):
             if not hasattr(e, '__annotator_block'):
                 setattr(e, '__annotator_block', block)
             raise
+        if self.profile is not None:
+            self.profile.end_block(graph, block, start)
 
         # The dict 'added_blocks' is used by rpython.annlowlevel to
         # detect which are the new blocks that annotating an additional
@@ -492,6 +678,7 @@ class RPythonAnnotator(object):
         assert not self.frozen
         assert graph not in self.fixed_graphs
         self.pendingblocks[block] = graph
+        self.schedule.add(block, graph)
         assert block in self.annotated
         self.annotated[block] = False  # must re-flow
         self.blocked_blocks[block] = graph
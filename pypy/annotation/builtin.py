@@ -672,6 +672,7 @@ BUILTIN_ANALYZERS[llmemory.raw_malloc_usage] = raw_malloc_usage
 BUILTIN_ANALYZERS[llmemory.raw_free] = raw_free
 BUILTIN_ANALYZERS[llmemory.raw_memclear] = raw_memclear
 BUILTIN_ANALYZERS[llmemory.raw_memcopy] = raw_memcopy
+BUILTIN_ANALYZERS[llmemory.raw_memmove] = raw_memcopy
 
 #_________________________________
 # offsetof/sizeof
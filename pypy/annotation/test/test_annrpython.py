@@ -17,6 +17,7 @@ from pypy.rlib.rarithmetic import r_uint, base_int, r_longlong, r_ulonglong
 from pypy.rlib.rarithmetic import r_singlefloat
 from pypy.rlib import objectmodel
 from pypy.objspace.flow.objspace import FlowObjSpace
+from pypy.tool.error import AnnotatorError
 
 from pypy.translator.test import snippet
 
@@ -3040,6 +3041,147 @@ class TestAnnotateTestCase:
 
         a.build_types(f, [str])
 
+    def test_reflow_changed_graph(self):
+        def g(x):
+            return x + 1
+        def g_new(x):
+            return str(x)
+        def f(x):
+            return g(x)
+        def h(x):
+            return x * 2
+        def main(x):
+            return f(x), h(x)
+
+        a = self.RPythonAnnotator()
+        s = a.build_types(main, [int])
+        assert isinstance(s.items[0], annmodel.SomeInteger)
+        assert a.find_changed_graphs() == []
+        g.func_code = g_new.func_code
+        graph = graphof(a, g)
+        assert a.find_changed_graphs() == [graph]
+        reflowed = a.reflow_changed_graphs([graph])
+        assert graphof(a, g) is graph
+        assert graph in reflowed
+        # the result of 'f' and 'main' changes too, but 'h' is not reflowed
+        assert graphof(a, f) in reflowed and graphof(a, main) in reflowed
+        assert graphof(a, h) not in reflowed
+        assert a.find_changed_graphs() == []
+        [op] = [op for block in graph.iterblocks()
+                   for op in block.operations]
+        assert op.opname == 'str'
+        s = a.binding(graphof(a, main).getreturnvar())
+        assert isinstance(s.items[0], annmodel.SomeString)
+        assert isinstance(s.items[1], annmodel.SomeInteger)
+
+    def test_reflow_changed_graph_same_result(self):
+        def g(x):
+            return x + 1
+        def g_new(x):
+            return x - 1
+        def f(x):
+            return g(x)
+
+        a = self.RPythonAnnotator()
+        a.build_types(f, [int])
+        g.func_code = g_new.func_code
+        reflowed = a.reflow_changed_graphs(a.find_changed_graphs())
+        assert reflowed.keys() == [graphof(a, g)]
+        [op] = graphof(a, g).startblock.operations
+        assert op.opname == 'sub'
+
+    def test_reflow_changed_graph_attribute_readers(self):
+        class A:
+            pass
+        def setx(a):
+            a.x = 5
+        def setx_new(a):
+            a.x = 5.5
+        def getx(a):
+            return a.x
+        def f():
+            a = A()
+            setx(a)
+            return getx(a)
+
+        a = self.RPythonAnnotator()
+        s = a.build_types(f, [])
+        assert s.knowntype is int
+        setx.func_code = setx_new.func_code
+        reflowed = a.reflow_changed_graphs(a.find_changed_graphs())
+        assert graphof(a, getx) in reflowed
+        s = a.binding(graphof(a, f).getreturnvar())
+        assert s.knowntype is float
+
+    def test_reflow_changed_graph_signature(self):
+        def g(x):
+            return x
+        def g_new(x, y):
+            return x
+        def f(x):
+            return g(x)
+
+        a = self.RPythonAnnotator()
+        a.build_types(f, [int])
+        g.func_code = g_new.func_code
+        py.test.raises(AnnotatorError, a.reflow_changed_graphs,
+                       a.find_changed_graphs())
+
+    def test_find_changed_graphs_ignores_line_numbers(self):
+        source = py.code.Source('''
+            def g(x, y=1):
+                return x + y
+        ''')
+        def compile_g(firstline):
+            d = {}
+            code = compile('\n' * firstline + str(source), 'mod.py', 'exec')
+            exec code in d
+            return d['g']
+        g = compile_g(0)
+        def f(x):
+            return g(x)
+
+        a = self.RPythonAnnotator()
+        a.build_types(f, [int])
+        # a line was added above 'g': the code is the same otherwise
+        new_code = compile_g(1).func_code
+        assert new_code.co_firstlineno == g.func_code.co_firstlineno + 1
+        g.func_code = new_code
+        assert a.find_changed_graphs() == []
+        assert a.reflow_changed_graphs(a.find_changed_graphs()) == {}
+        # but a new default argument changes the graph
+        g.func_defaults = (2,)
+        assert a.find_changed_graphs() == [graphof(a, g)]
+
+def test_flowed_from():
+    from pypy.annotation.annrpython import flowed_from
+    def make(source):
+        d = {}
+        exec py.code.Source(source).compile() in d
+        return d['f']
+    f = make("""
+        def f(x):
+            return lambda y: x + y
+    """)
+    f_moved = make("""
+
+
+        def f(x):
+            return lambda y: x + y
+    """)
+    f_edited = make("""
+        def f(x):
+            return lambda y: x - y
+    """)
+    assert f.func_code != f_moved.func_code      # co_firstlineno differs
+    assert flowed_from(f) == flowed_from(f_moved)
+    assert flowed_from(f) != flowed_from(f_edited)
+    def g(x=5):
+        return f(x)
+    before = flowed_from(g)
+    g.func_defaults = (6,)
+    assert flowed_from(g) != before
+
 def g(n):
     return [0,1,2,n]
 
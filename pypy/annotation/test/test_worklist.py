@@ -0,0 +1,90 @@
+import autopath
+from pypy.annotation.worklist import SCHEDULES, FixpointProfile
+from pypy.annotation.worklist import reverse_postorder
+from pypy.translator.translator import TranslationContext, graphof
+from pypy.translator.test import snippet
+
+
+def test_reverse_postorder():
+    t = TranslationContext()
+    graph = t.buildflowgraph(snippet.while_func)
+    numbering = reverse_postorder(graph)
+    blocks = list(graph.iterblocks())
+    assert len(numbering) == len(blocks)
+    assert numbering[graph.startblock] == 0
+    assert sorted(numbering.values()) == range(len(blocks))
+    # all links go to higher numbers, apart from the loop's back-edge
+    backward = [link for link in graph.iterlinks()
+                     if numbering[link.target] <= numbering[link.prevblock]]
+    assert len(backward) == 1
+
+def test_schedules_pop_everything():
+    t = TranslationContext()
+    graph1 = t.buildflowgraph(snippet.while_func)
+    graph2 = t.buildflowgraph(snippet.poor_man_range)
+    for name, cls in SCHEDULES.items():
+        schedule = cls()
+        pendingblocks = {}
+        expected = {}
+        for graph in [graph1, graph2]:
+            for block in graph.iterblocks():
+                pendingblocks[block] = graph
+                schedule.add(block, graph)
+                schedule.add(block, graph)    # duplicate entries are fine
+                expected[block] = graph
+        del pendingblocks[graph1.startblock]   # stale entry
+        del expected[graph1.startblock]
+        result = {}
+        while pendingblocks:
+            block, graph = schedule.pop(pendingblocks)
+            assert block not in result
+            result[block] = graph
+        assert result == expected
+
+def test_rpo_schedule_order():
+    t = TranslationContext()
+    graph = t.buildflowgraph(snippet.while_func)
+    numbering = reverse_postorder(graph)
+    schedule = SCHEDULES['rpo']()
+    pendingblocks = {}
+    blocks = list(graph.iterblocks())
+    blocks.reverse()
+    for block in blocks:
+        pendingblocks[block] = graph
+        schedule.add(block, graph)
+    order = []
+    while pendingblocks:
+        block, _ = schedule.pop(pendingblocks)
+        order.append(numbering[block])
+    assert order == range(len(blocks))
+
+def test_annotation_independent_of_schedule():
+    results = {}
+    for name in SCHEDULES:
+        t = TranslationContext()
+        t.config.translation.annotation_schedule = name
+        t.config.translation.profile_annotation = True
+        a = t.buildannotator()
+        s = a.build_types(snippet.call_five, [])
+        assert s.knowntype is list
+        results[name] = s.listdef.listitem.s_value
+        profile = a.profile
+        graph = graphof(t, snippet._append_five)
+        assert profile.graph_blocks[graph] >= 1
+        assert profile.reflows[graph.startblock] >= 1
+        lines = profile.format_report()
+        assert lines[0].startswith('%d blocks in %d graphs' % (
+            len(profile.reflows), len(profile.graph_times)))
+    for s_item in results.values():
+        assert s_item == results['dict']
+
+def test_profile_counters():
+    profile = FixpointProfile()
+    profile.generalized('v1', None)
+    profile.generalized('v1', 'graph')
+    profile.generalized('v2', None)
+    assert profile.generalizations == {'v1': 2, 'v2': 1}
+    assert profile.variable_graphs == {'v1': 'graph'}
+    lines = profile.format_report()
+    assert "3 generalizations of 2 variables" in lines
+    assert "       2  v1 in graph" in lines
@@ -0,0 +1,197 @@
+"""
+Scheduling of the annotator's pending blocks, and profiling counters
+for the fixpoint computation.
+
+The annotator keeps its pending blocks in 'annotator.pendingblocks', a
+dict {block: graph}.  A schedule object decides in which order they are
+processed: every time a block is put in the dict, add() is called, and
+pop() must remove and return a (block, graph) pair from the dict.  The
+schedule may keep stale entries of its own, it must just check that they
+are still in the dict before returning them.
+"""
+
+import time
+from heapq import heappush, heappop
+
+
+class DictOrderSchedule(object):
+    """Process the pending blocks in the dict's order (the historical
+    behavior)."""
+
+    def add(self, block, graph):
+        pass
+
+    def pop(self, pendingblocks):
+        return pendingblocks.popitem()
+
+
+class ReversePostorderSchedule(object):
+    """Finish the current graph before switching to another one, and
+    within a graph process the blocks in reverse postorder, so that the
+    input bindings of a block are usually complete when it is analysed.
+    The other graphs are taken in the order in which they got pending
+    blocks."""
+
+    def __init__(self):
+        self.heaps = {}        # {graph: heap of (rpo-index, block)}
+        self.numbering = {}    # {graph: {block: rpo-index}}
+        self.graphs = []       # graphs in the order they got pending blocks
+        self.current = None
+
+    def add(self, block, graph):
+        try:
+            index = self.numbering[graph][block]
+        except KeyError:
+            self.numbering[graph] = numbering = reverse_postorder(graph)
+            index = numbering.get(block, len(numbering))
+        heap = self.heaps.get(graph)
+        if heap is None:
+            heap = self.heaps[graph] = []
+            self.newgraph(graph)
+        heappush(heap, (index, block))
+
+    def newgraph(self, graph):
+        self.graphs.append(graph)
+
+    def nextgraph(self):
+        graph = self.graphs[0]
+        del self.graphs[0]
+        return graph
+
+    def pop(self, pendingblocks):
+        while True:
+            graph = self.current
+            heap = self.heaps.get(graph)
+            if not heap:
+                if heap is not None:
+                    del self.heaps[graph]
+                if not self.graphs:
+                    # nothing known about the pending blocks, e.g. the
+                    # annotator was reloaded from a saved state
+                    return pendingblocks.popitem()
+                self.current = graph = self.nextgraph()
+                heap = self.heaps.get(graph)
+                if heap is None:
+                    continue
+            index, block = heappop(heap)
+            if pendingblocks.get(block) is graph:
+                del pendingblocks[block]
+                return block, graph
+
+
+class CalleeFirstSchedule(ReversePostorderSchedule):
+    """Like ReversePostorderSchedule, but always switch to the graph that
+    most recently got new pending blocks.  These are typically the callees
+    of the block that was just processed: finishing them first gives the
+    caller their final return value, instead of reflowing it each time the
+    value is generalized."""
+
+    def add(self, block, graph):
+        ReversePostorderSchedule.add(self, block, graph)
+        if graph is not self.current:
+            if self.heaps.get(self.current):
+                self.graphs.append(self.current)   # come back to it later
+            self.graphs.append(graph)
+            self.current = graph
+
+    def newgraph(self, graph):
+        pass     # done in add()
+
+    def nextgraph(self):
+        return self.graphs.pop()
+
+
+SCHEDULES = {
+    'dict':         DictOrderSchedule,
+    'rpo':          ReversePostorderSchedule,
+    'callee_first': CalleeFirstSchedule,
+    }
+
+def reverse_postorder(graph):
+    """Return a dict {block: index} numbering the blocks of the graph in
+    reverse postorder."""
+    postorder = []
+    seen = {graph.startblock: True}
+    stack = [(graph.startblock, iter(graph.startblock.exits))]
+    while stack:
+        block, exits = stack[-1]
+        for link in exits:
+            if link.target not in seen:
+                seen[link.target] = True
+                stack.append((link.target, iter(link.target.exits)))
+                break
+        else:
+            del stack[-1]
+            postorder.append(block)
+    numbering = {}
+    count = len(postorder)
+    for i in range(count):
+        numbering[postorder[i]] = count - 1 - i
+    return numbering
+
+# ____________________________________________________________
+
+class FixpointProfile(object):
+    """Counters about the work done by the annotator: how many times each
+    block is analysed, how many times the binding of each variable is
+    generalized, and the time spent analysing the blocks of each graph."""
+
+    def __init__(self):
+        self.reflows = {}            # {block: number of times analysed}
+        self.block_graphs = {}       # {block: graph}
+        self.generalizations = {}    # {variable: number of generalizations}
+        self.variable_graphs = {}    # {variable: graph}
+        self.graph_times = {}        # {graph: seconds}
+        self.graph_blocks = {}       # {graph: number of blocks analysed}
+
+    def start_block(self):
+        return time.time()
+
+    def end_block(self, graph, block, start):
+        elapsed = time.time() - start
+        self.reflows[block] = self.reflows.get(block, 0) + 1
+        self.block_graphs[block] = graph
+        self.graph_times[graph] = self.graph_times.get(graph, 0.0) + elapsed
+        self.graph_blocks[graph] = self.graph_blocks.get(graph, 0) + 1
+
+    def generalized(self, v, graph):
+        self.generalizations[v] = self.generalizations.get(v, 0) + 1
+        if graph is not None:
+            self.variable_graphs[v] = graph
+
+    def format_report(self, limit=20):
+        """Return the report as a list of lines."""
+        processed = 0
+        for count in self.reflows.values():
+            processed += count
+        total_time = 0.0
+        for t in self.graph_times.values():
+            total_time += t
+        lines = ["%d blocks in %d graphs analysed %d times (%d reflows), "
+                 "%.1f seconds" % (len(self.reflows), len(self.graph_times),
+                                   processed, processed - len(self.reflows),
+                                   total_time),
+                 "%d generalizations of %d variables" % (
+                     sum(self.generalizations.values()),
+                     len(self.generalizations))]
+
+        lines.append("most reflowed blocks:")
+        for count, block in _top(self.reflows, limit):
+            if count <= 1:
+                break
+            lines.append("  %6d  %s %s" % (count, self.block_graphs[block],
+                                           block.at()))
+        lines.append("most generalized variables:")
+        for count, v in _top(self.generalizations, limit):
+            lines.append("  %6d  %s in %s" % (count, v,
+                                              self.variable_graphs.get(v, '?')))
+        lines.append("slowest graphs:")
+        for t, graph in _top(self.graph_times, limit):
+            lines.append("  %8.3fs  %6d blocks  %s" % (
+                t, self.graph_blocks[graph], graph))
+        return lines
+
+def _top(counters, limit):
+    lst = [(value, key) for key, value in counters.items()]
+    lst.sort(lambda x, y: cmp(y[0], x[0]))
+    return lst[:limit]
@@ -115,6 +115,17 @@ pypy_optiondescription = OptionDescription("objspace", "Object Space Options", [
                              ("translation.stackless", False)]),
         BoolOption("CALL_METHOD", "emit a special bytecode for expr.name()",
                    default=False),
+        BoolOption("LOAD_FAST_LOAD_FAST",
+                   "fuse two consecutive LOAD_FAST into a superinstruction",
+                   default=False),
+        BoolOption("LOAD_FAST_LOAD_ATTR",
+                   "fuse LOAD_FAST followed by LOAD_ATTR into a "
+                   "superinstruction",
+                   default=False),
+        BoolOption("COMPARE_OP_JUMP_IF_FALSE",
+                   "fuse COMPARE_OP, JUMP_IF_FALSE and POP_TOP into a "
+                   "superinstruction",
+                   default=False),
         ]),
 
     BoolOption("nofaking", "disallow faking in the object space",
@@ -168,6 +179,12 @@ pypy_optiondescription = OptionDescription("objspace", "Object Space Options", [
                "make sure that all calls go through space.call_args",
                default=False),
 
+    BoolOption("withframepool",
+               "reuse the frames of functions that returned",
+               default=False,
+               requires=[("translation.stackless", False),
+                         ("objspace.usemodules.pypyjit", False)]),
+
     OptionDescription("std", "Standard Object Space Options", [
         BoolOption("withtproxy", "support transparent proxies",
                    default=True),
@@ -268,6 +285,13 @@ pypy_optiondescription = OptionDescription("objspace", "Object Space Options", [
                    "for testing purposes only.",
                    default=False,
                    requires=[("objspace.std.withmethodcache", True)]),
+        BoolOption("withinlinecache",
+                   "use per-instruction caches for LOAD_GLOBAL and LOAD_ATTR",
+                   default=False,
+                   requires=[("objspace.std.withmultidict", True),
+                             ("objspace.std.withtypeversion", True),
+                             ("translation.rweakref", True)],
+                   suggests=[("objspace.std.withsharingdict", True)]),
         IntOption("methodcachesizeexp",
                   " 2 ** methodcachesizeexp is the size of the of the method cache ",
                   default=11),
@@ -302,6 +326,10 @@ pypy_optiondescription = OptionDescription("objspace", "Object Space Options", [
         BoolOption("optimized_list_getitem",
                    "special case the 'list[integer]' expressions",
                    default=False),
+        BoolOption("withquickening",
+                   "specialize BINARY_ADD, BINARY_SUBSCR and COMPARE_OP "
+                   "to the operand types seen by each instruction",
+                   default=False),
         BoolOption("builtinshortcut",
                    "a shortcut for operations between built-in types",
                    default=False),
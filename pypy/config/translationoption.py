@@ -8,6 +8,7 @@ DEFL_INLINE_THRESHOLD = 32.4    # just enough to inline add__Int_Int()
 # and just small enough to prevend inlining of some rlist functions.
 
 DEFL_PROF_BASED_INLINE_THRESHOLD = 32.4
+DEFL_PROF_BASED_INLINE_HOT_CALLS = 250
 DEFL_CLEVER_MALLOC_REMOVAL_INLINE_THRESHOLD = 32.4
 DEFL_LOW_INLINE_THRESHOLD = DEFL_INLINE_THRESHOLD / 2.0
 
@@ -45,7 +46,7 @@ translation_optiondescription = OptionDescription(
     # gc
     ChoiceOption("gc", "Garbage Collection Strategy",
                  ["boehm", "ref", "marksweep", "semispace", "statistics",
-                  "generation", "hybrid", "none"],
+                  "generation", "hybrid", "markcompact", "none"],
                   "ref", requires={
                      "ref": [("translation.rweakref", False), # XXX
                              ("translation.gctransformer", "ref")],
@@ -56,6 +57,7 @@ translation_optiondescription = OptionDescription(
                      "statistics": [("translation.gctransformer", "framework")],
                      "generation": [("translation.gctransformer", "framework")],
                      "hybrid": [("translation.gctransformer", "framework")],
+                     "markcompact": [("translation.gctransformer", "framework")],
                      "boehm": [("translation.gctransformer", "boehm")],
                      },
                   cmdline="--gc"),
@@ -86,6 +88,10 @@ translation_optiondescription = OptionDescription(
                      "llvmgc": [("translation.gc", "generation")],
                      "asmgcc": [("translation.gc", "generation")],
                  }),
+    BoolOption("gcallocsites",
+               "Record statistics per allocation site (framework GCs only)",
+               default=False, cmdline="--gc-alloc-sites",
+               requires=[("translation.gctransformer", "framework")]),
 
     # other noticeable options
     BoolOption("thread", "enable use of threading primitives",
@@ -102,6 +108,26 @@ translation_optiondescription = OptionDescription(
                cmdline="-d --debug", default=True),
     BoolOption("insist", "Try hard to go on RTyping", default=False,
                cmdline="--insist"),
+    IntOption("rtype_jobs",
+              "Number of processes used to rtype the graphs (UNIX only)",
+              default=1, cmdline="--rtype-jobs"),
+    ChoiceOption("annotation_schedule",
+                 "Order in which the annotator processes pending blocks",
+                 ["dict", "rpo", "callee_first"], default="dict",
+                 cmdline="--annotation-schedule"),
+    BoolOption("profile_annotation",
+               "Count the reflows and time spent by the annotator and "
+               "report them after annotation",
+               default=False, cmdline="--profile-annotation"),
+    ChoiceOption("release_graphs",
+                 "What to do with the flow graphs once the C source is "
+                 "written",
+                 ["keep", "drop", "swap"], default="keep",
+                 cmdline="--release-graphs"),
+    StrOption("timing_report",
+              "Write the time, memory and graph statistics of each "
+              "translation step to this file, in JSON",
+              default=None, cmdline="--timing-report"),
     StrOption("cc", "Specify compiler to use for compiling generated C", cmdline="--cc"),
     StrOption("profopt", "Specify profile based optimization script",
               cmdline="--profopt"),
@@ -117,6 +143,16 @@ translation_optiondescription = OptionDescription(
                   "hintannotate", "timeshift"],
                  default=None, cmdline="--fork-before"),
 
+    StrOption("save_state",
+              "Save the translation state after annotation, rtyping and "
+              "backend optimizations in the given directory",
+              default=None, cmdline="--save-state"),
+    ChoiceOption("resume_from",
+                 "Reload the state saved by --save-state after the given "
+                 "step and continue from there",
+                 ["annotate", "rtype", "backendopt"],
+                 default=None, cmdline="--resume-from"),
+
     ArbitraryOption("instrumentctl", "internal",
                default=None),
     StrOption("output", "Output file name", cmdline="--output"),
@@ -134,6 +170,15 @@ translation_optiondescription = OptionDescription(
                cmdline="--cflags"),
     StrOption("linkerflags", "Specify flags for the linker (C backend only)",
                cmdline="--ldflags"),
+    IntOption("make_jobs", "Specify -j argument to make for compilation"
+              " (C backend only)",
+              default=1, cmdline="--make-jobs"),
+    BoolOption("objcache", "Reuse object files whose preprocessed source "
+               "and compiler flags did not change (C backend only)",
+               default=False, cmdline="--objcache"),
+    BoolOption("computed_goto", "Compile dense switches to a table of "
+               "label addresses with GCC (C backend only)",
+               default=False, cmdline="--computed-goto"),
 
     # Flags of the TranslationContext:
     BoolOption("simplifying", "Simplify flow graphs", default=True),
@@ -148,6 +193,11 @@ translation_optiondescription = OptionDescription(
                "attempt to pre-allocate the list",
                default=False,
                cmdline='--listcompr'),
+    BoolOption("flowgraph_cache",
+               "Keep the simplified flow graphs in an on-disk cache, and "
+               "reuse them while the functions and the objects they "
+               "depend on did not change",
+               default=False, cmdline="--flowgraph-cache"),
     IntOption("withsmallfuncsets",
               "Represent groups of less funtions than this as indices into an array",
                default=0),
@@ -198,6 +248,16 @@ translation_optiondescription = OptionDescription(
                   "for profile based inlining",
                 default="pypy.translator.backendopt.inline.inlining_heuristic",
                 cmdline="--prof-based-inline-heuristic"),
+        IntOption("profile_based_inline_hot_calls",
+                  "A call-site must be called more often than this during "
+                  "the profiling run to be inlined",
+                  default=DEFL_PROF_BASED_INLINE_HOT_CALLS,
+                  cmdline="--prof-based-inline-hot-calls"),
+        ChoiceOption("profile_based_inline_runner",
+                     "How to run the program to count the calls for "
+                     "profile based inlining",
+                     ["c", "llinterp"], default="c",
+                     cmdline="--prof-based-inline-runner"),
         # control clever malloc removal
         BoolOption("clever_malloc_removal",
                    "Drives inlining to remove mallocs in a clever way",
@@ -34,6 +34,11 @@ class W_Root(object):
     def getdictvalue_attr_is_in_class(self, space, w_attr):
         return self.getdictvalue(space, w_attr)
 
+    def get_sharing_dict_impl(self):
+        # for config.objspace.std.withinlinecache: returns the
+        # SharedDictImplementation of the instance dictionary, if any
+        return None
+
     def setdictvalue(self, space, w_attr, w_value, shadows_type=True):
         w_dict = self.getdict()
         if w_dict is not None:
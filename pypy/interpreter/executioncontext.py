@@ -178,6 +178,8 @@ class ExecutionContext:
     def _trace(self, frame, event, w_arg, operr=None):
         if self.is_tracing or frame.hide():
             return
+        # the trace and profile functions get a reference to the frame
+        frame.mark_as_escaped()
 
         space = self.space
         
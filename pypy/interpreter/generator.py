@@ -17,6 +17,7 @@ class GeneratorIterator(Wrappable):
         new_inst = mod.get('generator_new')
         w        = space.wrap
 
+        self.frame.mark_as_escaped()
         tup = [
             w(self.frame),
             w(self.running),
@@ -24,6 +25,12 @@ class GeneratorIterator(Wrappable):
 
         return space.newtuple([new_inst, space.newtuple(tup)])
 
+    def descr_gi_frame(space, self):
+        # the frame of a running generator has the frame of its caller
+        # as f_back, which must not be reused either
+        self.frame.mark_as_escaped()
+        return space.wrap(self.frame)
+
     def descr__iter__(self):
         """x.__iter__() <==> iter(x)"""
         return self.space.wrap(self)
@@ -6,7 +6,7 @@ The bytecode interpreter itself is implemented by the PyFrame class.
 
 import dis, imp, struct, types, new
 
-from pypy.interpreter import eval
+from pypy.interpreter import eval, superinstructions
 from pypy.interpreter.error import OperationError
 from pypy.interpreter.gateway import NoneNotWrapped 
 from pypy.interpreter.baseobjspace import ObjSpace, W_Root
@@ -50,9 +50,14 @@ def cpython_code_signature(code):
 cpython_magic, = struct.unpack("<i", imp.get_magic())
 default_magic = 62061 | 0x0a0d0000 # value for Python 2.4.1
 
+FRAME_POOL_SIZE = 4     # dead frames kept per code object
+
 class PyCode(eval.Code):
     "CPython-style code objects."
 
+    _inline_caches = None    # for config.objspace.std.withinlinecache
+    _frame_pool = None       # for config.objspace.withframepool
+
     def __init__(self, space,  argcount, nlocals, stacksize, flags,
                      code, consts, names, varnames, filename,
                      name, firstlineno, lnotab, freevars, cellvars,
@@ -65,6 +70,8 @@ class PyCode(eval.Code):
         self.co_nlocals = nlocals
         self.co_stacksize = stacksize
         self.co_flags = flags
+        if superinstructions.uses_superinstructions(space):
+            code = superinstructions.rewrite_code(space, code, lnotab)
         self.co_code = code
         self.co_consts_w = consts
         self.co_names_w = [space.new_interned_str(aname) for aname in names]
@@ -109,6 +116,12 @@ class PyCode(eval.Code):
                         self._args_as_cellvars[i] = j
 
         self._compute_fastcall()
+        # generator frames outlive the call, and the frames of the other
+        # code objects without CO_OPTIMIZED have a locals dictionary
+        if (space.config.objspace.withframepool and
+            self.co_flags & CO_OPTIMIZED and
+            not self.co_flags & CO_GENERATOR):
+            self._frame_pool = []
 
     co_names = property(lambda self: [self.space.unwrap(w_name) for w_name in self.co_names_w]) # for trace
 
@@ -172,62 +185,83 @@ class PyCode(eval.Code):
 
         self.fast_natural_arity = self.co_argcount
 
+    def allocate_frame(self, space, w_globals, closure):
+        """Return a new frame for this code object, reusing a dead one
+        if there is one in the pool."""
+        pool = self._frame_pool
+        if pool:
+            frame = pool.pop()
+            frame.reinit(w_globals, closure)
+            return frame
+        return space.createframe(self, w_globals, closure)
+
+    def run_frame(self, frame):
+        """Run a frame returned by allocate_frame().  When it returns
+        normally and no reference to it escaped, put it in the pool."""
+        w_result = frame.run()
+        pool = self._frame_pool
+        if (pool is not None and not frame.escaped and
+            len(pool) < FRAME_POOL_SIZE):
+            frame.clear()
+            pool.append(frame)
+        return w_result
+
     def fastcall_0(self, space, w_func):
-        frame = space.createframe(self, w_func.w_func_globals,
-                                      w_func.closure)
-        return frame.run()
+        frame = self.allocate_frame(space, w_func.w_func_globals,
+                                    w_func.closure)
+        return self.run_frame(frame)
 
     def fastcall_1(self, space, w_func, w_arg):
-        frame = space.createframe(self, w_func.w_func_globals,
-                                  w_func.closure)
+        frame = self.allocate_frame(space, w_func.w_func_globals,
+                                    w_func.closure)
         frame.fastlocals_w[0] = w_arg # frame.setfastscope([w_arg])
-        return frame.run()
+        return self.run_frame(frame)
 
     def fastcall_2(self, space, w_func, w_arg1, w_arg2):
-        frame = space.createframe(self, w_func.w_func_globals,
-                                  w_func.closure)
+        frame = self.allocate_frame(space, w_func.w_func_globals,
+                                    w_func.closure)
         frame.fastlocals_w[0] = w_arg1 # frame.setfastscope([w_arg])
         frame.fastlocals_w[1] = w_arg2
-        return frame.run()
+        return self.run_frame(frame)
 
     def fastcall_3(self, space, w_func, w_arg1, w_arg2, w_arg3):
-        frame = space.createframe(self, w_func.w_func_globals,
-                                  w_func.closure)
+        frame = self.allocate_frame(space, w_func.w_func_globals,
+                                    w_func.closure)
         frame.fastlocals_w[0] = w_arg1 # frame.setfastscope([w_arg])
         frame.fastlocals_w[1] = w_arg2 
         frame.fastlocals_w[2] = w_arg3 
-        return frame.run()
+        return self.run_frame(frame)
 
     def fastcall_4(self, space, w_func, w_arg1, w_arg2, w_arg3, w_arg4):
-        frame = space.createframe(self, w_func.w_func_globals,
-                                  w_func.closure)
+        frame = self.allocate_frame(space, w_func.w_func_globals,
+                                    w_func.closure)
         frame.fastlocals_w[0] = w_arg1 # frame.setfastscope([w_arg])
         frame.fastlocals_w[1] = w_arg2 
         frame.fastlocals_w[2] = w_arg3 
         frame.fastlocals_w[3] = w_arg4 
-        return frame.run()
+        return self.run_frame(frame)
 
     def funcrun(self, func, args):
-        frame = self.space.createframe(self, func.w_func_globals,
-                                  func.closure)
+        frame = self.allocate_frame(self.space, func.w_func_globals,
+                                    func.closure)
         sig = self._signature
         # speed hack
         args_matched = args.parse_into_scope(None, frame.fastlocals_w,
                                              func.name,
                                              sig, func.defs_w)
         frame.init_cells()
-        return frame.run()
+        return self.run_frame(frame)
 
     def funcrun_obj(self, func, w_obj, args):
-        frame = self.space.createframe(self, func.w_func_globals,
-                                  func.closure)
+        frame = self.allocate_frame(self.space, func.w_func_globals,
+                                    func.closure)
         sig = self._signature
         # speed hack
         args_matched = args.parse_into_scope(w_obj, frame.fastlocals_w,
                                              func.name,
                                              sig, func.defs_w)
         frame.init_cells()
-        return frame.run()
+        return self.run_frame(frame)
 
     def getvarnames(self):
         return self.co_varnames
@@ -44,6 +44,9 @@ class PyFrame(eval.Frame):
     instr_lb                 = 0
     instr_ub                 = -1
     instr_prev               = -1
+    # True if a reference to this frame may be kept somewhere, see
+    # mark_as_escaped() and config.objspace.withframepool
+    escaped                  = False
 
     def __init__(self, space, code, w_globals, closure):
         self = hint(self, access_directly=True)
@@ -61,6 +64,45 @@ class PyFrame(eval.Frame):
         self.fastlocals_w = [None]*self.numlocals
         self.f_lineno = self.pycode.co_firstlineno
 
+    def reinit(self, w_globals, closure):
+        """Prepare a frame taken from the pool of dead frames of its
+        code object to run again.  See PyCode.allocate_frame()."""
+        self = hint(self, access_directly=True)
+        self.w_globals = w_globals
+        if self.space.config.objspace.honor__builtins__:
+            self.builtin = self.space.builtin.pick_builtin(w_globals)
+        self.initialize_frame_scopes(closure)
+        self.f_lineno = self.pycode.co_firstlineno
+
+    def clear(self):
+        """Drop all the references kept by a frame that returned,
+        before it goes to the pool of dead frames of its code object."""
+        self.dropvaluesuntil(0)
+        if self.blockstack:
+            self.blockstack = []
+        fastlocals_w = self.fastlocals_w
+        for i in range(len(fastlocals_w)):
+            fastlocals_w[i] = None
+        self.cells = None
+        self.w_locals = None
+        self.w_globals = None
+        self.f_back = None
+        self.last_instr = -1
+        self.last_exception = None
+        self.frame_finished_execution = False
+        self.instr_lb = 0
+        self.instr_ub = -1
+        self.instr_prev = -1
+
+    def mark_as_escaped(self):
+        """Called when a reference to this frame is given away, e.g. to
+        application-level code: neither this frame nor its callers,
+        which are reachable via f_back, can be reused any more."""
+        frame = self
+        while isinstance(frame, PyFrame) and not frame.escaped:
+            frame.escaped = True
+            frame = frame.f_back
+
     def get_builtin(self):
         if self.space.config.objspace.honor__builtins__:
             return self.builtin
@@ -526,7 +568,10 @@ class PyFrame(eval.Frame):
         return self.get_builtin().getdict()
 
     def fget_f_back(space, self):
-        return self.space.wrap(self.f_back)
+        f_back = self.f_back
+        if isinstance(f_back, PyFrame):
+            f_back.mark_as_escaped()
+        return self.space.wrap(f_back)
 
     def fget_f_lasti(space, self):
         return self.space.wrap(self.last_instr)
@@ -546,6 +546,7 @@ class __extend__(pyframe.PyFrame):
         w_prog    = f.popvalue()
         flags = f.space.getexecutioncontext().compiler.getcodeflags(f.pycode)
         w_compile_flags = f.space.wrap(flags)
+        f.mark_as_escaped()
         w_resulttuple = prepare_exec(f.space, f.space.wrap(f), w_prog,
                                      w_globals, w_locals,
                                      w_compile_flags,
@@ -959,6 +960,42 @@ class __extend__(pyframe.PyFrame):
             f.dropvalues(nargs + 1)
         f.pushvalue(w_result)
 
+    # superinstructions, see pypy.interpreter.superinstructions: the
+    # following instructions are still in the bytecode, we only need
+    # to read their argument and to skip them
+
+    def _next_oparg(f, next_instr):
+        co_code = f.pycode.co_code
+        lo = ord(co_code[next_instr + 1])
+        hi = ord(co_code[next_instr + 2])
+        return (hi << 8) | lo
+    _next_oparg._always_inline_ = True
+
+    def LOAD_FAST_LOAD_FAST(f, varindex, next_instr, *ignored):
+        f.LOAD_FAST(varindex)
+        f.last_instr = intmask(next_instr)
+        varindex = f._next_oparg(next_instr)
+        f.LOAD_FAST(varindex)
+        return next_instr + 3
+
+    def LOAD_FAST_LOAD_ATTR(f, varindex, next_instr, *ignored):
+        f.LOAD_FAST(varindex)
+        f.last_instr = intmask(next_instr)
+        nameindex = f._next_oparg(next_instr)
+        f.LOAD_ATTR(nameindex)
+        return next_instr + 3
+
+    def COMPARE_OP_JUMP_IF_FALSE(f, testnum, next_instr, *ignored):
+        f.COMPARE_OP(testnum)
+        f.last_instr = intmask(next_instr)
+        stepby = f._next_oparg(next_instr)
+        next_instr += 3
+        w_cond = f.peekvalue()
+        if not f.space.is_true(w_cond):
+            return next_instr + stepby
+        f.popvalue()        # the POP_TOP
+        return next_instr + 1
+
 ##     def EXTENDED_ARG(f, oparg, *ignored):
 ##         opcode = f.nextop()
 ##         oparg = oparg<<16 | f.nextarg()
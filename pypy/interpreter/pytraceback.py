@@ -47,6 +47,7 @@ class PyTraceback(baseobjspace.Wrappable):
 def record_application_traceback(space, operror, frame, last_instruction):
     if frame.pycode.hidden_applevel:
         return
+    frame.mark_as_escaped()
     lineno = offset2lineno(frame.pycode, last_instruction)
     tb = operror.application_traceback
     tb = PyTraceback(space, frame, last_instruction, lineno, tb)
@@ -0,0 +1,86 @@
+"""
+Superinstructions: a peephole pass over the bytecode of new code objects
+that replaces some frequent sequences of opcodes with a single opcode,
+saving the dispatch overhead of the instructions after the first one:
+
+    LOAD_FAST    x                  LOAD_FAST_LOAD_FAST         x
+    LOAD_FAST    y          =>      (LOAD_FAST)                 y
+
+    LOAD_FAST    x                  LOAD_FAST_LOAD_ATTR         x
+    LOAD_ATTR    name       =>      (LOAD_ATTR)                 name
+
+    COMPARE_OP   op                 COMPARE_OP_JUMP_IF_FALSE    op
+    JUMP_IF_FALSE  target   =>      (JUMP_IF_FALSE)             target
+    POP_TOP                         (POP_TOP)
+
+Only the first opcode byte is changed.  The superinstruction reads the
+argument of the following instructions directly from the bytecode and
+skips over them, but they are left in place: this keeps all offsets,
+jump targets and the line number table valid, and a jump to the middle
+of a sequence still executes the original instructions from there.
+
+Sequences that span several source lines are not rewritten, because the
+trace hook would miss the 'line' events of the instructions skipped.
+See PyFrame.LOAD_FAST_LOAD_FAST & co. for the implementation of the new
+opcodes, which are enabled with config.objspace.opcodes.
+"""
+
+from pypy.tool.stdlib_opcode import opcodedesc, HAVE_ARGUMENT
+
+LOAD_FAST = opcodedesc.LOAD_FAST.index
+LOAD_ATTR = opcodedesc.LOAD_ATTR.index
+COMPARE_OP = opcodedesc.COMPARE_OP.index
+JUMP_IF_FALSE = opcodedesc.JUMP_IF_FALSE.index
+POP_TOP = opcodedesc.POP_TOP.index
+
+
+def uses_superinstructions(space):
+    opt = space.config.objspace.opcodes
+    return (opt.LOAD_FAST_LOAD_FAST or opt.LOAD_FAST_LOAD_ATTR or
+            opt.COMPARE_OP_JUMP_IF_FALSE)
+
+def find_line_starts(lnotab, codesize):
+    """Return a list of booleans telling for each offset of the bytecode
+    if an instruction starting there begins a new source line."""
+    line_starts = [False] * (codesize + 1)
+    addr = 0
+    for i in range(0, len(lnotab) - 1, 2):
+        addr += ord(lnotab[i])
+        if ord(lnotab[i + 1]) != 0 and addr <= codesize:
+            line_starts[addr] = True
+    return line_starts
+
+def rewrite_code(space, code, lnotab):
+    """Return a copy of the bytecode 'code' in which the sequences of
+    opcodes listed above start with the corresponding superinstruction."""
+    opt = space.config.objspace.opcodes
+    n = len(code)
+    line_starts = find_line_starts(lnotab, n)
+    result = None     # the list of characters, made lazily
+    i = 0
+    while i < n:
+        op = ord(code[i])
+        newop = -1
+        if op == LOAD_FAST and i + 6 <= n and not line_starts[i + 3]:
+            nextop = ord(code[i + 3])
+            if nextop == LOAD_FAST and opt.LOAD_FAST_LOAD_FAST:
+                newop = opcodedesc.LOAD_FAST_LOAD_FAST.index
+            elif nextop == LOAD_ATTR and opt.LOAD_FAST_LOAD_ATTR:
+                newop = opcodedesc.LOAD_FAST_LOAD_ATTR.index
+        elif (op == COMPARE_OP and opt.COMPARE_OP_JUMP_IF_FALSE and
+              i + 7 <= n and
+              ord(code[i + 3]) == JUMP_IF_FALSE and
+              ord(code[i + 6]) == POP_TOP and
+              not line_starts[i + 3] and not line_starts[i + 6]):
+            newop = opcodedesc.COMPARE_OP_JUMP_IF_FALSE.index
+        if newop >= 0:
+            if result is None:
+                result = [code[j] for j in range(n)]
+            result[i] = chr(newop)
+        if op >= HAVE_ARGUMENT:
+            i += 3
+        else:
+            i += 1
+    if result is None:
+        return code
+    return ''.join(result)
@@ -0,0 +1,146 @@
+from pypy.conftest import gettestobjspace
+from pypy.interpreter.function import Function
+
+
+class TestFramePool:
+    def setup_class(cls):
+        cls.space = gettestobjspace(**{"objspace.withframepool": True})
+
+    def getcode(self, w_func):
+        return self.space.interp_w(Function, w_func).code
+
+    def test_frame_reused(self):
+        space = self.space
+        w_f = space.appexec([], """():
+            def f(x):
+                y = x + 1
+                return y
+            return f
+        """)
+        code = self.getcode(w_f)
+        assert code._frame_pool == []
+        w_res = space.call_function(w_f, space.wrap(41))
+        assert space.int_w(w_res) == 42
+        [frame] = code._frame_pool
+        assert frame.fastlocals_w == [None, None]
+        assert frame.f_back is None
+        w_res = space.call_function(w_f, space.wrap(1))
+        assert space.int_w(w_res) == 2
+        assert code._frame_pool == [frame]
+
+    def test_escaped_frame_not_reused(self):
+        space = self.space
+        w_f = space.appexec([], """():
+            import sys
+            def f():
+                return sys._getframe()
+            return f
+        """)
+        code = self.getcode(w_f)
+        w_frame = space.call_function(w_f)
+        assert code._frame_pool == []
+
+    def test_gi_frame_f_back_not_reused(self):
+        space = self.space
+        w_res = space.appexec([], """():
+            def gen():
+                yield g.gi_frame.f_back
+            g = gen()
+            def caller():
+                return g.next()
+            return caller, g
+        """)
+        w_caller, w_gen = space.unpackiterable(w_res)
+        w_frame = space.call_function(w_caller)
+        assert self.getcode(w_caller)._frame_pool == []
+        assert space.is_w(space.getattr(w_frame, space.wrap('f_code')),
+                          space.getattr(w_caller, space.wrap('func_code')))
+
+    def test_no_pool_for_generators(self):
+        space = self.space
+        w_f = space.appexec([], """():
+            def f():
+                yield 1
+            return f
+        """)
+        assert self.getcode(w_f)._frame_pool is None
+
+
+class AppTestFramePool:
+    def setup_class(cls):
+        cls.space = gettestobjspace(**{"objspace.withframepool": True})
+
+    def test_recursion(self):
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+        assert fib(15) == 610
+
+    def test_getframe(self):
+        import sys
+        def f():
+            return sys._getframe()
+        def g():
+            return f(), 5
+        frame, x = g()
+        for i in range(5):
+            g()
+        assert frame.f_code is f.func_code
+        assert frame.f_back.f_code is g.func_code
+        assert frame.f_back.f_locals == {}
+
+    def test_traceback(self):
+        import sys
+        def f(x):
+            raise ValueError(x)
+        def g(x):
+            try:
+                f(x)
+            except ValueError:
+                return sys.exc_info()[2]
+        tb = g(42)
+        for i in range(5):
+            g(i)
+        assert tb.tb_next.tb_frame.f_locals == {'x': 42}
+
+    def test_generator_caller_frame(self):
+        def gen():
+            while True:
+                yield g.gi_frame.f_back
+        g = gen()
+        def caller(x):
+            return g.next()
+        frame = caller(42)
+        for i in range(5):
+            caller(i)
+        assert frame.f_code is caller.func_code
+        assert frame.f_locals == {'x': 42}
+
+    def test_locals_not_shared(self):
+        def f(x):
+            return locals()
+        d1 = f(1)
+        d2 = f(2)
+        assert d1 == {'x': 1}
+        assert d2 == {'x': 2}
+
+    def test_closures(self):
+        def f(x):
+            def g():
+                return x
+            return g
+        g1 = f(1)
+        g2 = f(2)
+        assert g1() == 1
+        assert g2() == 2
+
+    def test_loop_return(self):
+        def f(l):
+            for x in l:
+                try:
+                    return x
+                finally:
+                    pass
+        assert f([1, 2]) == 1
+        assert f([3]) == 3
@@ -0,0 +1,118 @@
+from pypy.conftest import gettestobjspace
+from pypy.config.pypyoption import get_pypy_config
+from pypy.interpreter.superinstructions import rewrite_code, find_line_starts
+from pypy.tool.stdlib_opcode import opcodedesc
+
+
+class FakeSpace:
+    def __init__(self, **opcodes):
+        self.config = get_pypy_config(translating=False)
+        for name, value in opcodes.items():
+            setattr(self.config.objspace.opcodes, name, value)
+
+ALL = {'LOAD_FAST_LOAD_FAST': True,
+       'LOAD_FAST_LOAD_ATTR': True,
+       'COMPARE_OP_JUMP_IF_FALSE': True}
+
+def assemble(*instrs):
+    result = []
+    for instr in instrs:
+        if isinstance(instr, tuple):
+            name, arg = instr
+            result.append(chr(getattr(opcodedesc, name).index))
+            result.append(chr(arg & 0xff))
+            result.append(chr(arg >> 8))
+        else:
+            result.append(chr(getattr(opcodedesc, instr).index))
+    return ''.join(result)
+
+
+def test_find_line_starts():
+    lnotab = '\x00\x01\x06\x01\x03\x00\x02\x02'
+    starts = find_line_starts(lnotab, 12)
+    assert [i for i in range(13) if starts[i]] == [0, 6, 11]
+
+def test_rewrite_load_fast_pairs():
+    code = assemble(('LOAD_FAST', 0), ('LOAD_FAST', 1), ('LOAD_FAST', 2),
+                    ('LOAD_ATTR', 3), 'RETURN_VALUE')
+    result = rewrite_code(FakeSpace(**ALL), code, '')
+    expected = assemble(('LOAD_FAST_LOAD_FAST', 0),
+                        ('LOAD_FAST_LOAD_FAST', 1),
+                        ('LOAD_FAST_LOAD_ATTR', 2),
+                        ('LOAD_ATTR', 3), 'RETURN_VALUE')
+    assert result == expected
+    assert len(result) == len(code)
+
+def test_rewrite_compare_op():
+    code = assemble(('LOAD_FAST', 0), ('LOAD_CONST', 1), ('COMPARE_OP', 0),
+                    ('JUMP_IF_FALSE', 4), 'POP_TOP', ('LOAD_CONST', 1),
+                    'RETURN_VALUE', 'POP_TOP', ('LOAD_CONST', 0),
+                    'RETURN_VALUE')
+    result = rewrite_code(FakeSpace(**ALL), code, '')
+    expected = assemble(('LOAD_FAST', 0), ('LOAD_CONST', 1),
+                        ('COMPARE_OP_JUMP_IF_FALSE', 0),
+                        ('JUMP_IF_FALSE', 4), 'POP_TOP', ('LOAD_CONST', 1),
+                        'RETURN_VALUE', 'POP_TOP', ('LOAD_CONST', 0),
+                        'RETURN_VALUE')
+    assert result == expected
+
+def test_rewrite_disabled():
+    code = assemble(('LOAD_FAST', 0), ('LOAD_FAST', 1), ('LOAD_ATTR', 3),
+                    'RETURN_VALUE')
+    space = FakeSpace(LOAD_FAST_LOAD_ATTR=True)
+    result = rewrite_code(space, code, '')
+    assert result == assemble(('LOAD_FAST', 0), ('LOAD_FAST_LOAD_ATTR', 1),
+                              ('LOAD_ATTR', 3), 'RETURN_VALUE')
+    assert rewrite_code(FakeSpace(), code, '') is code
+
+def test_no_rewrite_across_lines():
+    code = assemble(('LOAD_FAST', 0), ('LOAD_FAST', 1), 'RETURN_VALUE')
+    lnotab = '\x03\x01'    # the second LOAD_FAST starts a new line
+    assert rewrite_code(FakeSpace(**ALL), code, lnotab) == code
+
+
+class AppTestSuperinstructions:
+    def setup_class(cls):
+        options = {}
+        for name in ALL:
+            options['objspace.opcodes.' + name] = True
+        cls.space = gettestobjspace(**options)
+
+    def test_rewritten(self):
+        def f(a, b):
+            return a.real + b
+        import dis
+        assert dis.opmap['LOAD_FAST_LOAD_ATTR'] in map(ord, f.func_code.co_code)
+
+    def test_load_fast(self):
+        def f(a, b, c):
+            return a, b, c, a.real, b.imag
+        assert f(1, 2, 3) == (1, 2, 3, 1, 0)
+        def g(a, b):
+            del b
+            return a, b
+        raises(UnboundLocalError, g, 1, 2)
+        def h(a):
+            return a.foobar
+        raises(AttributeError, h, 1)
+
+    def test_compare_op(self):
+        def f(x):
+            if x < 5:
+                return 'small'
+            return 'big'
+        assert f(3) == 'small'
+        assert f(7) == 'big'
+        def g(n):
+            i = 0
+            total = 0
+            while i < n:
+                total += i
+                i += 1
+            return total
+        assert g(10) == 45
+        def h(x):
+            return x < 5 and x > 2
+        assert h(3) is True
+        assert h(1) is False
+        assert h(7) is False
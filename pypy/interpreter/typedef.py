@@ -311,6 +311,17 @@ def _builduserclswithfeature(supercls, *features):
                         return None
                 return space.finditem(w_dict, w_name)
 
+            def get_sharing_dict_impl(self):
+                if self.space.config.objspace.std.withsharingdict:
+                    from pypy.objspace.std import dictmultiobject
+                    w_dict = self.w__dict__
+                    if isinstance(w_dict, dictmultiobject.W_DictMultiObject):
+                        impl = w_dict.implementation
+                        if isinstance(impl,
+                                      dictmultiobject.SharedDictImplementation):
+                            return impl
+                return None
+
         add(Proto)
 
     subcls = type(name, (supercls,), body)
@@ -847,7 +858,7 @@ GeneratorIterator.typedef = TypeDef("generator",
     __iter__   = interp2app(GeneratorIterator.descr__iter__,
                             descrmismatch='__iter__'),
     gi_running = interp_attrproperty('running', cls=GeneratorIterator),
-    gi_frame   = interp_attrproperty('frame', cls=GeneratorIterator),
+    gi_frame   = GetSetProperty(GeneratorIterator.descr_gi_frame),
     __weakref__ = make_weakref_descr(GeneratorIterator),
 )
 
@@ -372,6 +372,9 @@ def getimportlock(space):
 #
 #  * CALL_LIKELY_BUILTIN    +2
 #  * CALL_METHOD            +4
+#  * LOAD_FAST_LOAD_FAST    +8
+#  * LOAD_FAST_LOAD_ATTR    +16
+#  * COMPARE_OP_JUMP_IF_FALSE +32
 #
 #
 MAGIC = 1024 | (ord('\r')<<16) | (ord('\n')<<24)
@@ -383,6 +386,12 @@ def get_pyc_magic(space):
         result += 2
     if space.config.objspace.opcodes.CALL_METHOD:
         result += 4
+    if space.config.objspace.opcodes.LOAD_FAST_LOAD_FAST:
+        result += 8
+    if space.config.objspace.opcodes.LOAD_FAST_LOAD_ATTR:
+        result += 16
+    if space.config.objspace.opcodes.COMPARE_OP_JUMP_IF_FALSE:
+        result += 32
     return result
 
 
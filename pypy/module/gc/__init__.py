@@ -11,5 +11,7 @@ class Module(MixedModule):
         'enable_finalizers': 'interp_gc.enable_finalizers',
         'disable_finalizers': 'interp_gc.disable_finalizers',
         'estimate_heap_size': 'interp_gc.estimate_heap_size',
+        'get_stats': 'interp_gc.get_stats',
+        'dump_alloc_sites': 'interp_gc.dump_alloc_sites',
         'garbage' : 'space.newlist([])',
     }
@@ -21,6 +21,32 @@ def disable_finalizers(space):
     space.user_del_action.finalizers_lock_count += 1
 disable_finalizers.unwrap_spec = [ObjSpace]
 
+def get_stats(space):
+    """Return a list of dicts with numbers about the last collections
+    done by the GC, oldest first.  Empty if the GC does not record them."""
+    count = rgc.collection_stats(-1, 0)
+    stats_w = []
+    index = count - 1
+    while index >= 0 and rgc.collection_stats(index, 0) >= 0:
+        w_stats = space.newdict()
+        space.setitem(w_stats, space.wrap('collection'), space.wrap(index))
+        for i in range(len(rgc.COLLECTION_STATS_FIELDS)):
+            name = rgc.COLLECTION_STATS_FIELDS[i]
+            value = rgc.collection_stats(index, i)
+            space.setitem(w_stats, space.wrap(name), space.wrap(value))
+        stats_w.append(w_stats)
+        index -= 1
+    stats_w.reverse()
+    return space.newlist(stats_w)
+get_stats.unwrap_spec = [ObjSpace]
+
+def dump_alloc_sites(space):
+    """Write the statistics per allocation site recorded by the GC, if
+    PyPy was translated with --gc-alloc-sites.  Meant to be called e.g.
+    from a signal handler on a long-running process."""
+    rgc.dump_alloc_sites()
+dump_alloc_sites.unwrap_spec = [ObjSpace]
+
 # ____________________________________________________________
 
 import sys
@@ -1,3 +1,8 @@
+import py
+from pypy.conftest import gettestobjspace, option
+from pypy.tool.udir import udir
+from pypy.rlib import rgc
+
 class AppTestGC(object):
     def test_collect(self):
         import gc
@@ -63,6 +68,10 @@ class AppTestGC(object):
         else:
             raises(RuntimeError, gc.estimate_heap_size)
 
+    def test_dump_alloc_sites(self):
+        import gc
+        gc.dump_alloc_sites()     # no-op when not translated
+
     def test_enable(self):
         import gc
         assert gc.isenabled()
@@ -73,3 +82,84 @@ class AppTestGC(object):
         gc.enable()
         assert gc.isenabled()
         
+
+
+class FakeStatsGC(object):
+    # stands for the GC's collection_stats() when running on top of CPython
+    def __init__(self):
+        self.events = []
+
+    def collect(self):
+        n = len(self.events)
+        self.events.append([2, 1000 + n, 10 + n, 50, 0, 0, 0, 4096])
+
+    def collection_stats(self, index, field):
+        if index < 0:
+            return len(self.events)
+        if index >= len(self.events):
+            return -1
+        return self.events[index][field]
+
+
+class AppTestGCStats(object):
+    def setup_class(cls):
+        cls.space = gettestobjspace()
+        cls.w_fields = cls.space.wrap(rgc.COLLECTION_STATS_FIELDS)
+        if not option.runappdirect:
+            fakegc = FakeStatsGC()
+            cls.saved = rgc.collect, rgc.collection_stats
+            rgc.collect = fakegc.collect
+            rgc.collection_stats = fakegc.collection_stats
+
+    def teardown_class(cls):
+        if not option.runappdirect:
+            rgc.collect, rgc.collection_stats = cls.saved
+
+    def test_get_stats(self):
+        import gc
+        gc.collect()
+        stats = gc.get_stats()
+        assert len(stats) >= 1
+        entry = stats[-1]
+        assert sorted(entry.keys()) == sorted(['collection'] + self.fields)
+        for value in entry.values():
+            assert isinstance(value, int)
+        assert entry['generation'] >= 2     # gc.collect() is a full one
+        assert entry['pause_us'] >= 0
+        assert entry['heap_size'] > 0
+        numbers = [e['collection'] for e in stats]
+        assert numbers == range(numbers[0], numbers[0] + len(stats))
+        gc.collect()
+        assert gc.get_stats()[-1]['collection'] > entry['collection']
+
+
+class AppTestGCAllocSites(object):
+    def setup_class(cls):
+        if not option.runappdirect:
+            py.test.skip("needs a pypy-c translated with --gc-alloc-sites "
+                         "(run with -A)")
+        cls.space = gettestobjspace()
+        cls.w_path = cls.space.wrap(str(udir.join('test_dump_alloc_sites')))
+
+    def test_dump_alloc_sites(self):
+        import gc, os
+        class A(object):
+            pass
+        def dump():
+            os.environ['PYPY_GC_ALLOC_SITES'] = self.path
+            try:
+                gc.dump_alloc_sites()
+            finally:
+                del os.environ['PYPY_GC_ALLOC_SITES']
+            counts = {}
+            for line in open(self.path):
+                site, numbers = line.split(': ')
+                counts[site] = int(numbers.split()[0][len('count='):])
+            return counts
+        before = dump()
+        assert before, "not translated with --gc-alloc-sites"
+        keep = [A() for i in range(5000)]
+        after = dump()
+        grown = [site for site in after
+                      if after[site] - before.get(site, 0) >= 5000]
+        assert grown
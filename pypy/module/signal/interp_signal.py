@@ -96,9 +96,12 @@ class CheckSignalAction(AsyncAction):
         space = self.space
         ec = space.getexecutioncontext()
         try:
-            w_frame = ec.framestack.top()
+            frame = ec.framestack.top()
         except IndexError:
             w_frame = space.w_None
+        else:
+            frame.mark_as_escaped()
+            w_frame = space.wrap(frame)
         space.call_function(w_handler, space.wrap(n), w_frame)
 
     def report_pending_signals(self):
@@ -33,6 +33,7 @@ purposes only."""
     except ValueError:
         raise OperationError(space.w_ValueError,
                              space.wrap("frame index must not be negative"))
+    f.mark_as_escaped()
     return space.wrap(f)
 
 # directly from the C code in ceval.c, might be moved somewhere else.
@@ -34,6 +34,7 @@ class FlowObjSpace(ObjSpace):
     
     full_exceptions = False
     do_imports_immediately = True
+    foldlog = None     # a list to record the constant-folded operations
 
     def initialize(self):
         import __builtin__
@@ -70,6 +71,7 @@ class FlowObjSpace(ObjSpace):
         # when populating the caches, the flow space switches to
         # "concrete mode".  In this mode, only Constants are allowed
         # and no SpaceOperation is recorded.
+        self.record_fold('cache_building_mode', (), True, None)
         previous_recorder = self.executioncontext.recorder
         self.executioncontext.recorder = flowcontext.ConcreteNoOp()
         self.concrete_mode += 1
@@ -84,6 +86,14 @@ class FlowObjSpace(ObjSpace):
             return Constant({})
         return self.do_operation('newdict')
 
+    def record_fold(self, opname, args, ok, result):
+        """Record in 'foldlog' that the operation 'opname' was computed
+        at flow time on the constant 'args', giving 'result' (or raising
+        the exception class 'result' if 'ok' is False).  The flow graph
+        depends on it; see pypy.translator.tool.flowcache."""
+        if self.foldlog is not None:
+            self.foldlog.append((opname, tuple(args), ok, result))
+
     def newtuple(self, args_w):
         try:
             content = [self.unwrap(w_arg) for w_arg in args_w]
@@ -271,6 +281,7 @@ class FlowObjSpace(ObjSpace):
 ##            result = w_tuple
 ##        else:
         unwrapped = self.unwrap(w_tuple)
+        self.record_fold('unpack', [unwrapped], True, tuple(unwrapped))
         result = tuple([Constant(x) for x in unwrapped])
         if expected_length is not None and len(result) != expected_length:
             raise ValueError, "got a tuple of length %d instead of %d" % (
@@ -280,6 +291,8 @@ class FlowObjSpace(ObjSpace):
     def unpackiterable(self, w_iterable, expected_length=None):
         if not isinstance(w_iterable, Variable):
             l = list(self.unwrap(w_iterable))
+            self.record_fold('unpack', [self.unwrap(w_iterable)], True,
+                             tuple(l))
             if expected_length is not None and len(l) != expected_length:
                 raise ValueError
             return [self.wrap(x) for x in l]
@@ -336,7 +349,9 @@ class FlowObjSpace(ObjSpace):
         except UnwrapException:
             pass
         else:
-            return bool(obj)
+            result = bool(obj)
+            self.record_fold('is_true', [obj], True, result)
+            return result
         w_truthvalue = self.do_operation('is_true', w_obj)
         context = self.getexecutioncontext()
         return context.guessbool(w_truthvalue)
@@ -348,6 +363,7 @@ class FlowObjSpace(ObjSpace):
             pass
         else:
             if isinstance(iterable, unrolling_iterable):
+                self.record_fold('unroll', [iterable], True, None)
                 return self.wrap(iterable.get_unroller())
         w_iter = self.do_operation("iter", w_iterable)
         return w_iter
@@ -637,11 +653,13 @@ def make_op(name, symbol, arity, specialnames):
                     result = op(*args)
                 except:
                     etype, evalue, etb = sys.exc_info()
+                    self.record_fold(name, args, False, etype)
                     msg = "generated by a constant operation:  %s%r" % (
                         name, tuple(args))
                     raise flowcontext.OperationThatShouldNotBePropagatedError(
                         self.wrap(etype), self.wrap(msg))
                 else:
+                    self.record_fold(name, args, True, result)
                     # don't try to constant-fold operations giving a 'long'
                     # result.  The result is probably meant to be sent to
                     # an intmask(), but the 'long' constant confuses the
@@ -28,7 +28,10 @@ def sc_import(space, fn, args):
         try:
             mod = __import__(name, glob, loc, frm)
         except ImportError, e:
+            space.record_fold('import', (name, glob, loc, frm), False,
+                              ImportError)
             raise OperationError(space.w_ImportError, space.wrap(str(e)))
+        space.record_fold('import', (name, glob, loc, frm), True, mod)
         return space.wrap(mod)
     # redirect it, but avoid exposing the globals
     w_glob = Constant({})
@@ -1038,6 +1038,10 @@ def report():
 class W_DictMultiObject(W_Object):
     from pypy.objspace.std.dicttype import dict_typedef as typedef
 
+    # for config.objspace.std.withinlinecache: incremented by every
+    # change of the dictionary, see mutated()
+    version_stamp = 0
+
     def __init__(w_self, space, wary=False, sharing=False):
         if space.config.objspace.opcodes.CALL_LIKELY_BUILTIN and wary:
             w_self.implementation = WaryDictImplementation(space)
@@ -1088,6 +1092,13 @@ class W_DictMultiObject(W_Object):
     def set_str_keyed_item(w_dict, w_key, w_value, shadows_type=True):
         w_dict.implementation = w_dict.implementation.setitem_str(
             w_key, w_value, shadows_type)
+        w_dict.mutated(w_dict.implementation.space)
+
+    def mutated(w_dict, space):
+        # invalidates the inline caches of the LOAD_GLOBAL opcodes
+        # that read from this dictionary
+        if space.config.objspace.std.withinlinecache:
+            w_dict.version_stamp += 1
 
 registerimplementation(W_DictMultiObject)
 
@@ -1107,6 +1118,7 @@ def init__DictMulti(space, w_dict, __args__):
                              space.wrap("dict() takes a sequence of pairs"))
             w_k, w_v = pair
             w_dict.implementation = w_dict.implementation.setitem(w_k, w_v)
+        w_dict.mutated(space)
     else:
         if space.is_true(w_src):
             from pypy.objspace.std.dicttype import update1
@@ -1128,12 +1140,14 @@ def getitem__DictMulti_ANY(space, w_dict, w_lookup):
 
 def setitem__DictMulti_ANY_ANY(space, w_dict, w_newkey, w_newvalue):
     w_dict.implementation = w_dict.implementation.setitem(w_newkey, w_newvalue)
+    w_dict.mutated(space)
 
 def delitem__DictMulti_ANY(space, w_dict, w_lookup):
     try:
         w_dict.implementation = w_dict.implementation.delitem(w_lookup)
     except KeyError:
         raise OperationError(space.w_KeyError, w_lookup)
+    w_dict.mutated(space)
     
 def len__DictMulti(space, w_dict):
     return space.wrap(w_dict.implementation.length())
@@ -1239,6 +1253,7 @@ def dict_itervalues__DictMulti(space, w_self):
 
 def dict_clear__DictMulti(space, w_self):
     w_self.implementation = space.emptydictimpl
+    w_self.mutated(space)
 
 def dict_get__DictMulti_ANY_ANY(space, w_dict, w_lookup, w_default):
     return w_dict.get(w_lookup, w_default)
@@ -1255,7 +1270,8 @@ def dict_pop__DictMulti_ANY(space, w_dict, w_key, w_defaults):
         else:
             raise OperationError(space.w_KeyError, w_key)
     else:
-        w_dict.implementation.delitem(w_key)
+        w_dict.implementation = w_dict.implementation.delitem(w_key)
+        w_dict.mutated(space)
         return w_item
 
 
@@ -0,0 +1,148 @@
+"""
+Per-instruction inline caches for the LOAD_GLOBAL and LOAD_ATTR opcodes.
+
+Every code object gets a list '_inline_caches', created lazily and indexed
+by the offset of the instruction in co_code, which remembers the result
+of the last lookup done by that instruction:
+
+  * LOAD_GLOBAL remembers the value found in the globals or in the
+    built-ins; it is valid as long as the 'version_stamp' of these
+    dictionaries did not change.
+
+  * LOAD_ATTR remembers where the attribute of an instance was found:
+    either at a given index in its sharing dictionary, or as a
+    descriptor in its type.  It is valid as long as the version_tag of
+    the type and the SharedStructure of the instance are the same.
+"""
+
+from pypy.objspace.descroperation import object_getattribute
+from pypy.objspace.std.dictmultiobject import W_DictMultiObject
+
+# This module exports two extra methods for StdObjSpaceFrame implementing
+# the LOAD_GLOBAL and LOAD_ATTR opcodes with inline caches.
+# See pypy.objspace.std.objspace for where these functions are used from.
+
+
+class InlineCacheEntry(object):
+    pass
+
+class GlobalCacheEntry(InlineCacheEntry):
+    w_globals = None
+    globals_version = 0
+    w_builtins = None      # None if the value was found in the globals
+    builtins_version = 0
+    w_value = None
+
+class AttrCacheEntry(InlineCacheEntry):
+    version_tag = None
+    structure = None
+    index = -1             # -1 if the attribute was found in the type
+    w_descr = None
+
+
+def get_cache_entry(f, EntryCls):
+    code = f.pycode
+    caches = code._inline_caches
+    if caches is None:
+        caches = [None] * len(code.co_code)
+        code._inline_caches = caches
+    entry = caches[f.last_instr]
+    if not isinstance(entry, EntryCls):
+        entry = EntryCls()
+        caches[f.last_instr] = entry
+    return entry
+get_cache_entry._annspecialcase_ = 'specialize:arg(1)'
+
+
+def LOAD_GLOBAL(f, nameindex, *ignored):
+    w_globals = f.w_globals
+    if type(w_globals) is not W_DictMultiObject:
+        f.pushvalue(f._load_global(f.getname_w(nameindex)))
+        return
+    entry = get_cache_entry(f, GlobalCacheEntry)
+    if (entry.w_globals is w_globals and
+        entry.globals_version == w_globals.version_stamp):
+        w_builtins = entry.w_builtins
+        if w_builtins is None:
+            f.pushvalue(entry.w_value)
+            return
+        if (f.get_builtin().w_dict is w_builtins and
+            entry.builtins_version == w_builtins.version_stamp):
+            f.pushvalue(entry.w_value)
+            return
+    w_value = _load_global_and_fill_cache(f, entry, w_globals,
+                                          f.getname_w(nameindex))
+    f.pushvalue(w_value)
+
+def _load_global_and_fill_cache(f, entry, w_globals, w_varname):
+    w_value = w_globals.get(w_varname, None)
+    if w_value is not None:
+        entry.w_globals = w_globals
+        entry.globals_version = w_globals.version_stamp
+        entry.w_builtins = None
+        entry.w_value = w_value
+        return w_value
+    # not in the globals, now look in the built-ins
+    builtin = f.get_builtin()
+    w_value = builtin.getdictvalue(f.space, w_varname)
+    if w_value is None:
+        f._load_global_failed(w_varname)
+    w_builtins = builtin.w_dict
+    if type(w_builtins) is W_DictMultiObject:
+        # read the stamps only now: getdictvalue() can store lazily
+        # loaded built-ins into the dictionary
+        entry.w_globals = w_globals
+        entry.globals_version = w_globals.version_stamp
+        entry.w_builtins = w_builtins
+        entry.builtins_version = w_builtins.version_stamp
+        entry.w_value = w_value
+    return w_value
+
+
+def LOAD_ATTR(f, nameindex, *ignored):
+    "obj.attributename"
+    space = f.space
+    w_obj = f.popvalue()
+    w_type = space.type(w_obj)
+    version_tag = w_type.version_tag
+    if version_tag is None:
+        w_value = space.getattr(w_obj, f.getname_w(nameindex))
+        f.pushvalue(w_value)
+        return
+    entry = get_cache_entry(f, AttrCacheEntry)
+    if entry.version_tag is version_tag:
+        impl = w_obj.get_sharing_dict_impl()
+        if impl is not None and impl.structure is entry.structure:
+            index = entry.index
+            if index >= 0:
+                w_value = impl.entries[index]
+            else:
+                w_value = space.get(entry.w_descr, w_obj, w_type)
+            f.pushvalue(w_value)
+            return
+    w_name = f.getname_w(nameindex)
+    w_value = space.getattr(w_obj, w_name)
+    _fill_attr_cache(space, entry, w_obj, w_type, version_tag, w_name)
+    f.pushvalue(w_value)
+
+def _fill_attr_cache(space, entry, w_obj, w_type, version_tag, w_name):
+    impl = w_obj.get_sharing_dict_impl()
+    if impl is None:
+        return
+    if space.lookup(w_obj, '__getattribute__') is not object_getattribute(space):
+        return
+    name = space.str_w(w_name)
+    w_descr = w_type.lookup(name)
+    index = impl.structure.keys.get(name, -1)
+    if w_descr is None:
+        if index < 0:
+            return    # the attribute was computed by __getattr__
+    else:
+        if index >= 0:
+            return    # both in the type and in the instance, don't bother
+        if w_type.lookup('__getattr__') is not None:
+            return    # the descriptor's __get__ might raise AttributeError
+    entry.version_tag = version_tag
+    entry.structure = impl.structure
+    entry.index = index
+    entry.w_descr = w_descr
@@ -171,6 +171,12 @@ class StdObjSpace(ObjSpace, DescrOperation):
                 # def CALL_METHOD(...):
                 from pypy.objspace.std.callmethod import CALL_METHOD
 
+            if self.config.objspace.std.withinlinecache:
+                # def LOAD_GLOBAL(...):
+                from pypy.objspace.std.inlinecache import LOAD_GLOBAL
+                # def LOAD_ATTR(...):
+                from pypy.objspace.std.inlinecache import LOAD_ATTR
+
             if self.config.objspace.std.optimized_comparison_op:
                 def COMPARE_OP(f, testnum, *ignored):
                     import operator
@@ -194,6 +200,14 @@ class StdObjSpace(ObjSpace, DescrOperation):
                             raise BytecodeCorruption, "bad COMPARE_OP oparg"
                     f.pushvalue(w_result)
 
+            if self.config.objspace.std.withquickening:
+                # def BINARY_ADD(...):
+                from pypy.objspace.std.quickening import BINARY_ADD
+                # def BINARY_SUBSCR(...):
+                from pypy.objspace.std.quickening import BINARY_SUBSCR
+                # def COMPARE_OP(...):
+                from pypy.objspace.std.quickening import COMPARE_OP
+
             if self.config.objspace.std.logspaceoptypes:
                 _space_op_types = []
                 for name, func in pyframe.PyFrame.__dict__.iteritems():
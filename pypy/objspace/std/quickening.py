@@ -0,0 +1,204 @@
+"""
+Adaptive specialization ("quickening") of BINARY_ADD, BINARY_SUBSCR and
+COMPARE_OP based on the operand types seen by each instruction.
+
+Every instruction gets a QuickenedEntry in the '_inline_caches' list of
+its code object (see pypy.objspace.std.inlinecache).  As long as the
+instruction is generic it records the kind of its operands; once it has
+seen the same kind QUICKEN_THRESHOLD times in a row, it is specialized to
+that kind and from then on it only checks the types of its operands (the
+guard) before running the fast path directly.  If the guard fails, the
+instruction is deoptimized back to the generic version and starts
+recording again.  After MAX_DEOPTIMIZATIONS failed guards the instruction
+is considered polymorphic and stays generic for good.
+
+This generalizes the 'optimized_int_add', 'optimized_list_getitem' and
+'optimized_comparison_op' options, which take a fixed fast path for one
+pair of types in every instruction.
+"""
+
+import operator
+from pypy.interpreter.pyopcode import unrolling_compare_dispatch_table, \
+     BytecodeCorruption
+from pypy.objspace.std.inlinecache import InlineCacheEntry, get_cache_entry
+from pypy.objspace.std.multimethod import FailedToImplement
+from pypy.objspace.std.intobject import W_IntObject, add__Int_Int
+from pypy.objspace.std.floatobject import W_FloatObject, add__Float_Float
+from pypy.objspace.std.stringobject import W_StringObject, add__String_String
+from pypy.objspace.std.listobject import W_ListObject, getitem__List_ANY
+from pypy.rlib.unroll import unrolling_iterable
+
+# This module exports three extra methods for StdObjSpaceFrame replacing
+# the BINARY_ADD, BINARY_SUBSCR and COMPARE_OP opcodes.
+# See pypy.objspace.std.objspace for where these functions are used from.
+
+QUICKEN_THRESHOLD = 16
+MAX_DEOPTIMIZATIONS = 4
+
+KIND_POLYMORPHIC = -1
+KIND_GENERIC     = 0
+KIND_INT_INT     = 1
+KIND_FLOAT_FLOAT = 2
+KIND_STR_STR     = 3
+KIND_LIST_INT    = 4
+
+compare_ops = unrolling_iterable(enumerate(['lt', 'le', 'eq',
+                                            'ne', 'gt', 'ge']))
+
+
+class QuickenedEntry(InlineCacheEntry):
+    kind = KIND_GENERIC
+    seen_kind = KIND_GENERIC
+    counter = 0
+    deoptimizations = 0
+
+    def record(self, kind):
+        if kind == KIND_GENERIC or kind != self.seen_kind:
+            self.seen_kind = kind
+            self.counter = 1
+            return
+        self.counter += 1
+        if self.counter >= QUICKEN_THRESHOLD:
+            self.kind = kind
+
+    def deoptimize(self):
+        self.deoptimizations += 1
+        if self.deoptimizations >= MAX_DEOPTIMIZATIONS:
+            self.kind = KIND_POLYMORPHIC
+        else:
+            self.kind = KIND_GENERIC
+        self.seen_kind = KIND_GENERIC
+        self.counter = 0
+
+
+def classify(w_1, w_2):
+    type1 = type(w_1)
+    type2 = type(w_2)
+    if type1 is W_IntObject:
+        if type2 is W_IntObject:
+            return KIND_INT_INT
+    elif type1 is W_FloatObject:
+        if type2 is W_FloatObject:
+            return KIND_FLOAT_FLOAT
+    elif type1 is W_StringObject:
+        if type2 is W_StringObject:
+            return KIND_STR_STR
+    elif type1 is W_ListObject:
+        if type2 is W_IntObject:
+            return KIND_LIST_INT
+    return KIND_GENERIC
+
+def guard(kind, w_1, w_2):
+    # equivalent to classify(w_1, w_2) == kind, but cheaper
+    if kind == KIND_INT_INT:
+        return type(w_1) is W_IntObject and type(w_2) is W_IntObject
+    elif kind == KIND_FLOAT_FLOAT:
+        return type(w_1) is W_FloatObject and type(w_2) is W_FloatObject
+    elif kind == KIND_STR_STR:
+        return type(w_1) is W_StringObject and type(w_2) is W_StringObject
+    elif kind == KIND_LIST_INT:
+        return type(w_1) is W_ListObject and type(w_2) is W_IntObject
+    return False
+guard._always_inline_ = True
+
+
+def BINARY_ADD(f, *ignored):
+    space = f.space
+    w_2 = f.popvalue()
+    w_1 = f.popvalue()
+    entry = get_cache_entry(f, QuickenedEntry)
+    kind = entry.kind
+    if kind > KIND_GENERIC:
+        if guard(kind, w_1, w_2):
+            f.pushvalue(_add_specialized(space, kind, w_1, w_2))
+            return
+        entry.deoptimize()
+    elif kind == KIND_GENERIC:
+        add_kind = classify(w_1, w_2)
+        if add_kind == KIND_LIST_INT:
+            add_kind = KIND_GENERIC
+        entry.record(add_kind)
+    f.pushvalue(space.add(w_1, w_2))
+
+def _add_specialized(space, kind, w_1, w_2):
+    try:
+        if kind == KIND_INT_INT:
+            assert isinstance(w_1, W_IntObject)
+            assert isinstance(w_2, W_IntObject)
+            return add__Int_Int(space, w_1, w_2)
+        elif kind == KIND_FLOAT_FLOAT:
+            assert isinstance(w_1, W_FloatObject)
+            assert isinstance(w_2, W_FloatObject)
+            return add__Float_Float(space, w_1, w_2)
+        elif kind == KIND_STR_STR:
+            assert isinstance(w_1, W_StringObject)
+            assert isinstance(w_2, W_StringObject)
+            return add__String_String(space, w_1, w_2)
+    except FailedToImplement:
+        pass     # overflow: not a failed guard, the types are still right
+    return space.add(w_1, w_2)
+
+
+def BINARY_SUBSCR(f, *ignored):
+    space = f.space
+    w_2 = f.popvalue()
+    w_1 = f.popvalue()
+    entry = get_cache_entry(f, QuickenedEntry)
+    kind = entry.kind
+    if kind > KIND_GENERIC:
+        if kind == KIND_LIST_INT and guard(KIND_LIST_INT, w_1, w_2):
+            assert isinstance(w_1, W_ListObject)
+            f.pushvalue(getitem__List_ANY(space, w_1, w_2))
+            return
+        entry.deoptimize()
+    elif kind == KIND_GENERIC:
+        subscr_kind = classify(w_1, w_2)
+        if subscr_kind != KIND_LIST_INT:
+            subscr_kind = KIND_GENERIC
+        entry.record(subscr_kind)
+    f.pushvalue(space.getitem(w_1, w_2))
+
+
+def COMPARE_OP(f, testnum, *ignored):
+    w_2 = f.popvalue()
+    w_1 = f.popvalue()
+    entry = get_cache_entry(f, QuickenedEntry)
+    kind = entry.kind
+    if kind > KIND_GENERIC:
+        if guard(kind, w_1, w_2):
+            w_result = _compare_specialized(f.space, kind, testnum, w_1, w_2)
+            if w_result is not None:
+                f.pushvalue(w_result)
+                return
+        entry.deoptimize()
+    elif kind == KIND_GENERIC:
+        compare_kind = classify(w_1, w_2)
+        if compare_kind == KIND_LIST_INT or testnum >= 6:
+            compare_kind = KIND_GENERIC   # 'in', 'is', exception matching
+        entry.record(compare_kind)
+    for i, attr in unrolling_compare_dispatch_table:
+        if i == testnum:
+            w_result = getattr(f, attr)(w_1, w_2)
+            break
+    else:
+        raise BytecodeCorruption, "bad COMPARE_OP oparg"
+    f.pushvalue(w_result)
+
+def _compare_specialized(space, kind, testnum, w_1, w_2):
+    for i, attr in compare_ops:
+        if i == testnum:
+            op = getattr(operator, attr)
+            if kind == KIND_INT_INT:
+                assert isinstance(w_1, W_IntObject)
+                assert isinstance(w_2, W_IntObject)
+                return space.newbool(op(w_1.intval, w_2.intval))
+            elif kind == KIND_FLOAT_FLOAT:
+                assert isinstance(w_1, W_FloatObject)
+                assert isinstance(w_2, W_FloatObject)
+                return space.newbool(op(w_1.floatval, w_2.floatval))
+            elif kind == KIND_STR_STR:
+                assert isinstance(w_1, W_StringObject)
+                assert isinstance(w_2, W_StringObject)
+                return space.newbool(op(w_1._value, w_2._value))
+            break
+    return None
@@ -0,0 +1,176 @@
+from pypy.conftest import gettestobjspace
+from pypy.objspace.std.inlinecache import GlobalCacheEntry, AttrCacheEntry
+
+
+class TestInlineCache(object):
+    def setup_class(cls):
+        cls.space = gettestobjspace(**{"objspace.std.withinlinecache": True,
+                                       "objspace.std.withsharingdict": True})
+
+    def cache_entries(self, w_func, EntryCls):
+        from pypy.interpreter.function import Function
+        func = self.space.interp_w(Function, w_func)
+        caches = func.code._inline_caches
+        assert caches is not None
+        return [entry for entry in caches if isinstance(entry, EntryCls)]
+
+    def test_version_stamp(self):
+        space = self.space
+        w_dict = space.newdict()
+        stamp = w_dict.version_stamp
+        space.setitem(w_dict, space.wrap("a"), space.wrap(1))
+        assert w_dict.version_stamp > stamp
+        stamp = w_dict.version_stamp
+        space.setitem(w_dict, space.wrap("a"), space.wrap(2))
+        assert w_dict.version_stamp > stamp
+        stamp = w_dict.version_stamp
+        space.delitem(w_dict, space.wrap("a"))
+        assert w_dict.version_stamp > stamp
+
+    def test_load_global_cached(self):
+        space = self.space
+        w_f = space.appexec([], """():
+            x = 42
+            def f():
+                return x, len
+            return f
+        """)
+        space.call_function(w_f)
+        entries = self.cache_entries(w_f, GlobalCacheEntry)
+        assert len(entries) == 2
+        assert space.eq_w(entries[0].w_value, space.wrap(42))
+        assert entries[0].w_builtins is None
+        assert entries[1].w_value is space.builtin.get('len')
+        assert entries[1].w_builtins is space.builtin.w_dict
+
+    def test_load_attr_cached(self):
+        space = self.space
+        w_f = space.appexec([], """():
+            class A(object):
+                def m(self):
+                    return 1
+            def f(a):
+                return a.x, a.m
+            a = A()
+            a.x = 42
+            return f, a
+        """)
+        w_f, w_a = space.unpackiterable(w_f)
+        space.call_function(w_f, w_a)
+        entries = self.cache_entries(w_f, AttrCacheEntry)
+        assert len(entries) == 2
+        assert entries[0].version_tag is space.type(w_a).version_tag
+        assert entries[0].index == 0
+        assert entries[1].index == -1
+        assert entries[1].w_descr is not None
+
+
+class AppTestInlineCache(object):
+    def setup_class(cls):
+        cls.space = gettestobjspace(**{"objspace.std.withinlinecache": True,
+                                       "objspace.std.withsharingdict": True})
+
+    def test_global_changes(self):
+        g = {}
+        exec """if 1:
+            x = 1
+            def f():
+                return x
+        """ in g
+        f = g['f']
+        assert f() == 1
+        assert f() == 1
+        g['x'] = 2
+        assert f() == 2
+        del g['x']
+        raises(NameError, f)
+        g['x'] = 3
+        assert f() == 3
+
+    def test_builtin_changes(self):
+        import __builtin__
+        g = {}
+        exec """if 1:
+            def f():
+                return somebuiltin
+        """ in g
+        f = g['f']
+        raises(NameError, f)
+        __builtin__.somebuiltin = 1
+        try:
+            assert f() == 1
+            assert f() == 1
+            __builtin__.somebuiltin = 2
+            assert f() == 2
+            g['somebuiltin'] = 3
+            assert f() == 3
+            del g['somebuiltin']
+            assert f() == 2
+        finally:
+            del __builtin__.somebuiltin
+        raises(NameError, f)
+
+    def test_instance_attribute(self):
+        class A(object):
+            pass
+        def f(a):
+            return a.x
+        a = A()
+        a.x = 1
+        b = A()
+        b.y = 5
+        b.x = 2
+        assert f(a) == 1
+        assert f(a) == 1
+        assert f(b) == 2
+        a.x = 3
+        assert f(a) == 3
+        A.x = property(lambda self: 42)
+        assert f(a) == 42
+        del A.x
+        assert f(a) == 3
+        a.__dict__ = {'x': 4}
+        assert f(a) == 4
+
+    def test_type_attribute(self):
+        class A(object):
+            def m(self):
+                return 1
+        def f(a):
+            return a.m()
+        a = A()
+        assert f(a) == 1
+        assert f(a) == 1
+        A.m = lambda self: 2
+        assert f(a) == 2
+        a.m = lambda: 3
+        assert f(a) == 3
+        del a.m
+        assert f(a) == 2
+
+    def test_class_changes(self):
+        class A(object):
+            x = 1
+        class B(object):
+            x = 2
+        def f(a):
+            return a.x
+        a = A()
+        assert f(a) == 1
+        assert f(a) == 1
+        a.__class__ = B
+        assert f(a) == 2
+        B.x = 3
+        assert f(a) == 3
+
+    def test_getattr_not_cached(self):
+        class A(object):
+            def __getattr__(self, name):
+                self.count += 1
+                return self.count
+        def f(a):
+            return a.y
+        a = A()
+        a.count = 0
+        assert f(a) == 1
+        assert f(a) == 2
@@ -0,0 +1,121 @@
+from pypy.conftest import gettestobjspace
+from pypy.objspace.std import quickening
+from pypy.objspace.std.quickening import QuickenedEntry
+
+
+def test_entry_quickens_after_threshold():
+    entry = QuickenedEntry()
+    for i in range(quickening.QUICKEN_THRESHOLD - 1):
+        entry.record(quickening.KIND_INT_INT)
+    assert entry.kind == quickening.KIND_GENERIC
+    entry.record(quickening.KIND_INT_INT)
+    assert entry.kind == quickening.KIND_INT_INT
+
+def test_entry_needs_same_kind_in_a_row():
+    entry = QuickenedEntry()
+    for i in range(quickening.QUICKEN_THRESHOLD * 2):
+        entry.record(quickening.KIND_INT_INT)
+        entry.record(quickening.KIND_FLOAT_FLOAT)
+        entry.record(quickening.KIND_GENERIC)
+    assert entry.kind == quickening.KIND_GENERIC
+
+def test_entry_deoptimize():
+    entry = QuickenedEntry()
+    for i in range(quickening.MAX_DEOPTIMIZATIONS):
+        assert entry.kind == quickening.KIND_GENERIC
+        for j in range(quickening.QUICKEN_THRESHOLD):
+            entry.record(quickening.KIND_STR_STR)
+        assert entry.kind == quickening.KIND_STR_STR
+        entry.deoptimize()
+    assert entry.kind == quickening.KIND_POLYMORPHIC
+
+
+class TestQuickening(object):
+    def setup_class(cls):
+        cls.space = gettestobjspace(**{"objspace.std.withquickening": True})
+
+    def entries(self, w_func):
+        from pypy.interpreter.function import Function
+        func = self.space.interp_w(Function, w_func)
+        caches = func.code._inline_caches
+        assert caches is not None
+        return [entry for entry in caches
+                      if isinstance(entry, QuickenedEntry)]
+
+    def test_quickened_kinds(self):
+        space = self.space
+        w_f = space.appexec([], """():
+            def f(a, b, l, i):
+                return a + b, a < b, l[i]
+            return f
+        """)
+        args_w = [space.wrap(1.5), space.wrap(2.5),
+                  space.newlist([space.wrap(5)]), space.wrap(0)]
+        for i in range(quickening.QUICKEN_THRESHOLD):
+            space.call_function(w_f, *args_w)
+        kinds = [entry.kind for entry in self.entries(w_f)]
+        assert kinds == [quickening.KIND_FLOAT_FLOAT,
+                         quickening.KIND_FLOAT_FLOAT,
+                         quickening.KIND_LIST_INT]
+
+    def test_deoptimize(self):
+        space = self.space
+        w_f = space.appexec([], """():
+            def f(a, b):
+                return a + b
+            return f
+        """)
+        for i in range(quickening.QUICKEN_THRESHOLD):
+            space.call_function(w_f, space.wrap(1), space.wrap(2))
+        [entry] = self.entries(w_f)
+        assert entry.kind == quickening.KIND_INT_INT
+        w_res = space.call_function(w_f, space.wrap("a"), space.wrap("b"))
+        assert space.str_w(w_res) == "ab"
+        assert entry.kind == quickening.KIND_GENERIC
+        assert entry.deoptimizations == 1
+
+
+class AppTestQuickening(object):
+    def setup_class(cls):
+        cls.space = gettestobjspace(**{"objspace.std.withquickening": True})
+
+    def test_add(self):
+        import sys
+        def f(a, b):
+            return a + b
+        for i in range(50):
+            assert f(i, 1) == i + 1
+        assert f(sys.maxint, 1) == sys.maxint + 1
+        assert f(1.5, 2.0) == 3.5
+        for i in range(50):
+            assert f("x", "y") == "xy"
+        assert f([1], [2]) == [1, 2]
+        class A(object):
+            def __add__(self, other):
+                return 42
+        assert f(A(), 1) == 42
+
+    def test_subscr(self):
+        def f(l, i):
+            return l[i]
+        l = range(10)
+        for i in range(50):
+            assert f(l, i % 10) == i % 10
+        assert f(l, -1) == 9
+        raises(IndexError, f, l, 10)
+        assert f("abc", 1) == "b"
+        assert f({1: 2}, 1) == 2
+
+    def test_compare(self):
+        def f(a, b):
+            return a < b, a == b, a >= b
+        for i in range(50):
+            assert f(i, 25) == (i < 25, i == 25, i >= 25)
+        assert f(1.5, 1.5) == (False, True, True)
+        assert f("a", "b") == (True, False, False)
+        assert f(1, 1.5) == (True, False, False)
+        def g(a, b):
+            return a in b
+        for i in range(50):
+            assert g(1, [1])
+        assert not g(2, [1])
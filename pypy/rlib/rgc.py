@@ -151,6 +151,67 @@ class CollectEntry(ExtRegistryEntry):
         hop.exception_cannot_occur()
         return hop.genop('gc__collect', [], resulttype=hop.r_result)
     
+# Statistics about the collections.  The framework GCs based on the
+# SemiSpaceGC record these numbers about each of their last collections:
+COLLECTION_STATS_FIELDS = ['generation',         # 1: nursery, 2: full,
+                                                 # 3: full with gen3 (hybrid)
+                           'bytes_copied',
+                           'survivors',
+                           'pause_us',           # in microseconds
+                           'nursery_size',
+                           'finalizers',         # objects to finalize
+                           'rawmalloced_bytes',  # HybridGC only
+                           'heap_size',
+                           ]
+
+def collection_stats(index, field):
+    """Return the number COLLECTION_STATS_FIELDS[field] about the
+    collection number 'index', or -1 if it is no longer recorded.  With
+    index == -1, return the number of collections done so far, or -1 if
+    the GC does not record them.
+    """
+    return -1
+
+class CollectionStatsEntry(ExtRegistryEntry):
+    _about_ = collection_stats
+
+    def compute_result_annotation(self, s_index, s_field):
+        from pypy.annotation import model as annmodel
+        return annmodel.SomeInteger()
+
+    def specialize_call(self, hop):
+        from pypy.rpython.lltypesystem import lltype
+        vlist = hop.inputargs(lltype.Signed, lltype.Signed)
+        hop.exception_cannot_occur()
+        return hop.genop('gc_collection_stats', vlist,
+                         resulttype=hop.r_result)
+
+# Statistics per allocation site, recorded by the framework GCs based on
+# the SemiSpaceGC when translated with --gc-alloc-sites:
+ALLOC_SITE_FIELDS = ['count',       # number of objects allocated
+                     'bytes',       # total size of these objects
+                     'survivors',   # how many survived their first
+                                    # collection (see gc/semispace.py)
+                     ]
+
+def dump_alloc_sites():
+    """Write the statistics per allocation site to the file named by
+    the environment variable PYPY_GC_ALLOC_SITES, or to stderr.  The
+    allocation sites are listed in the file 'allocsites.txt' written
+    during translation.  Does nothing if not recorded.
+    """
+
+class DumpAllocSitesEntry(ExtRegistryEntry):
+    _about_ = dump_alloc_sites
+
+    def compute_result_annotation(self):
+        from pypy.annotation import model as annmodel
+        return annmodel.s_None
+
+    def specialize_call(self, hop):
+        hop.exception_cannot_occur()
+        return hop.genop('gc_dump_alloc_sites', [], resulttype=hop.r_result)
+
 class SetMaxHeapSizeEntry(ExtRegistryEntry):
     _about_ = set_max_heap_size
 
@@ -37,6 +37,18 @@ def test_can_move():
     
     assert res == True
     
+def test_collection_stats():
+    def f(i):
+        return rgc.collection_stats(i, 0)
+
+    t, typer, graph = gengraph(f, [int])
+    ops = list(graph.iterblockops())
+    res = [op for op in ops if op[1].opname == 'gc_collection_stats']
+    assert len(res) == 1
+
+    res = interpret(f, [-1])
+    assert res == -1
+
 def test_resizable_buffer():
     from pypy.rpython.lltypesystem.rstr import STR
     from pypy.rpython.annlowlevel import hlstr
@@ -0,0 +1,291 @@
+"""
+Specialize independent graphs in forked worker processes.
+
+Once the reprs of all the annotated variables exist, rtyping most graphs
+only produces new low-level operations in the graphs themselves.  The
+parent process creates these reprs, then forks workers that each
+specialize a part of the graphs.  A worker only sends back a graph if
+rtyping it did not change anything outside the graph: no new repr, no
+new helper graph, no new annotation, no new prebuilt low-level
+structure.  Objects that existed before the fork are sent as references
+(they have the same id() in the parent and in the worker); the changes
+made to them -- the operations of the blocks, the arguments of the links,
+the concretetype of the variables -- are sent explicitly.  Everything
+that is not sent back is rtyped afterwards in the parent, as usual.
+"""
+
+import os, gc
+from cStringIO import StringIO
+from pypy.objspace.flow.model import Variable, Constant, SpaceOperation
+from pypy.objspace.flow.model import Block, Link
+from pypy.annotation import model as annmodel
+from pypy.rpython.lltypesystem import lltype, llmemory
+from pypy.rpython.error import TyperError
+from pypy.translator.tool.statepickle import StatePickler, StateUnpickler
+from pypy.tool.udir import udir
+
+
+def specialize_in_workers(rtyper, pending, jobs):
+    """Specialize as many of the 'pending' blocks as possible in 'jobs'
+    worker processes.  The blocks that are done are added to
+    rtyper.already_seen.  Returns the number of graphs done."""
+    annotator = rtyper.annotator
+    blocks_by_graph = {}
+    for block in pending:
+        graph = annotator.annotated[block]
+        blocks_by_graph.setdefault(graph, []).append(block)
+    if len(blocks_by_graph) < 2 * jobs:
+        return 0
+    warm_up_reprs(rtyper, pending)
+
+    # give each worker about the same number of blocks, big graphs first
+    partitions = [[] for i in range(jobs)]
+    sizes = [0] * jobs
+    lst = [(len(blocks), graph) for graph, blocks in blocks_by_graph.items()]
+    lst.sort()
+    lst.reverse()
+    for size, graph in lst:
+        i = sizes.index(min(sizes))
+        partitions[i].append(graph)
+        sizes[i] += size
+
+    prefork = {}
+    for obj in gc.get_objects():
+        prefork[id(obj)] = obj
+    workers = []
+    for i in range(jobs):
+        filename = str(udir.join('rtype-worker-%d-%d' % (os.getpid(), i)))
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                try:
+                    run_worker(rtyper, partitions[i], blocks_by_graph,
+                               prefork, filename)
+                    status = 0
+                except:
+                    import traceback
+                    traceback.print_exc()
+            finally:
+                os._exit(status)
+        workers.append((pid, filename))
+
+    done = 0
+    for pid, filename in workers:
+        pid, status = os.waitpid(pid, 0)
+        if status != 0:
+            rtyper.log.WARNING("rtyping worker %d failed" % (pid,))
+            continue
+        done += install_results(rtyper, filename, blocks_by_graph, prefork)
+        os.unlink(filename)
+    rtyper.log.event('%d of %d graphs specialized by %d workers' % (
+        done, len(blocks_by_graph), jobs))
+    return done
+
+def warm_up_reprs(rtyper, blocks):
+    bindings = rtyper.annotator.bindings
+    for block in blocks:
+        for v in block.getvariables():
+            if v not in bindings:
+                continue
+            s_value = bindings[v]
+            try:
+                key = rtyper.makekey(s_value)
+                if key in rtyper.reprs:
+                    continue
+                try:
+                    rtyper.getrepr(s_value)
+                except TyperError:
+                    # the error is reported when the block is rtyped
+                    del rtyper.reprs[key]
+            except TyperError:
+                pass
+    rtyper.call_all_setups()
+
+# ____________________________________________________________
+# in the worker
+
+def state_sizes(rtyper):
+    """The sizes of the dicts and lists that record the global state of
+    the translation; rtyping a graph that changes them is not local."""
+    annotator = rtyper.annotator
+    sizes = []
+    for obj in [rtyper, annotator, annotator.bookkeeper,
+                annotator.translator, rtyper.exceptiondata]:
+        if obj is None:
+            continue
+        items = obj.__dict__.items()
+        items.sort()
+        for name, value in items:
+            if name in LOCAL_STATE:
+                continue
+            if isinstance(value, (dict, list)):
+                sizes.append(len(value))
+    return sizes
+
+LOCAL_STATE = dict.fromkeys(['already_seen', 'bindings', 'fixed_graphs'])
+
+def run_worker(rtyper, graphs, blocks_by_graph, prefork, filename):
+    results = []
+    for graph in graphs:
+        sizes = state_sizes(rtyper)
+        try:
+            for block in blocks_by_graph[graph]:
+                rtyper.specialize_block(block)
+                rtyper.already_seen[block] = True
+        except Exception:
+            break     # leave the rest of the work to the parent
+        if state_sizes(rtyper) != sizes:
+            # not local; keep the worker consistent for the next graphs
+            rtyper.call_all_setups()
+            continue
+        data = dump_graph_result(rtyper, graph, prefork)
+        if data is not None:
+            results.append(data)
+    f = open(filename, 'wb')
+    try:
+        f.write(''.join(['%d\n%s' % (len(data), data) for data in results]))
+    finally:
+        f.close()
+
+def _slotnames(cls):
+    result = []
+    for c in cls.__mro__:
+        for name in c.__dict__.get('__slots__', ()):
+            if name not in ('__dict__', '__weakref__'):
+                result.append(name)
+    return result
+
+def _getstate(obj):
+    state = {}
+    for name in _slotnames(obj.__class__):
+        try:
+            state[name] = getattr(obj, name)
+        except AttributeError:
+            pass
+    return state
+
+def graph_objects(graph):
+    """All the Blocks, Links, SpaceOperations and Variables of the graph."""
+    blocks = list(graph.iterblocks())
+    for block in [graph.returnblock, graph.exceptblock]:
+        if block not in blocks:
+            blocks.append(block)
+    links = list(graph.iterlinks())
+    operations = []
+    variables = {}
+    for block in blocks:
+        for v in block.getvariables():
+            variables[v] = True
+        operations.extend(block.operations)
+    for link in links:
+        for v in link.getextravars():
+            variables[v] = True
+    return blocks, links, operations, variables.keys()
+
+def dump_graph_result(rtyper, graph, prefork):
+    blocks, links, operations, variables = graph_objects(graph)
+    changes = []
+    for obj in blocks + links + operations:
+        if id(obj) in prefork:
+            changes.append((obj, _getstate(obj)))
+    concretetypes = []
+    new_bindings = []
+    bindings = rtyper.annotator.bindings
+    for v in variables:
+        if id(v) in prefork:
+            concretetypes.append((v, getattr(v, 'concretetype', None)))
+        elif v in bindings:
+            new_bindings.append((v, bindings[v]))
+    f = StringIO()
+    pickler = WorkerPickler(f, prefork)
+    pickler.dump((graph, changes, concretetypes, new_bindings))
+    if pickler.foreign:
+        return None    # refers to new objects that the parent doesn't know
+    return f.getvalue()
+
+
+class WorkerPickler(StatePickler):
+    """Sends the objects that existed before the fork as references, and
+    records the new objects that cannot just be copied into the parent."""
+
+    def __init__(self, file, prefork):
+        StatePickler.__init__(self, file, registry={})
+        self.prefork = prefork
+        self.foreign = []
+
+    def persistent_id(self, obj):
+        key = id(obj)
+        if key in self.prefork and type(obj) is not list:
+            # lists are always copied: the rtyper changes some of the
+            # existing ones in-place, e.g. the operations of the blocks
+            return key
+        if not is_copyable(obj):
+            self.foreign.append(obj)
+        return None
+
+def is_copyable(obj):
+    if isinstance(obj, COPYABLE_TYPES):
+        return True
+    if isinstance(obj, lltype.LowLevelType):
+        # types are compared structurally, but not the containers
+        return (not isinstance(obj, lltype.ContainerType) or
+                isinstance(obj, lltype.FuncType))
+    if isinstance(obj, lltype._func):
+        return True     # function pointers are built for each call anyway
+    return False
+
+COPYABLE_TYPES = (Variable, Constant, SpaceOperation, Block, Link,
+                  list, tuple, dict, str, unicode, int, long, float, bool,
+                  type(None), annmodel.SomeObject, lltype._ptr,
+                  llmemory.AddressOffset, llmemory.fakeaddress)
+
+# ____________________________________________________________
+# back in the parent
+
+def install_results(rtyper, filename, blocks_by_graph, prefork):
+    annotator = rtyper.annotator
+    f = open(filename, 'rb')
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    count = 0
+    pos = 0
+    while pos < len(data):
+        end = data.index('\n', pos)
+        size = int(data[pos:end])
+        pos = end + 1 + size
+        unpickler = StateUnpickler(StringIO(data[end+1:pos]), prefork)
+        graph, changes, concretetypes, new_bindings = unpickler.load()
+        for obj, state in changes:
+            for name, value in state.items():
+                old = getattr(obj, name, None)
+                if type(old) is list and type(value) is list:
+                    old[:] = value
+                else:
+                    setattr(obj, name, value)
+        for v, concretetype in concretetypes:
+            if concretetype is not None:
+                v.concretetype = concretetype
+        for v, s_value in new_bindings:
+            annotator.bindings[v] = s_value
+        fix_new_objects(graph, prefork)
+        annotator.fixed_graphs[graph] = True
+        for block in blocks_by_graph[graph]:
+            rtyper.already_seen[block] = True
+        count += 1
+    return count
+
+def fix_new_objects(graph, prefork):
+    # the new Variables get their number from the parent's counter, and
+    # the strings that are normally interned are interned again
+    blocks, links, operations, variables = graph_objects(graph)
+    namesdict = Variable.namesdict
+    for v in variables:
+        if id(v) not in prefork:
+            v._name = namesdict.setdefault(v._name, (v._name, 0))[0]
+            v._nr = -1
+    for op in operations:
+        if id(op) not in prefork:
+            op.opname = intern(op.opname)
@@ -54,6 +54,7 @@ class LLInterpreter(object):
         self.malloc_check = malloc_check
         self.frame_class = LLFrame
         self.mallocs = {}
+        self.instrument_counters = {}    # {label: count}, like the C ones
         if tracing:
             self.tracer = Tracer()
 
@@ -265,7 +266,10 @@ class LLFrame(object):
                     nextblock, args = self.eval_block(nextblock)
                     if nextblock is None:
                         for obj in self.alloca_objects:
-                            obj._obj._free()
+                            if isinstance(obj, llmemory.fakeaddress):
+                                llmemory.raw_free(obj)    # op_stack_malloc
+                            else:
+                                obj._obj._free()
                         return args
             except Exception:
                 self.llinterpreter.traceback_frames.append(self)
@@ -514,7 +518,8 @@ class LLFrame(object):
         return pythonfunction(*args_ll)
 
     def op_instrument_count(self, ll_tag, ll_label):
-        pass # xxx for now
+        counters = self.llinterpreter.instrument_counters
+        counters[ll_label] = counters.get(ll_label, 0) + 1
 
     def op_keepalive(self, value):
         pass
@@ -676,6 +681,10 @@ class LLFrame(object):
     def op_malloc_varsize(self, obj, flags, size):
         flavor = flags['flavor']
         zero = flags.get('zero', False)
+        if flavor == "stack":
+            result = self.heap.malloc(obj, size, zero=zero, flavor='raw')
+            self.alloca_objects.append(result)
+            return result
         assert flavor in ('gc', 'raw')
         try:
             ptr = self.heap.malloc(obj, size, zero=zero, flavor=flavor)
@@ -818,6 +827,12 @@ class LLFrame(object):
     def op_gc_set_max_heap_size(self, maxsize):
         raise NotImplementedError("gc_set_max_heap_size")
 
+    def op_gc_collection_stats(self, index, field):
+        return self.heap.collection_stats(index, field)
+
+    def op_gc_dump_alloc_sites(self):
+        self.heap.dump_alloc_sites()
+
     def op_yield_current_frame_to_caller(self):
         raise NotImplementedError("yield_current_frame_to_caller")
 
@@ -895,6 +910,11 @@ class LLFrame(object):
         checkadr(toaddr)
         llmemory.raw_memcopy(fromaddr, toaddr, size)
 
+    def op_raw_memmove(self, fromaddr, toaddr, size):
+        checkadr(fromaddr)
+        checkadr(toaddr)
+        llmemory.raw_memmove(fromaddr, toaddr, size)
+
     def op_raw_load(self, addr, typ, offset):
         checkadr(addr)
         value = getattr(addr, str(typ).lower())[offset]
@@ -906,8 +926,12 @@ class LLFrame(object):
         assert lltype.typeOf(value) == typ
         getattr(addr, str(typ).lower())[offset] = value
 
-    def op_stack_malloc(self, size): # mmh
-        raise NotImplementedError("backend only")
+    def op_stack_malloc(self, size):
+        # like alloca(), zero-filled and freed when the frame returns
+        result = llmemory.raw_malloc(size)
+        llmemory.raw_memclear(result, size)
+        self.alloca_objects.append(result)
+        return result
 
     # ______ for the JIT ____________
     def op_call_boehm_gc_alloc(self):
@@ -262,7 +262,8 @@ class RoundedUpForAllocation(llmemory.AddressOffset):
 # Public interface: arena_malloc(), arena_free(), arena_reset()
 # are similar to raw_malloc(), raw_free() and raw_memclear(), but
 # work with fakearenaaddresses on which arbitrary arithmetic is
-# possible even on top of the llinterpreter.
+# possible even on top of the llinterpreter.  arena_new_view() is
+# for moving objects inside the same arena.
 
 def arena_malloc(nbytes, zero):
     """Allocate and return a new arena, optionally zero-initialized."""
@@ -294,6 +295,18 @@ def arena_reserve(addr, size, check_alignment=True):
                          % (addr.offset,))
     addr.arena.allocate_object(addr.offset, size)
 
+def arena_new_view(arena_addr):
+    """Return a new view on the memory of an arena.  After translation
+    this is just the same address.  When not translated, it is a fresh
+    zero-filled arena of the same size: objects can be reserved in it
+    and copied there with raw_memmove() even if, after translation, they
+    overlap their old copy.  Once the objects are moved, the old view is
+    cleared with arena_reset(..., False), which is a no-op after
+    translation."""
+    arena_addr = _getfakearenaaddress(arena_addr)
+    assert arena_addr.offset == 0
+    return Arena(arena_addr.arena.nbytes, True).getaddr(0)
+
 def round_up_for_allocation(size):
     """Round up the size in order to preserve alignment of objects
     following an object.  For arenas containing heterogenous objects."""
@@ -390,6 +403,14 @@ register_external(arena_reserve, [llmemory.Address, int], None,
                   llfakeimpl=arena_reserve,
                   sandboxsafe=True)
 
+def llimpl_arena_new_view(arena_addr):
+    return arena_addr
+register_external(arena_new_view, [llmemory.Address], llmemory.Address,
+                  'll_arena.arena_new_view',
+                  llimpl=llimpl_arena_new_view,
+                  llfakeimpl=arena_new_view,
+                  sandboxsafe=True)
+
 llimpl_round_up_for_allocation = rffi.llexternal('ROUND_UP_FOR_ALLOCATION',
                                                  [lltype.Signed], lltype.Signed,
                                                  sandboxsafe=True,
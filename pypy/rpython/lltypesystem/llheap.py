@@ -7,6 +7,8 @@ setfield = setattr
 from operator import setitem as setarrayitem
 from pypy.rlib.rgc import collect
 from pypy.rlib.rgc import can_move
+from pypy.rlib.rgc import collection_stats
+from pypy.rlib.rgc import dump_alloc_sites
 
 def setinterior(toplevelcontainer, inneraddr, INNERTYPE, newvalue):
     assert typeOf(newvalue) == INNERTYPE
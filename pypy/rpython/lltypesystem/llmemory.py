@@ -736,6 +736,12 @@ def raw_memcopy(source, dest, size):
     assert lltype.typeOf(dest)   == Address
     size.raw_memcopy(source, dest)
 
+def raw_memmove(source, dest, size):
+    # like raw_memcopy(), but the two areas may overlap after translation.
+    # On top of fake addresses they are different objects anyway; to move
+    # objects inside an arena, see llarena.arena_new_view().
+    raw_memcopy(source, dest, size)
+
 def cast_any_ptr(EXPECTED_TYPE, ptr):
     # this is a generalization of the various cast_xxx_ptr() functions.
     PTRTYPE = lltype.typeOf(ptr)
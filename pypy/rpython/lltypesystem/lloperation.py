@@ -368,6 +368,7 @@ LL_OPERATIONS = {
     'raw_free':             LLOp(),
     'raw_memclear':         LLOp(),
     'raw_memcopy':          LLOp(),
+    'raw_memmove':          LLOp(),
     'raw_load':             LLOp(sideeffects=False),
     'raw_store':            LLOp(),
     'stack_malloc':         LLOp(), # mmh
@@ -403,6 +404,8 @@ LL_OPERATIONS = {
     'gc_reload_possibly_moved': LLOp(),
     'gc_id':                LLOp(canraise=(MemoryError,), sideeffects=False),
     'gc_set_max_heap_size': LLOp(),
+    'gc_collection_stats':  LLOp(),
+    'gc_dump_alloc_sites':  LLOp(),
     'gc_can_move'         : LLOp(sideeffects=False),
     'gc_thread_prepare'   : LLOp(canraise=(MemoryError,)),
     'gc_thread_run'       : LLOp(),
@@ -9,6 +9,7 @@ from types import NoneType
 from sys import maxint
 import struct
 import weakref
+import copy_reg
 
 log = py.log.Producer('lltype')
 
@@ -111,6 +112,16 @@ class LowLevelType(object):
     # but we just provide a tag for external help.
     __hash_is_not_constant__ = True
 
+    def __getstate__(self):
+        return self.__dict__     # but not the __cached_hash
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        try:
+            del self.__cached_hash   # computed too early while unpickling
+        except AttributeError:
+            pass
+
     def __repr__(self):
         return '<%s>' % (self,)
 
@@ -1124,6 +1135,17 @@ class _ptr(_abstract_ptr):
         self._set_weak(False)
         self._setobj(pointing_to, solid)
 
+    def __getstate__(self):
+        # the default pickling of slots would go through __setattr__()
+        return (self._TYPE, self._T, self._weak, self._solid, self._obj0)
+
+    def __setstate__(self, (TYPE, T, weak, solid, obj0)):
+        self._set_TYPE(TYPE)
+        self._set_T(T)
+        self._set_weak(weak)
+        self._set_solid(solid)
+        self._set_obj0(obj0)
+
     def _become(self, other):
         assert self._TYPE == other._TYPE
         assert not self._weak
@@ -1222,6 +1244,14 @@ class _interior_ptr(_abstract_ptr):
         self._set_parent(_parent)
         self._set_offsets(_offsets)
 
+    def __getstate__(self):
+        return (self._T, self._parent, self._offsets)
+
+    def __setstate__(self, (T, parent, offsets)):
+        self._set_T(T)
+        self._set_parent(parent)
+        self._set_offsets(offsets)
+
     def __nonzero__(self):
         raise RuntimeError, "do not test an interior pointer for nullity"
 
@@ -1378,6 +1408,15 @@ class _struct(_parentable):
         my_variety = _struct_variety(TYPE._names)
         return object.__new__(my_variety)
 
+    def __reduce__(self):
+        # __new__() needs a TYPE: use _get_empty_instance_of_struct_variety
+        state = {}
+        for name in copy_reg._slotnames(self.__class__):
+            if hasattr(self, name):
+                state[name] = getattr(self, name)
+        return (_get_empty_instance_of_struct_variety, (self.__slots__,),
+                (None, state))
+
     def __init__(self, TYPE, n=None, initialization=None, parent=None, parentindex=None):
         _parentable.__init__(self, TYPE)
         if n is not None and TYPE._arrayfld is None:
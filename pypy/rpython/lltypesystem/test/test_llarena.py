@@ -4,6 +4,7 @@ from pypy.rpython.lltypesystem.llmemory import cast_adr_to_ptr
 from pypy.rpython.lltypesystem.llarena import arena_malloc, arena_reset
 from pypy.rpython.lltypesystem.llarena import arena_reserve, arena_free
 from pypy.rpython.lltypesystem.llarena import round_up_for_allocation
+from pypy.rpython.lltypesystem.llarena import arena_new_view
 from pypy.rpython.lltypesystem.llarena import ArenaError
 
 def test_arena():
@@ -250,6 +251,24 @@ def test_replace_object_with_stub():
     assert stub.t == '!'
 
 
+def test_arena_new_view():
+    S = lltype.Struct('S', ('x', lltype.Signed))
+    SPTR = lltype.Ptr(S)
+    ssize = llmemory.raw_malloc_usage(llmemory.sizeof(S))
+    a = arena_malloc(5 * ssize, True)
+    arena_reserve(a + ssize, llmemory.sizeof(S))
+    s1 = cast_adr_to_ptr(a + ssize, SPTR)
+    s1.x = 42
+    # move the object to the start of the arena, through a new view
+    b = arena_new_view(a)
+    arena_reserve(b, llmemory.sizeof(S))
+    llmemory.raw_memmove(a + ssize, b, llmemory.sizeof(S))
+    arena_reset(a, 5 * ssize, False)
+    s2 = cast_adr_to_ptr(b, SPTR)
+    assert s2.x == 42
+    py.test.raises(RuntimeError, "s1.x")
+    arena_free(b)
+
 def test_llinterpreted():
     from pypy.rpython.test.test_llinterp import interpret
     res = interpret(test_look_inside_object, [])
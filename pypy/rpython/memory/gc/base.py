@@ -5,6 +5,7 @@ class GCBase(object):
     _alloc_flavor_ = "raw"
     moving_gc = False
     needs_write_barrier = False
+    needs_write_barrier_from_array = False
     malloc_zero_filled = False
     prebuilt_gc_objects_are_static_roots = True
     can_realloc = False
@@ -51,6 +52,21 @@ class GCBase(object):
     def statistics(self, index):
         return -1
 
+    def collection_stats(self, index, field):
+        return -1     # see pypy.rlib.rgc.collection_stats()
+
+    def record_alloc_site(self, site, obj):
+        pass          # see --gc-alloc-sites
+
+    def dump_alloc_sites(self):
+        pass          # see pypy.rlib.rgc.dump_alloc_sites()
+
+    def set_current_thread(self, aid):
+        pass          # hook for thread-local allocation buffers
+
+    def forget_thread(self, aid):
+        pass
+
     def size_gc_header(self, typeid=0):
         return self.gcheaderbuilder.size_gc_header
 
@@ -197,6 +213,7 @@ def choose_gc_from_config(config):
     classes = {"marksweep": "marksweep.MarkSweepGC",
                "statistics": "marksweep.PrintingMarkSweepGC",
                "semispace": "semispace.SemiSpaceGC",
+               "markcompact": "markcompact.MarkCompactGC",
                "generation": "generation.GenerationGC",
                "hybrid": "hybrid.HybridGC",
                }
@@ -208,4 +225,9 @@ def choose_gc_from_config(config):
     module = __import__("pypy.rpython.memory.gc." + modulename,
                         globals(), locals(), [classname])
     GCClass = getattr(module, classname)
-    return GCClass, GCClass.TRANSLATION_PARAMS
+    GC_PARAMS = GCClass.TRANSLATION_PARAMS
+    if not config.translation.thread and 'tlab_size' in GC_PARAMS:
+        # thread-local allocation buffers are only useful with threads
+        GC_PARAMS = GC_PARAMS.copy()
+        GC_PARAMS['tlab_size'] = 0
+    return GCClass, GC_PARAMS
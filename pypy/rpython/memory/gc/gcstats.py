@@ -0,0 +1,130 @@
+"""
+Support for the statistics that the GCs record about their collections:
+see SemiSpaceGC.stats_end_collection() and rgc.collection_stats().
+
+The statistics are recorded unless the environment variable PYPY_GC_STATS
+is set to 0 when the program starts.  If PYPY_GC_LOG is set,
+one line is also appended to this file after each collection, e.g.:
+
+    collection 12: generation=1 bytes_copied=2048 survivors=41 ...
+
+The line is written with a raw buffer and the C function write(),
+because the GC cannot allocate objects during a collection.
+
+The statistics per allocation site (see SemiSpaceGC.record_alloc_site()
+and rgc.dump_alloc_sites()) are written in the same format:
+
+    site 153: count=5411 bytes=129864 survivors=12
+"""
+
+import os, sys
+from pypy.rpython.lltypesystem import lltype, rffi
+from pypy.rlib.rgc import COLLECTION_STATS_FIELDS, ALLOC_SITE_FIELDS
+from pypy.rlib.unroll import unrolling_iterable
+
+# the number of collections whose statistics are kept
+RING_SIZE = 64
+
+EVENTS = lltype.Array(lltype.Signed, hints={'nolength': True})
+
+LINE_SIZE = 512
+
+if sys.platform == 'win32':
+    _name_write = '_write'
+else:
+    _name_write = 'write'
+c_write = rffi.llexternal(_name_write, [rffi.INT, rffi.VOIDP, rffi.SIZE_T],
+                          rffi.SIZE_T, sandboxsafe=True, _nowrapper=True)
+
+
+def stats_enabled_from_env():
+    return os.environ.get('PYPY_GC_STATS') != '0'
+
+def open_log_from_env():
+    filename = os.environ.get('PYPY_GC_LOG')
+    if filename:
+        try:
+            return os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                           0666)
+        except OSError:
+            pass
+    return -1
+
+def open_alloc_sites_file():
+    filename = os.environ.get('PYPY_GC_ALLOC_SITES')
+    if filename:
+        try:
+            return os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                           0666)
+        except OSError:
+            pass
+    return 2     # stderr
+
+def grow_array(array, length, newlength):
+    """Return a copy of the EVENTS 'array' of the given 'length', enlarged
+    to 'newlength' items with zeroes.  The old array is freed."""
+    newarray = lltype.malloc(EVENTS, newlength, flavor='raw', zero=True)
+    i = 0
+    while i < length:
+        newarray[i] = array[i]
+        i += 1
+    if array:
+        lltype.free(array, flavor='raw')
+    return newarray
+
+def _write_str(buf, pos, s):
+    for c in s:
+        buf[pos] = c
+        pos += 1
+    return pos
+
+def _write_int(buf, pos, value):
+    if value < 0:
+        buf[pos] = '-'
+        pos += 1
+        value = -value
+    start = pos
+    while True:
+        buf[pos] = chr(ord('0') + value % 10)
+        pos += 1
+        value = value // 10
+        if value == 0:
+            break
+    # the digits were written in reverse order
+    end = pos - 1
+    while start < end:
+        c = buf[start]
+        buf[start] = buf[end]
+        buf[end] = c
+        start += 1
+        end -= 1
+    return pos
+
+def _make_line_writer(prefix, fields):
+    unroll_fields = unrolling_iterable(enumerate(fields))
+
+    def write_line(fd, number, events, start):
+        buf = lltype.malloc(rffi.CCHARP.TO, LINE_SIZE, flavor='raw')
+        pos = _write_str(buf, 0, prefix)
+        pos = _write_int(buf, pos, number)
+        buf[pos] = ':'
+        pos += 1
+        for i, name in unroll_fields:
+            buf[pos] = ' '
+            pos += 1
+            pos = _write_str(buf, pos, name)
+            buf[pos] = '='
+            pos += 1
+            pos = _write_int(buf, pos, events[start + i])
+        buf[pos] = '\n'
+        pos += 1
+        c_write(rffi.cast(rffi.INT, fd), rffi.cast(rffi.VOIDP, buf),
+                rffi.cast(rffi.SIZE_T, pos))
+        lltype.free(buf, flavor='raw')
+    return write_line
+
+# write the statistics events[start:start+len(fields)] about the
+# collection or allocation site 'number' as one line to the file
+# descriptor 'fd'
+write_log_line = _make_line_writer('collection ', COLLECTION_STATS_FIELDS)
+write_alloc_site_line = _make_line_writer('site ', ALLOC_SITE_FIELDS)
@@ -1,10 +1,11 @@
-import sys
+import sys, time
 from pypy.rpython.memory.gc.semispace import SemiSpaceGC
 from pypy.rpython.memory.gc.semispace import GCFLAG_EXTERNAL, GCFLAG_FORWARDED
 from pypy.rpython.memory.gc.semispace import DEBUG_PRINT
 from pypy.rpython.lltypesystem.llmemory import NULL, raw_malloc_usage
 from pypy.rpython.lltypesystem import lltype, llmemory, llarena
 from pypy.rpython.memory.support import DEFAULT_CHUNK_SIZE
+from pypy.rpython.memory.support import copy_without_null_values
 from pypy.rlib.objectmodel import free_non_gc_object
 from pypy.rlib.debug import ll_assert
 from pypy.rpython.lltypesystem.lloperation import llop
@@ -23,6 +24,39 @@ GCFLAG_NO_YOUNG_PTRS = SemiSpaceGC.first_unused_gcflag << 0
 # 'last_generation_root_objects'.
 GCFLAG_NO_HEAP_PTRS = SemiSpaceGC.first_unused_gcflag << 1
 
+# The following flag is set on the old GcArrays of GC pointers that are
+# in 'old_arrays_with_cards'.  Such an array keeps its GCFLAG_NO_YOUNG_PTRS
+# when a young pointer is written into it by write_barrier_from_array();
+# instead, only the card (a range of 'card_page_indices' items) containing
+# the modified item is marked, and the next nursery collection only looks
+# at the marked cards instead of at the whole array.
+GCFLAG_HAS_CARDS = SemiSpaceGC.first_unused_gcflag << 2
+
+# With 'adaptive_nursery', the nursery size is reconsidered at each full
+# collection.  It is doubled if on average more than NURSERY_GROW_SURVIVAL
+# of the nursery survived the nursery collections since the previous full
+# collection: too many objects don't have the time to die.  It is halved,
+# but not below the initial size, if less than NURSERY_SHRINK_SURVIVAL
+# survived: a smaller nursery would do the same job and stay in the
+# cache.  It is also halved, down to 'min_nursery_size', if the nursery
+# collections took more than 'max_nursery_pause' seconds on average.
+NURSERY_GROW_SURVIVAL = 0.10
+NURSERY_SHRINK_SURVIVAL = 0.01
+
+# one byte per card, see write_barrier_from_array()
+CARDS = lltype.Ptr(lltype.Array(lltype.Char, hints={'nolength': True}))
+
+# With 'tlab_size', each thread allocates its young objects in its own
+# thread-local allocation buffer: a chunk of the nursery of (at least)
+# 'tlab_size' bytes.  The buffer of the running thread is always the one
+# between nursery_free and nursery_top; the buffers of the other threads
+# are saved in a TLAB structure.  Collecting the nursery empties all the
+# buffers, which is detected by comparing the 'epoch' fields.
+TLAB = lltype.Struct('TLAB', ('free', llmemory.Address),
+                             ('top', llmemory.Address),
+                             ('epoch', lltype.Signed))
+TLAB_PTR = lltype.Ptr(TLAB)
+
 class GenerationGC(SemiSpaceGC):
     """A basic generational GC: it's a SemiSpaceGC with an additional
     nursery for young objects.  A write barrier is used to ensure that
@@ -32,20 +66,31 @@ class GenerationGC(SemiSpaceGC):
     inline_simple_malloc = True
     inline_simple_malloc_varsize = True
     needs_write_barrier = True
+    needs_write_barrier_from_array = True
     prebuilt_gc_objects_are_static_roots = False
-    first_unused_gcflag = SemiSpaceGC.first_unused_gcflag << 2
+    first_unused_gcflag = SemiSpaceGC.first_unused_gcflag << 3
 
     # the following values override the default arguments of __init__ when
     # translating to a real backend.
     TRANSLATION_PARAMS = {'space_size': 8*1024*1024, # XXX adjust
                           'nursery_size': 896*1024,
                           'min_nursery_size': 48*1024,
-                          'auto_nursery_size': True}
+                          'auto_nursery_size': True,
+                          'adaptive_nursery': True,
+                          'max_nursery_size': 8*1024*1024,
+                          'max_nursery_pause': 0.005,
+                          'card_page_indices': 128,
+                          'tlab_size': 32*1024}
 
     def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE,
                  nursery_size=128,
                  min_nursery_size=128,
                  auto_nursery_size=False,
+                 adaptive_nursery=False,
+                 max_nursery_size=sys.maxint,
+                 max_nursery_pause=0.0,
+                 card_page_indices=0,
+                 tlab_size=0,
                  space_size=4096,
                  max_space_size=sys.maxint//2+1):
         SemiSpaceGC.__init__(self, chunk_size = chunk_size,
@@ -55,12 +100,26 @@ class GenerationGC(SemiSpaceGC):
         self.initial_nursery_size = nursery_size
         self.auto_nursery_size = auto_nursery_size
         self.min_nursery_size = min_nursery_size
+        self.adaptive_nursery = adaptive_nursery
+        self.max_nursery_size = max_nursery_size
+        self.max_nursery_pause = max_nursery_pause
+        self.base_nursery_size = nursery_size
+        self.reset_nursery_counters()
         self.old_objects_pointing_to_young = self.AddressStack()
         # ^^^ a list of addresses inside the old objects space; it
         # may contain static prebuilt objects as well.  More precisely,
         # it lists exactly the old and static objects whose
         # GCFLAG_NO_YOUNG_PTRS bit is not set.
         self.young_objects_with_weakrefs = self.AddressStack()
+        # card marking is only used for the arrays of more than
+        # 'card_page_indices' items; 0 disables it.
+        self.card_page_indices = card_page_indices
+        self.old_arrays_with_cards = self.AddressStack()
+        # thread-local allocation buffers; 0 disables them
+        self.tlab_size = tlab_size
+        self.tlab_epoch = 0
+        self.tlab_thread = NULL
+        self.dead_threads_count = 0
         self.reset_nursery()
 
         # compute the constant lower bounds for the attributes
@@ -75,22 +134,40 @@ class GenerationGC(SemiSpaceGC):
     def setup(self):
         self.last_generation_root_objects = self.AddressStack()
         self.young_objects_with_id = self.AddressDict()
+        self.card_tables = self.AddressDict()
+        self.tlabs = self.AddressDict()     # {thread id: TLAB}
         SemiSpaceGC.setup(self)
         self.set_nursery_size(self.initial_nursery_size)
         # the GC is fully setup now.  The rest can make use of it.
         if self.auto_nursery_size:
             newsize = nursery_size_from_env()
-            if newsize <= 0:
+            if newsize > 0:
+                self.adaptive_nursery = False   # explicitly given size
+            else:
                 newsize = estimate_best_nursery_size()
             if newsize > 0:
                 self.set_nursery_size(newsize)
+        self.base_nursery_size = self.nursery_size
 
     def reset_nursery(self):
         self.nursery      = NULL
+        self.nursery_end  = NULL
         self.nursery_top  = NULL
         self.nursery_free = NULL
+        self.nursery_chunks_free = NULL
+        self.tlab_epoch += 1
 
     def set_nursery_size(self, newsize):
+        self.set_nursery_bounds(newsize)
+        # Force a full collect to remove the current nursery whose size
+        # no longer matches the bounds that we just computed.  This must
+        # be done after changing the bounds, because it might re-create
+        # a new nursery (e.g. if it invokes finalizers).
+        self.reset_nursery_counters()
+        self.semispace_collect()
+
+    def set_nursery_bounds(self, newsize):
+        # only when there is no nursery at the moment
         if newsize < self.min_nursery_size:
             newsize = self.min_nursery_size
         if newsize > self.space_size // 2:
@@ -115,11 +192,33 @@ class GenerationGC(SemiSpaceGC):
         # we get the following invariant:
         assert self.nursery_size >= (self.min_nursery_size << scale)
 
-        # Force a full collect to remove the current nursery whose size
-        # no longer matches the bounds that we just computed.  This must
-        # be done after changing the bounds, because it might re-create
-        # a new nursery (e.g. if it invokes finalizers).
-        self.semispace_collect()
+    def reset_nursery_counters(self):
+        self.nursery_collections = 0
+        self.nursery_survived = 0
+        self.nursery_pauses = 0.0
+
+    def adapt_nursery_size(self):
+        count = self.nursery_collections
+        if count == 0:
+            return
+        survival = (float(self.nursery_survived) /
+                    (float(self.nursery_size) * count))
+        pause = self.nursery_pauses / count
+        newsize = self.nursery_size
+        if self.max_nursery_pause > 0.0 and pause > self.max_nursery_pause:
+            newsize = newsize // 2
+        elif survival > NURSERY_GROW_SURVIVAL:
+            if newsize * 2 <= self.max_nursery_size:
+                newsize = newsize * 2
+        elif survival < NURSERY_SHRINK_SURVIVAL:
+            if newsize // 2 >= self.base_nursery_size:
+                newsize = newsize // 2
+        self.reset_nursery_counters()
+        if newsize != self.nursery_size:
+            self.set_nursery_bounds(newsize)
+
+    def stats_nursery_size(self):
+        return self.nursery_size
 
     def get_young_fixedsize(self, nursery_size):
         return nursery_size // 2 - 1
@@ -128,7 +227,7 @@ class GenerationGC(SemiSpaceGC):
         return nursery_size // 4 - 1
 
     def is_in_nursery(self, addr):
-        return self.nursery <= addr < self.nursery_top
+        return self.nursery <= addr < self.nursery_end
 
     def malloc_fixedsize_clear(self, typeid, size, can_collect,
                                has_finalizer=False, contains_weakptr=False):
@@ -149,7 +248,7 @@ class GenerationGC(SemiSpaceGC):
         totalsize = size_gc_header + size
         result = self.nursery_free
         if raw_malloc_usage(totalsize) > self.nursery_top - result:
-            result = self.collect_nursery()
+            result = self.refill_nursery_buffer(totalsize)
         llarena.arena_reserve(result, totalsize)
         # GCFLAG_NO_YOUNG_PTRS is never set on young objs
         self.init_gc_object(result, typeid, flags=0)
@@ -197,7 +296,7 @@ class GenerationGC(SemiSpaceGC):
         totalsize = size_gc_header + size + itemsize * length
         result = self.nursery_free
         if raw_malloc_usage(totalsize) > self.nursery_top - result:
-            result = self.collect_nursery()
+            result = self.refill_nursery_buffer(totalsize)
         llarena.arena_reserve(result, totalsize)
         # GCFLAG_NO_YOUNG_PTRS is never set on young objs
         self.init_gc_object(result, typeid, flags=0)
@@ -228,6 +327,8 @@ class GenerationGC(SemiSpaceGC):
         self.weakrefs_grow_older()
         self.ids_grow_older()
         self.reset_nursery()
+        if self.adaptive_nursery:
+            self.adapt_nursery_size()
         if DEBUG_PRINT:
             llop.debug_print(lltype.Void, "major collect, size changing", size_changing)
         SemiSpaceGC.semispace_collect(self, size_changing)
@@ -258,6 +359,11 @@ class GenerationGC(SemiSpaceGC):
             obj = oldlist.pop()
             hdr = self.header(obj)
             hdr.tid |= GCFLAG_NO_YOUNG_PTRS
+        # the cards are forgotten too: the arrays are about to move
+        arrays = self.old_arrays_with_cards
+        while arrays.non_empty():
+            self.free_cards(arrays.pop())
+        self.card_tables.clear()
 
     def weakrefs_grow_older(self):
         while self.young_objects_with_weakrefs.non_empty():
@@ -313,8 +419,13 @@ class GenerationGC(SemiSpaceGC):
             if DEBUG_PRINT:
                 llop.debug_print(lltype.Void, "minor collect")
             # a nursery-only collection
+            if self.stats_enabled:
+                self.stats_start_collection(1)
+            elif self.max_nursery_pause > 0.0:
+                self.stats_start_time = time.time()
             scan = beginning = self.free
             self.collect_oldrefs_to_nursery()
+            self.collect_cardrefs_to_nursery()
             self.collect_roots_in_nursery()
             scan = self.scan_objects_just_copied_out_of_nursery(scan)
             # at this point, all static and old objects have got their
@@ -323,8 +434,19 @@ class GenerationGC(SemiSpaceGC):
                 self.invalidate_young_weakrefs()
             if self.young_objects_with_id.length() > 0:
                 self.update_young_objects_with_id()
+            if self.young_objects_with_site.non_empty():
+                self.update_young_objects_with_site()
             # mark the nursery as free and fill it with zeroes again
             llarena.arena_reset(self.nursery, self.nursery_size, True)
+            if self.stats_enabled:
+                pause = self.stats_end_collection(scan - beginning)
+            elif self.max_nursery_pause > 0.0:
+                pause = time.time() - self.stats_start_time
+            else:
+                pause = 0.0
+            self.nursery_collections += 1
+            self.nursery_survived += scan - beginning
+            self.nursery_pauses += pause
             if DEBUG_PRINT:
                 llop.debug_print(lltype.Void, "percent survived:", float(scan - beginning) / self.nursery_size)
             #self.debug_check_consistency()   # -- quite expensive
@@ -333,11 +455,92 @@ class GenerationGC(SemiSpaceGC):
             # just above or by some previous non-nursery-based allocation.
             # Grab a piece of the current space for the nursery.
             self.nursery = self.free
-            self.nursery_top = self.nursery + self.nursery_size
-            self.free = self.nursery_top
+            self.nursery_end = self.nursery + self.nursery_size
+            self.free = self.nursery_end
         self.nursery_free = self.nursery
+        if self.tlab_size > 0:
+            # all the threads start again with an empty buffer
+            self.nursery_top = self.nursery
+            self.nursery_chunks_free = self.nursery
+            self.tlab_epoch += 1
+        else:
+            self.nursery_top = self.nursery_end
         return self.nursery_free
 
+    def refill_nursery_buffer(self, totalsize):
+        """Called when 'totalsize' bytes don't fit between nursery_free
+        and nursery_top.  Returns the new value of nursery_free, with
+        enough room after it.  Without thread-local allocation buffers,
+        this collects the nursery."""
+        if self.tlab_size == 0:
+            return self.collect_nursery()
+        size = raw_malloc_usage(llarena.round_up_for_allocation(totalsize))
+        if size < self.tlab_size:
+            size = min(self.tlab_size, self.nursery_size)
+        if size > self.nursery_end - self.nursery_chunks_free:
+            self.collect_nursery()
+            ll_assert(size <= self.nursery_end - self.nursery_chunks_free,
+                      "nursery too small for the allocation buffer")
+        result = self.nursery_chunks_free
+        self.nursery_chunks_free = result + size
+        self.nursery_free = result
+        self.nursery_top = result + size
+        return result
+    refill_nursery_buffer._dont_inline_ = True
+
+    def set_current_thread(self, aid):
+        """Called when the thread 'aid' takes over from the previous one.
+        Saves away the allocation buffer of the previous thread and
+        installs the one of 'aid'."""
+        if self.tlab_size == 0 or aid == self.tlab_thread:
+            return
+        if self.tlab_thread:
+            tlab = self.get_tlab(self.tlab_thread)
+            tlab.free = self.nursery_free
+            tlab.top = self.nursery_top
+            tlab.epoch = self.tlab_epoch
+        tlab = self.get_tlab(aid)
+        if tlab.epoch == self.tlab_epoch:
+            self.nursery_free = tlab.free
+            self.nursery_top = tlab.top
+        else:
+            # the nursery was collected in the meantime
+            self.nursery_free = NULL
+            self.nursery_top = NULL
+        self.tlab_thread = aid
+
+    def forget_thread(self, aid):
+        """Called when the thread 'aid' dies.  The rest of its buffer is
+        lost until the next nursery collection."""
+        if self.tlab_size == 0:
+            return
+        if aid == self.tlab_thread:
+            self.nursery_free = NULL
+            self.nursery_top = NULL
+            self.tlab_thread = NULL
+        addr = self.tlabs.get(aid)
+        if addr:
+            lltype.free(llmemory.cast_adr_to_ptr(addr, TLAB_PTR), flavor='raw')
+            self.tlabs.setitem(aid, NULL)
+            # from time to time, rehash the dictionary to remove
+            # the old NULL entries
+            self.dead_threads_count += 1
+            if (self.dead_threads_count & 511) == 0:
+                old = self.tlabs
+                self.tlabs = copy_without_null_values(old)
+                old.delete()
+
+    def get_tlab(self, aid):
+        addr = self.tlabs.get(aid)
+        if addr:
+            return llmemory.cast_adr_to_ptr(addr, TLAB_PTR)
+        tlab = lltype.malloc(TLAB, flavor='raw')
+        tlab.free = NULL
+        tlab.top = NULL
+        tlab.epoch = -1
+        self.tlabs.setitem(aid, llmemory.cast_ptr_to_adr(tlab))
+        return tlab
+
     # NB. we can use self.copy() to move objects out of the nursery,
     # but only if the object was really in the nursery.
 
@@ -355,6 +558,42 @@ class GenerationGC(SemiSpaceGC):
         if DEBUG_PRINT:
             llop.debug_print(lltype.Void, "collect_oldrefs_to_nursery", count)
 
+    def collect_cardrefs_to_nursery(self):
+        # Follow the old_arrays_with_cards list and move the young
+        # objects referenced from their marked cards out of the nursery.
+        arrays = self.old_arrays_with_cards
+        while arrays.non_empty():
+            obj = arrays.pop()
+            self.trace_cards_and_drag_out_of_nursery(obj)
+            self.free_cards(obj)
+        self.card_tables.clear()
+
+    def trace_cards_and_drag_out_of_nursery(self, obj):
+        cards = llmemory.cast_adr_to_ptr(self.card_tables.get(obj), CARDS)
+        length = (obj + llmemory.gcarrayofptr_lengthoffset).signed[0]
+        card_page_indices = self.card_page_indices
+        i = 0
+        card = 0
+        while i < length:
+            stop = i + card_page_indices
+            if cards[card] == '\x00':
+                i = stop
+            else:
+                if stop > length:
+                    stop = length
+                item = (obj + llmemory.gcarrayofptr_itemsoffset +
+                        llmemory.gcarrayofptr_singleitemoffset * i)
+                while i < stop:
+                    self._trace_drag_out(item, None)
+                    item += llmemory.gcarrayofptr_singleitemoffset
+                    i += 1
+            card += 1
+
+    def free_cards(self, obj):
+        cards = llmemory.cast_adr_to_ptr(self.card_tables.get(obj), CARDS)
+        lltype.free(cards, flavor='raw')
+        self.header(obj).tid &= ~GCFLAG_HAS_CARDS
+
     def collect_roots_in_nursery(self):
         # we don't need to trace prebuilt GcStructs during a minor collect:
         # if a prebuilt GcStruct contains a pointer to a young object,
@@ -422,6 +661,39 @@ class GenerationGC(SemiSpaceGC):
         self.write_into_last_generation_obj(addr_struct, addr)
     remember_young_pointer._dont_inline_ = True
 
+    def write_barrier_from_array(self, newvalue, addr_array, index):
+        # 'addr_array' is a GcArray of GC pointers, 'index' the index of
+        # the item that is about to be overwritten with 'newvalue'
+        if self.header(addr_array).tid & GCFLAG_NO_YOUNG_PTRS:
+            self.remember_young_pointer_from_array(addr_array, index, newvalue)
+
+    def remember_young_pointer_from_array(self, addr_array, index, addr):
+        card_page_indices = self.card_page_indices
+        if card_page_indices <= 0 or not self.is_in_nursery(addr):
+            self.remember_young_pointer(addr_array, addr)
+            return
+        ll_assert(not self.is_in_nursery(addr_array),
+                     "nursery object with GCFLAG_NO_YOUNG_PTRS")
+        hdr = self.header(addr_array)
+        if hdr.tid & GCFLAG_HAS_CARDS:
+            cards = llmemory.cast_adr_to_ptr(self.card_tables.get(addr_array),
+                                             CARDS)
+        else:
+            length = (addr_array + llmemory.gcarrayofptr_lengthoffset).signed[0]
+            if length <= card_page_indices:
+                # small array: a single card would cover it all anyway
+                self.remember_young_pointer(addr_array, addr)
+                return
+            numcards = (length + card_page_indices - 1) // card_page_indices
+            cards = lltype.malloc(CARDS.TO, numcards, flavor='raw', zero=True)
+            self.card_tables.setitem(addr_array,
+                                      llmemory.cast_ptr_to_adr(cards))
+            self.old_arrays_with_cards.append(addr_array)
+            hdr.tid |= GCFLAG_HAS_CARDS
+        cards[index // card_page_indices] = '\x01'
+        self.write_into_last_generation_obj(addr_array, addr)
+    remember_young_pointer_from_array._dont_inline_ = True
+
     def write_into_last_generation_obj(self, addr_struct, addr):
         objhdr = self.header(addr_struct)
         if objhdr.tid & GCFLAG_NO_HEAP_PTRS:
@@ -458,6 +730,13 @@ class GenerationGC(SemiSpaceGC):
     def _id_grow_older(self, obj, id, ignored):
         self.objects_with_id.setitem(obj, id)
 
+    def young_object_survives(self, obj):
+        # the objects allocated outside the nursery are counted as
+        # surviving their first minor collection
+        if self.nursery and not self.is_in_nursery(obj):
+            return True
+        return self.surviving(obj)
+
     def debug_check_object(self, obj):
         """Check the invariants about 'obj' that should be true
         between collections."""
@@ -466,7 +745,11 @@ class GenerationGC(SemiSpaceGC):
         if tid & GCFLAG_NO_YOUNG_PTRS:
             ll_assert(not self.is_in_nursery(obj),
                       "nursery object with GCFLAG_NO_YOUNG_PTRS")
-            self.trace(obj, self._debug_no_nursery_pointer, None)
+            if tid & GCFLAG_HAS_CARDS:
+                ll_assert(self.card_tables.contains(obj),
+                          "GCFLAG_HAS_CARDS but no card table")
+            else:
+                self.trace(obj, self._debug_no_nursery_pointer, None)
         elif not self.is_in_nursery(obj):
             ll_assert(self._d_oopty.contains(obj),
                       "missing from old_objects_pointing_to_young")
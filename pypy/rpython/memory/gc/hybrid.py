@@ -1,10 +1,11 @@
-import sys
+import sys, time
 from pypy.rpython.memory.gc.semispace import SemiSpaceGC
 from pypy.rpython.memory.gc.semispace import DEBUG_PRINT
 from pypy.rpython.memory.gc.generation import GenerationGC, GCFLAG_FORWARDED
 from pypy.rpython.memory.gc.semispace import GCFLAG_EXTERNAL
 from pypy.rpython.memory.gc.generation import GCFLAG_NO_YOUNG_PTRS
 from pypy.rpython.memory.gc.generation import GCFLAG_NO_HEAP_PTRS
+from pypy.rpython.memory.gc.sizeclass import SizeClassAllocator
 from pypy.rpython.lltypesystem import lltype, llmemory, llarena
 from pypy.rpython.lltypesystem.llmemory import raw_malloc_usage
 from pypy.rpython.lltypesystem.lloperation import llop
@@ -30,6 +31,10 @@ from pypy.rpython.lltypesystem import rffi
 # Object lists:
 #   * gen2_rawmalloced_objects
 #   * gen3_rawmalloced_objects
+#   * gen3_objects_to_sweep: gen3 objs not swept yet since the last
+#                            collection of generation 3 (see below)
+#   * gen3_objects_to_mark: gen3 objs marked but not traced yet by the
+#                           incremental marking of generation 3
 #   * gen2_resizable_objects
 #   * old_objects_pointing_to_young: gen2or3 objs that point to gen1 objs
 #   * last_generation_root_objects: gen3 objs that point to gen1or2 objs
@@ -42,7 +47,9 @@ from pypy.rpython.lltypesystem import rffi
 #
 # Some invariants:
 #   * gen3 are either GCFLAG_NO_HEAP_PTRS or in 'last_generation_root_objects'
-#   * between collections, GCFLAG_UNVISITED set exactly for gen2_rawmalloced
+#   * between collections, GCFLAG_UNVISITED set exactly for gen2_rawmalloced,
+#     plus the gen3 objs not marked yet while generation 3 is being marked
+#     incrementally, plus the dead objs in gen3_objects_to_sweep
 #   * objects in gen2_resizable_objects are part of the generation 2 but never
 #     explicitly listed in gen2_rawmalloced_objects.
 #
@@ -69,11 +76,35 @@ GCFLAG_AGE_MASK  = 0
 while GCFLAG_AGE_MASK < GCFLAG_AGE_MAX:
     GCFLAG_AGE_MASK |= _gcflag_next_bit
     _gcflag_next_bit <<= 1
+# Set on the resizable objects: they are always obtained from raw_malloc(),
+# even if they are small enough for the SizeClassAllocator, because they
+# are resized with raw_realloc().
+GCFLAG_RESIZABLE = _gcflag_next_bit
+_gcflag_next_bit <<= 1
 
 # The 3rd generation objects are only collected after the following
 # number of calls to semispace_collect():
 GENERATION3_COLLECT_THRESHOLD = 20
 
+# If non-zero, the collections of the 3rd generation are incremental:
+# the full collection that would collect generation 3 only starts the
+# marking of its objects, and the following nursery collections each
+# spend at most this number of seconds tracing them.  The next full
+# collection finishes the marking.  Then the dead objects are freed by
+# the following nursery collections, with the same time budget.  A
+# value of 0.0 means marking and freeing them during the full collection.
+GENERATION3_PAUSE_BUDGET = 0.0
+
+# The incremental steps check the time after every this number of objects.
+GENERATION3_STEP_CHUNK = 100
+
+# The states of the collection of generation 3 (see 'gen3_state'):
+GEN3_IDLE       = 0   # not being marked
+GEN3_COLLECTING = 1   # during a full collection that marks it all at once
+GEN3_STARTING   = 2   # during a full collection that starts the marking
+GEN3_MARKING    = 3   # between collections, while being marked incrementally
+GEN3_FINISHING  = 4   # during the full collection that finishes the marking
+
 class HybridGC(GenerationGC):
     """A two-generations semi-space GC like the GenerationGC,
     except that objects above a certain size are handled separately:
@@ -89,6 +120,10 @@ class HybridGC(GenerationGC):
     TRANSLATION_PARAMS['large_object'] = 6*1024    # XXX adjust
     TRANSLATION_PARAMS['large_object_gcptrs'] = 31*1024    # XXX adjust
     TRANSLATION_PARAMS['min_nursery_size'] = 128*1024
+    TRANSLATION_PARAMS['generation3_pause_budget'] = 0.002    # XXX adjust
+    TRANSLATION_PARAMS['small_request_threshold'] = 512
+    TRANSLATION_PARAMS['page_size'] = 4096
+    TRANSLATION_PARAMS['arena_size'] = 256*1024
     # condition: large_object <= large_object_gcptrs < min_nursery_size/4
 
     def __init__(self, *args, **kwds):
@@ -96,6 +131,15 @@ class HybridGC(GenerationGC):
         large_object_gcptrs = kwds.pop('large_object_gcptrs', 32)
         self.generation3_collect_threshold = kwds.pop(
             'generation3_collect_threshold', GENERATION3_COLLECT_THRESHOLD)
+        self.generation3_pause_budget = kwds.pop(
+            'generation3_pause_budget', GENERATION3_PAUSE_BUDGET)
+        self.generation3_step_chunk = kwds.pop(
+            'generation3_step_chunk', GENERATION3_STEP_CHUNK)
+        # the external objects up to 'small_request_threshold' bytes are
+        # allocated by a SizeClassAllocator instead of by raw_malloc()
+        self.small_request_threshold = kwds.pop('small_request_threshold', 0)
+        self.page_size = kwds.pop('page_size', 256)
+        self.arena_size = kwds.pop('arena_size', 4096)
         GenerationGC.__init__(self, *args, **kwds)
 
         # Objects whose total size is at least 'large_object' bytes are
@@ -119,11 +163,18 @@ class HybridGC(GenerationGC):
             self._initial_trigger = self.large_objects_collect_trigger
         self.rawmalloced_objects_to_trace = self.AddressStack()
         self.count_semispaceonly_collects = 0
+        self.gen3_state = GEN3_IDLE
+        self.gen3_incremental = self.generation3_pause_budget > 0.0
+        self.rawmalloced_total_size = 0
 
     def setup(self):
         self.gen2_rawmalloced_objects = self.AddressStack()
         self.gen3_rawmalloced_objects = self.AddressStack()
+        self.gen3_objects_to_sweep = self.AddressStack()
+        self.gen3_objects_to_mark = self.AddressStack()
         self.gen2_resizable_objects = self.AddressStack()
+        self.sizeclasses = SizeClassAllocator(self.arena_size, self.page_size,
+                                              self.small_request_threshold)
         GenerationGC.setup(self)
 
     def set_max_heap_size(self, size):
@@ -198,6 +249,8 @@ class HybridGC(GenerationGC):
         if force_nonmovable or raw_malloc_usage(totalsize) > nonlarge_max:
             result = self.malloc_varsize_marknsweep(totalsize, resizable)
             flags = self.GCFLAGS_FOR_NEW_EXTERNAL_OBJECTS | GCFLAG_UNVISITED
+            if resizable:
+                flags |= GCFLAG_RESIZABLE
         else:
             result = self.malloc_varsize_collecting_nursery(totalsize)
             flags = self.GCFLAGS_FOR_NEW_YOUNG_OBJECTS
@@ -248,6 +301,8 @@ class HybridGC(GenerationGC):
             self.gen2_resizable_objects.append(result + size_gc_header)
         else:
             self.gen2_rawmalloced_objects.append(result + size_gc_header)
+        self.rawmalloced_total_size += (raw_malloc_usage(tot_size) -
+                                        raw_malloc_usage(old_tot_size))
         self._check_rawsize_alloced(raw_malloc_usage(tot_size) -
                                     raw_malloc_usage(old_tot_size),
                                     can_collect = not grow)
@@ -259,7 +314,7 @@ class HybridGC(GenerationGC):
         return not (tid & GCFLAG_EXTERNAL)
 
     def malloc_varsize_collecting_nursery(self, totalsize):
-        result = self.collect_nursery()
+        result = self.refill_nursery_buffer(totalsize)
         ll_assert(raw_malloc_usage(totalsize) <= self.nursery_top - result,
                   "not enough room in malloc_varsize_collecting_nursery()")
         llarena.arena_reserve(result, totalsize)
@@ -286,9 +341,13 @@ class HybridGC(GenerationGC):
         # XXX many many collections if the program allocates a lot
         # XXX more than the current self.space_size.
         self._check_rawsize_alloced(raw_malloc_usage(totalsize))
-        result = self.allocate_external_object(totalsize)
+        if resizable:
+            result = llmemory.raw_malloc(totalsize)
+        else:
+            result = self.allocate_external_object(totalsize)
         if not result:
             raise MemoryError()
+        self.rawmalloced_total_size += raw_malloc_usage(totalsize)
         # The parent classes guarantee zero-filled allocations, so we
         # need to follow suit.
         llmemory.raw_memclear(result, totalsize)
@@ -300,8 +359,8 @@ class HybridGC(GenerationGC):
         return result
 
     def allocate_external_object(self, totalsize):
-        # XXX maybe we should use arena_malloc() above a certain size?
-        # If so, we'd also use arena_reset() in malloc_varsize_marknsweep().
+        if raw_malloc_usage(totalsize) <= self.small_request_threshold:
+            return self.sizeclasses.malloc(totalsize)
         return llmemory.raw_malloc(totalsize)
 
     def init_gc_object_immortal(self, addr, typeid,
@@ -317,8 +376,44 @@ class HybridGC(GenerationGC):
     # external objects of 3rd generation.
 
     def collect(self):
+        # a complete collection: if the marking of generation 3 is in
+        # progress, it is finished; otherwise it is done all at once.
         self.count_semispaceonly_collects = self.generation3_collect_threshold
+        incremental = self.gen3_incremental
+        self.gen3_incremental = False
         GenerationGC.collect(self)
+        self.gen3_incremental = incremental
+        self.finish_gen3_sweep()
+
+    def collect_nursery(self):
+        if self.gen3_state == GEN3_MARKING:
+            # the objects in old_objects_pointing_to_young are not seen
+            # by the write barrier any more; trace again the marked
+            # gen3 ones, as they may have received pointers to unmarked
+            # gen3 objects in the meantime
+            self.old_objects_pointing_to_young.foreach(self._mark_again,
+                                                       None)
+        # do a bounded step of the pending marking or sweeping of
+        # generation 3, if any
+        if (self.gen3_objects_to_mark.non_empty() or
+                self.gen3_objects_to_sweep.non_empty()):
+            self.gen3_step()
+        return GenerationGC.collect_nursery(self)
+
+    def reset_young_gcflags(self):
+        # see collect_nursery()
+        if self.gen3_state == GEN3_MARKING:
+            self.old_objects_pointing_to_young.foreach(self._mark_again,
+                                                       None)
+        GenerationGC.reset_young_gcflags(self)
+
+    def remember_young_pointer(self, addr_struct, addr):
+        GenerationGC.remember_young_pointer(self, addr_struct, addr)
+        if self.gen3_state == GEN3_MARKING and addr != llmemory.NULL:
+            # a pointer to 'addr' is written into an old object, which
+            # may have been traced already by the incremental marking
+            self.mark_gen3_object(addr)
+    remember_young_pointer._dont_inline_ = True
 
     def is_collecting_gen3(self):
         count = self.count_semispaceonly_collects
@@ -329,14 +424,29 @@ class HybridGC(GenerationGC):
 
     def starting_full_collect(self):
         # At the start of a collection, the GCFLAG_UNVISITED bit is set
-        # exactly on the objects in gen2_rawmalloced_objects.  Only
-        # raw_malloc'ed objects can ever have this bit set.
+        # exactly on the objects in gen2_rawmalloced_objects, plus the
+        # gen3 objects not marked yet if the marking of generation 3 is
+        # in progress.  Only raw_malloc'ed objects can ever have this bit.
         self.count_semispaceonly_collects += 1
-        if self.is_collecting_gen3():
-            # set the GCFLAG_UNVISITED on all rawmalloced generation-3 objects
-            # as well, to let them be recorded by visit_external_object()
-            self.gen3_rawmalloced_objects.foreach(self._set_gcflag_unvisited,
-                                                  None)
+        if self.gen3_state == GEN3_MARKING:
+            # this collection finishes the marking of generation 3
+            self.gen3_state = GEN3_FINISHING
+            self.stats_generation = 3
+        else:
+            # the sweep of the previous collection of generation 3 must be
+            # finished before we mark these objects again
+            self.finish_gen3_sweep()
+            if self.is_collecting_gen3():
+                self.stats_generation = 3
+                # set the GCFLAG_UNVISITED on all rawmalloced generation-3
+                # objects as well, to let them be recorded by
+                # visit_external_object()
+                self.gen3_rawmalloced_objects.foreach(
+                    self._set_gcflag_unvisited, None)
+                if self.gen3_incremental:
+                    self.gen3_state = GEN3_STARTING
+                else:
+                    self.gen3_state = GEN3_COLLECTING
         ll_assert(not self.rawmalloced_objects_to_trace.non_empty(),
                   "rawmalloced_objects_to_trace should be empty at start")
         if DEBUG_PRINT:
@@ -349,9 +459,10 @@ class HybridGC(GenerationGC):
         self.header(obj).tid |= GCFLAG_UNVISITED
 
     def collect_roots(self):
-        if not self.is_collecting_gen3():
+        state = self.gen3_state
+        if state == GEN3_IDLE:
             GenerationGC.collect_roots(self)
-        else:
+        elif state == GEN3_COLLECTING:
             # as we don't record which prebuilt gc objects point to
             # rawmalloced generation 3 objects, we have to trace all
             # the prebuilt gc objects.
@@ -359,6 +470,23 @@ class HybridGC(GenerationGC):
                 SemiSpaceGC._collect_root,  # stack roots
                 SemiSpaceGC._collect_root,  # static in prebuilt non-gc structs
                 SemiSpaceGC._collect_root)  # static in prebuilt gc objects
+        else:
+            # Incremental marking of generation 3.  The objects of
+            # last_generation_root_objects are needed to update their
+            # pointers to the objects we move, but they must not mark
+            # the gen3 objects they point to: they are not roots for
+            # generation 3, and a dead one would keep its referents alive.
+            self.gen3_state = GEN3_IDLE
+            self.collect_last_generation_roots()
+            self.gen3_state = state
+            # the prebuilt gc objects that point to gen1or2 objects were
+            # just traced; we only have to mark the gen3 objects they
+            # point to, like GenerationGC.collect_roots() except that it
+            # doesn't look at them at all.
+            self.root_walker.walk_roots(
+                SemiSpaceGC._collect_root,  # stack roots
+                SemiSpaceGC._collect_root,  # static in prebuilt non-gc structs
+                HybridGC._mark_gen3_root)   # static in prebuilt gc objects
 
     def surviving(self, obj):
         # To use during a collection.  The objects that survive are the
@@ -366,7 +494,13 @@ class HybridGC(GenerationGC):
         # This is equivalent to self.is_forwarded() for all objects except
         # the ones obtained by raw_malloc.
         flags = self.header(obj).tid & (GCFLAG_FORWARDED|GCFLAG_UNVISITED)
-        return flags == GCFLAG_FORWARDED
+        if flags == GCFLAG_FORWARDED:
+            return True
+        # while the incremental marking of generation 3 is only starting,
+        # all the gen3 objects are considered alive
+        return (self.gen3_state == GEN3_STARTING and
+                flags == GCFLAG_FORWARDED|GCFLAG_UNVISITED and
+                self.is_last_generation(obj))
 
     def is_last_generation(self, obj):
         return ((self.header(obj).tid & (GCFLAG_EXTERNAL|GCFLAG_AGE_MASK)) ==
@@ -375,9 +509,17 @@ class HybridGC(GenerationGC):
     def visit_external_object(self, obj):
         hdr = self.header(obj)
         if hdr.tid & GCFLAG_UNVISITED:
-            # This is a not-visited-yet raw_malloced object.
-            hdr.tid -= GCFLAG_UNVISITED
-            self.rawmalloced_objects_to_trace.append(obj)
+            if (self.gen3_state == GEN3_COLLECTING or
+                    not self.is_last_generation(obj)):
+                # This is a not-visited-yet raw_malloced object.
+                hdr.tid -= GCFLAG_UNVISITED
+                self.rawmalloced_objects_to_trace.append(obj)
+            elif self.gen3_state != GEN3_IDLE:
+                # A gen3 object during the incremental marking: it only
+                # needs to be marked, as the gen3 objects that point to
+                # gen1or2 objects are already traced by
+                # collect_last_generation_roots().
+                self.mark_gen3_object(obj)
 
     def make_a_copy(self, obj, objsize):
         # During a full collect, all copied objects might implicitly come
@@ -414,6 +556,9 @@ class HybridGC(GenerationGC):
         newaddr = self.allocate_external_object(totalsize)
         if not newaddr:
             return llmemory.NULL   # can't raise MemoryError during a collect()
+        self.rawmalloced_total_size += raw_malloc_usage(totalsize)
+        if self.stats_enabled:
+            self.stats_survivors += 1
         if DEBUG_PRINT:
             self._nonmoving_copy_count += 1
             self._nonmoving_copy_size += raw_malloc_usage(totalsize)
@@ -445,6 +590,9 @@ class HybridGC(GenerationGC):
                 obj = self.rawmalloced_objects_to_trace.pop()
                 self.trace_and_copy(obj)
                 progress = True
+            if self.gen3_state == GEN3_FINISHING:
+                # marking gen3 objects doesn't copy anything
+                self.mark_gen3_objects(-1)
         return scan
 
     def finished_full_collect(self):
@@ -456,14 +604,24 @@ class HybridGC(GenerationGC):
                              self._nonmoving_copy_size, "bytes in",
                              self._nonmoving_copy_count, "objs")
         # sweep the nonmarked rawmalloced objects
-        if self.is_collecting_gen3():
-            self.sweep_rawmalloced_objects(generation=3)
+        state = self.gen3_state
+        if state == GEN3_COLLECTING or state == GEN3_FINISHING:
+            ll_assert(not self.gen3_objects_to_mark.non_empty(),
+                      "gen3_objects_to_mark should be empty at end")
+            if self.gen3_incremental:
+                self.start_gen3_sweep()
+            else:
+                self.sweep_rawmalloced_objects(generation=3)
         self.sweep_rawmalloced_objects(generation=2)
         self.sweep_rawmalloced_objects(generation=-2)
+        self.sizeclasses.release_free_pages()
         # As we just collected, it's fine to raw_malloc'ate up to space_size
         # bytes again before we should force another collect.
         self.large_objects_collect_trigger = self.space_size
-        if self.is_collecting_gen3():
+        if state == GEN3_STARTING:
+            self.gen3_state = GEN3_MARKING
+        elif state != GEN3_IDLE:
+            self.gen3_state = GEN3_IDLE
             self.count_semispaceonly_collects = 0
         if DEBUG_PRINT:
             self._initial_trigger = self.large_objects_collect_trigger
@@ -480,16 +638,7 @@ class HybridGC(GenerationGC):
             # next collect_last_generation_roots().
         elif generation == 3:
             objects = self.gen3_rawmalloced_objects
-            # generation 3 sweep: remove from last_generation_root_objects
-            # all the objects that we are about to free
-            gen3roots = self.last_generation_root_objects
-            newgen3roots = self.AddressStack()
-            while gen3roots.non_empty():
-                obj = gen3roots.pop()
-                if not (self.header(obj).tid & GCFLAG_UNVISITED):
-                    newgen3roots.append(obj)
-            gen3roots.delete()
-            self.last_generation_root_objects = newgen3roots
+            self.remove_dead_gen3_roots()
         else:
             # mostly a hack: the generation number -2 is the part of the
             # generation 2 that lives in gen2_resizable_objects
@@ -505,8 +654,7 @@ class HybridGC(GenerationGC):
             if tid & GCFLAG_UNVISITED:
                 if DEBUG_PRINT:dead_count+=1
                 if DEBUG_PRINT:dead_size+=raw_malloc_usage(self.get_size(obj))
-                addr = obj - self.gcheaderbuilder.size_gc_header
-                llmemory.raw_free(addr)
+                self.free_rawmalloced_object(obj)
             else:
                 if DEBUG_PRINT:alive_count+=1
                 if DEBUG_PRINT:alive_size+=raw_malloc_usage(self.get_size(obj))
@@ -550,6 +698,117 @@ class HybridGC(GenerationGC):
                              dead_size, "bytes in",
                              dead_count, "objs")
 
+    def free_rawmalloced_object(self, obj):
+        size_gc_header = self.gcheaderbuilder.size_gc_header
+        totalsize = size_gc_header + self.get_size(obj)
+        self.rawmalloced_total_size -= raw_malloc_usage(totalsize)
+        if (raw_malloc_usage(totalsize) <= self.small_request_threshold and
+                not (self.header(obj).tid & GCFLAG_RESIZABLE)):
+            self.sizeclasses.free(obj - size_gc_header, totalsize)
+        else:
+            llmemory.raw_free(obj - size_gc_header)
+
+    def stats_rawmalloced_bytes(self):
+        return self.rawmalloced_total_size
+
+    def remove_dead_gen3_roots(self):
+        # generation 3 sweep: remove from last_generation_root_objects
+        # all the objects that we are about to free
+        gen3roots = self.last_generation_root_objects
+        newgen3roots = self.AddressStack()
+        while gen3roots.non_empty():
+            obj = gen3roots.pop()
+            if not (self.header(obj).tid & GCFLAG_UNVISITED):
+                newgen3roots.append(obj)
+        gen3roots.delete()
+        self.last_generation_root_objects = newgen3roots
+
+    # The incremental marking of generation 3.  The marked objects that
+    # still need to be traced are in 'gen3_objects_to_mark'.  Between
+    # collections, the write barrier marks the gen3 objects stored into
+    # old objects, so that an object we already traced cannot hide an
+    # unmarked one.  The roots and the objects of generations 1 and 2
+    # are only looked at by the full collection that finishes the marking.
+
+    def mark_gen3_object(self, obj):
+        hdr = self.header(obj)
+        if hdr.tid & GCFLAG_UNVISITED and self.is_last_generation(obj):
+            hdr.tid -= GCFLAG_UNVISITED
+            self.gen3_objects_to_mark.append(obj)
+
+    def _mark_gen3_pointer(self, pointer, ignored):
+        if pointer.address[0] != llmemory.NULL:
+            self.mark_gen3_object(pointer.address[0])
+
+    def _mark_gen3_root(self, root):
+        if root.address[0] != llmemory.NULL:
+            self.mark_gen3_object(root.address[0])
+
+    def _mark_again(self, obj, ignored):
+        if (self.is_last_generation(obj) and
+                not (self.header(obj).tid & GCFLAG_UNVISITED)):
+            self.gen3_objects_to_mark.append(obj)
+
+    def mark_gen3_objects(self, count):
+        # trace 'count' objects at most, or all of them if count < 0;
+        # return True if some are left
+        objects = self.gen3_objects_to_mark
+        while count != 0 and objects.non_empty():
+            obj = objects.pop()
+            self.trace(obj, self._mark_gen3_pointer, None)
+            count -= 1
+        return objects.non_empty()
+
+    # The incremental version of sweep_rawmalloced_objects(generation=3).
+    # The objects to sweep are moved to 'gen3_objects_to_sweep': the dead
+    # ones still have GCFLAG_UNVISITED set, but nothing can reach them
+    # any more, and the surviving ones are moved back to
+    # 'gen3_rawmalloced_objects' as we go.
+
+    def start_gen3_sweep(self):
+        self.remove_dead_gen3_roots()
+        ll_assert(not self.gen3_objects_to_sweep.non_empty(),
+                  "gen3_objects_to_sweep should be empty")
+        self.gen3_objects_to_sweep.delete()
+        self.gen3_objects_to_sweep = self.gen3_rawmalloced_objects
+        self.gen3_rawmalloced_objects = self.AddressStack()
+
+    def sweep_gen3_step(self, count):
+        # look at 'count' objects at most, or at all of them if count < 0;
+        # return True if some are left
+        objects = self.gen3_objects_to_sweep
+        while count != 0 and objects.non_empty():
+            obj = objects.pop()
+            if self.header(obj).tid & GCFLAG_UNVISITED:
+                self.free_rawmalloced_object(obj)
+            else:
+                self.gen3_rawmalloced_objects.append(obj)
+            count -= 1
+        if not objects.non_empty():
+            self.sizeclasses.release_free_pages()
+            return False
+        return True
+
+    def finish_gen3_sweep(self):
+        if self.gen3_objects_to_sweep.non_empty():
+            self.sweep_gen3_step(-1)
+
+    def gen3_step(self):
+        # mark or sweep generation 3 for 'generation3_pause_budget'
+        # seconds, looking at the time every 'generation3_step_chunk'
+        # objects.  Marking and sweeping never overlap.
+        deadline = self.gen3_time() + self.generation3_pause_budget
+        while True:
+            if self.gen3_objects_to_mark.non_empty():
+                left = self.mark_gen3_objects(self.generation3_step_chunk)
+            else:
+                left = self.sweep_gen3_step(self.generation3_step_chunk)
+            if not left or self.gen3_time() >= deadline:
+                break
+
+    def gen3_time(self):
+        return time.time()      # replaced by the tests
+
     def _compute_id_for_external(self, obj):
         # the base classes make the assumption that all external objects
         # have an id equal to their address.  This is wrong if the object
@@ -572,7 +831,9 @@ class HybridGC(GenerationGC):
         GenerationGC.debug_check_object(self, obj)
         tid = self.header(obj).tid
         if tid & GCFLAG_UNVISITED:
-            ll_assert(self._d_gen2ro.contains(obj),
+            ll_assert(self._d_gen2ro.contains(obj) or
+                      (self.gen3_state == GEN3_MARKING and
+                       self.is_last_generation(obj)),
                       "GCFLAG_UNVISITED on non-gen2 object")
 
     def debug_check_consistency(self):
@@ -582,6 +843,17 @@ class HybridGC(GenerationGC):
             self._d_gen2ro.delete()
             self.gen2_rawmalloced_objects.foreach(self._debug_check_gen2, None)
             self.gen3_rawmalloced_objects.foreach(self._debug_check_gen3, None)
+            # the objects still to sweep: the dead ones are unreachable
+            # and keep their GCFLAG_UNVISITED until they are freed
+            ll_assert(self.gen3_state == GEN3_IDLE or
+                      not self.gen3_objects_to_sweep.non_empty(),
+                      "sweeping generation 3 while marking it")
+            self.gen3_objects_to_sweep.foreach(self._debug_check_gen3_age,
+                                               None)
+            ll_assert(self.gen3_state == GEN3_MARKING or
+                      not self.gen3_objects_to_mark.non_empty(),
+                      "gen3_objects_to_mark should be empty")
+            self.gen3_objects_to_mark.foreach(self._debug_check_marked, None)
 
     def _debug_check_gen2(self, obj, ignored):
         tid = self.header(obj).tid
@@ -592,13 +864,21 @@ class HybridGC(GenerationGC):
         ll_assert((tid & GCFLAG_AGE_MASK) < GCFLAG_AGE_MAX,
                   "gen2: age field too large")
     def _debug_check_gen3(self, obj, ignored):
+        self._debug_check_gen3_age(obj, ignored)
+        if self.gen3_state != GEN3_MARKING:
+            ll_assert(not (self.header(obj).tid & GCFLAG_UNVISITED),
+                      "gen3: unexpected GCFLAG_UNVISITED")
+    def _debug_check_gen3_age(self, obj, ignored):
         tid = self.header(obj).tid
         ll_assert(bool(tid & GCFLAG_EXTERNAL),
                   "gen3: missing GCFLAG_EXTERNAL")
-        ll_assert(not (tid & GCFLAG_UNVISITED),
-                  "gen3: unexpected GCFLAG_UNVISITED")
         ll_assert((tid & GCFLAG_AGE_MASK) == GCFLAG_AGE_MAX,
                   "gen3: wrong age field")
+    def _debug_check_marked(self, obj, ignored):
+        ll_assert(self.is_last_generation(obj),
+                  "gen3_objects_to_mark: not a gen3 object")
+        ll_assert(not (self.header(obj).tid & GCFLAG_UNVISITED),
+                  "gen3_objects_to_mark: unexpected GCFLAG_UNVISITED")
 
     def can_malloc_nonmovable(self):
         return True
@@ -0,0 +1,334 @@
+from pypy.rpython.lltypesystem.llmemory import raw_memmove
+from pypy.rpython.lltypesystem.llmemory import NULL, raw_malloc_usage
+from pypy.rpython.memory.support import DEFAULT_CHUNK_SIZE
+from pypy.rpython.memory.gc.semispace import SemiSpaceGC, TYPEID_MASK
+from pypy.rpython.memory.gc.semispace import GCFLAG_EXTERNAL
+from pypy.rpython.memory.gc.semispace import GCFLAG_FINALIZATION_ORDERING
+from pypy.rpython.lltypesystem import lltype, llmemory, llarena
+from pypy.rlib.debug import ll_assert
+
+import sys
+
+# The SemiSpaceGC and its subclasses need a second space as large as the
+# first one to copy the surviving objects into.  This GC uses a single
+# space instead, and compacts the surviving objects at its beginning:
+#
+#   1. mark all the reachable objects, setting GCFLAG_MARKBIT in their
+#      header, and count them;
+#
+#   2. walk the space and compute the future address of each marked
+#      object, which is the total size of the marked objects before it.
+#      The header of the object is replaced by its number: the original
+#      header goes to self.tid_backup[number] and the new offset to
+#      self.forward_offsets[number], both arrays having one entry per
+#      surviving object only;
+#
+#   3. update all the references, in the roots and in the surviving
+#      objects, to the new addresses;
+#
+#   4. walk the space again, restoring the headers and sliding the
+#      objects to their new address with raw_memmove().
+#
+# The finalizers, weakrefs and id() logic are the ones of the
+# SemiSpaceGC: copy() means "mark" and get_forwarding_address() returns
+# the object itself until step 2 computed its new address.
+
+first_gcflag = SemiSpaceGC.first_unused_gcflag
+GCFLAG_MARKBIT = first_gcflag
+
+FORWARD_OFFSETS = lltype.Array(lltype.Signed, hints={'nolength': True})
+
+memoryError = MemoryError()
+
+
+class MarkCompactGC(SemiSpaceGC):
+    _alloc_flavor_ = "raw"
+    first_unused_gcflag = first_gcflag << 1
+
+    TRANSLATION_PARAMS = {'space_size': 8*1024*1024} # XXX adjust
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, space_size=4096,
+                 max_space_size=sys.maxint//2+1):
+        SemiSpaceGC.__init__(self, chunk_size, space_size, max_space_size)
+        self.num_alive_objs = 0
+        self.tid_backup = lltype.nullptr(FORWARD_OFFSETS)
+        self.forward_offsets = lltype.nullptr(FORWARD_OFFSETS)
+        self.base_forwarding_addr = NULL
+
+    def setup(self):
+        self.space = llarena.arena_malloc(self.space_size, True)
+        ll_assert(bool(self.space), "couldn't allocate the GC space")
+        self.free = self.space
+        self.top_of_space = self.space + self.space_size
+        self.objects_with_finalizers = self.AddressDeque()
+        self.run_finalizers = self.AddressDeque()
+        self.objects_with_weakrefs = self.AddressStack()
+        self.objects_with_id = self.AddressDict()
+        self.setup_collection_stats()
+
+    def init_gc_object_immortal(self, addr, typeid, flags=0):
+        hdr = llmemory.cast_adr_to_ptr(addr, lltype.Ptr(self.HDR))
+        hdr.tid = typeid | flags | GCFLAG_EXTERNAL
+
+    def try_obtain_free_space(self, needed):
+        needed = raw_malloc_usage(needed)
+        if (self.red_zone >= 2 and self.space_size < self.max_space_size and
+            self.markcompact_collect(self.space_size * 2)):
+            pass    # compacted into a space twice as big
+        else:
+            self.markcompact_collect()
+        missing = needed - (self.top_of_space - self.free)
+        if missing <= 0:
+            return True      # success
+        # grow the space enough for the object, if possible, by compacting
+        # the objects into a new bigger space
+        proposed_size = self.space_size
+        while missing > 0:
+            if proposed_size >= self.max_space_size:
+                return False    # no way
+            missing -= proposed_size
+            proposed_size *= 2
+        if not self.markcompact_collect(proposed_size, size_changing=True):
+            return False        # out of memory
+        ll_assert(needed <= self.top_of_space - self.free,
+                  "markcompact_collect() failed to grow the space")
+        return True
+
+    def collect(self):
+        self.debug_check_consistency()
+        self.markcompact_collect()
+
+    def markcompact_collect(self, newsize=0, size_changing=False):
+        """Collect and compact the surviving objects.  If 'newsize' is
+        given, they are compacted into a new space of this size; returns
+        False if it cannot be allocated."""
+        if newsize == 0 or newsize == self.space_size:
+            newsize = self.space_size
+            toaddr = llarena.arena_new_view(self.space)
+        else:
+            toaddr = llarena.arena_malloc(newsize, True)
+            if not toaddr:
+                return False
+        if self.stats_enabled:
+            self.stats_start_collection(2)
+        self.red_zone = 0
+        # step 1: mark
+        self.num_alive_objs = 0
+        self.to_see = self.AddressStack()
+        self.collect_roots()
+        if self.run_finalizers.non_empty():
+            self.update_run_finalizers()
+        self.scan_copied(NULL)
+        if self.objects_with_finalizers.non_empty():
+            self.deal_with_objects_with_finalizers(NULL)
+        self.to_see.delete()
+        # step 2: compute the new addresses
+        num = self.num_alive_objs
+        self.tid_backup = lltype.malloc(FORWARD_OFFSETS, num, flavor='raw')
+        self.forward_offsets = lltype.malloc(FORWARD_OFFSETS, num,
+                                             flavor='raw')
+        self.base_forwarding_addr = toaddr
+        finaladdr = self.update_forward_pointers(toaddr)
+        if self.objects_with_weakrefs.non_empty():
+            self.invalidate_weakrefs()
+        self.update_objects_with_id()
+        if self.young_objects_with_site.non_empty():
+            self.update_young_objects_with_site()
+        self.objects_with_finalizers = self.forward_deque(
+            self.objects_with_finalizers)
+        self.run_finalizers = self.forward_deque(self.run_finalizers)
+        # step 3: update the references
+        self.update_references()
+        # step 4: move the objects
+        oldspace = self.space
+        oldfree = self.free
+        self.compact()
+        lltype.free(self.tid_backup, flavor='raw')
+        lltype.free(self.forward_offsets, flavor='raw')
+        self.tid_backup = lltype.nullptr(FORWARD_OFFSETS)
+        self.forward_offsets = lltype.nullptr(FORWARD_OFFSETS)
+        self.base_forwarding_addr = NULL
+        if newsize == self.space_size:
+            # same memory: the old view is only cleared when not
+            # translated, and the end of the space must be zeroed again
+            llarena.arena_reset(oldspace, self.space_size, False)
+            used_before = oldfree - oldspace
+            used_now = finaladdr - toaddr
+            llarena.arena_reset(finaladdr, used_before - used_now, True)
+        else:
+            llarena.arena_free(oldspace)
+            self.space_size = newsize
+        self.space = toaddr
+        self.free = finaladdr
+        self.top_of_space = toaddr + self.space_size
+        self.debug_check_consistency()
+        if self.stats_enabled:
+            self.stats_survivors = self.num_alive_objs
+            self.stats_end_collection(finaladdr - toaddr)
+        if not size_changing:
+            self.record_red_zone()
+            self.execute_finalizers()
+        return True
+
+    # ____________________________________________________________
+    # step 1
+
+    def collect_roots(self):
+        self.root_walker.walk_roots(
+            MarkCompactGC._mark_root,  # stack roots
+            MarkCompactGC._mark_root,  # static in prebuilt non-gc structures
+            MarkCompactGC._mark_root)  # static in prebuilt gc objects
+
+    def _mark_root(self, root):
+        self.copy(root.address[0])
+
+    def copy(self, obj):
+        # for the logic inherited from the SemiSpaceGC: mark 'obj' as
+        # surviving, and remember to trace it later
+        hdr = self.header(obj)
+        if hdr.tid & (GCFLAG_MARKBIT | GCFLAG_EXTERNAL) == 0:
+            hdr.tid |= GCFLAG_MARKBIT
+            self.num_alive_objs += 1
+            self.to_see.append(obj)
+        return obj
+
+    def scan_copied(self, scan):
+        while self.to_see.non_empty():
+            obj = self.to_see.pop()
+            self.trace(obj, self._mark_ref, None)
+        return scan
+
+    def _mark_ref(self, pointer, ignored):
+        if pointer.address[0] != NULL:
+            self.copy(pointer.address[0])
+
+    def surviving(self, obj):
+        tid = self.header(obj).tid
+        return tid < 0 or tid & (GCFLAG_MARKBIT | GCFLAG_EXTERNAL) != 0
+
+    # ____________________________________________________________
+    # step 2
+
+    def update_forward_pointers(self, toaddr):
+        size_gc_header = self.gcheaderbuilder.size_gc_header
+        fromaddr = self.space
+        num = 0
+        while fromaddr < self.free:
+            obj = fromaddr + size_gc_header
+            hdr = self.header(obj)
+            objsize = self.get_size(obj)
+            totalsize = size_gc_header + objsize
+            if hdr.tid & GCFLAG_MARKBIT:
+                # this also tells arena_new_view() what object lives there
+                llarena.arena_reserve(toaddr, totalsize)
+                self.tid_backup[num] = hdr.tid & ~GCFLAG_MARKBIT
+                self.forward_offsets[num] = toaddr - self.base_forwarding_addr
+                hdr.tid = ~num
+                num += 1
+                toaddr += totalsize
+            fromaddr += totalsize
+        ll_assert(num == self.num_alive_objs, "bad number of marked objects")
+        return toaddr
+
+    def get_type_id(self, addr):
+        tid = self.header(addr).tid
+        if tid < 0:
+            tid = self.tid_backup[~tid]
+        return tid & TYPEID_MASK
+
+    def get_forwarding_address(self, obj):
+        tid = self.header(obj).tid
+        if tid < 0:
+            size_gc_header = self.gcheaderbuilder.size_gc_header
+            hdraddr = self.base_forwarding_addr + self.forward_offsets[~tid]
+            return hdraddr + size_gc_header
+        else:
+            return obj    # external objects, or not computed yet
+
+    def invalidate_weakrefs(self):
+        # like the version of the SemiSpaceGC, but the weakref objects
+        # are still at their old address
+        new_with_weakref = self.AddressStack()
+        while self.objects_with_weakrefs.non_empty():
+            obj = self.objects_with_weakrefs.pop()
+            if not self.surviving(obj):
+                continue # weakref itself dies
+            offset = self.weakpointer_offset(self.get_type_id(obj))
+            pointing_to = (obj + offset).address[0]
+            if pointing_to:
+                if self.surviving(pointing_to):
+                    (obj + offset).address[0] = self.get_forwarding_address(
+                        pointing_to)
+                    new_with_weakref.append(self.get_forwarding_address(obj))
+                else:
+                    (obj + offset).address[0] = NULL
+        self.objects_with_weakrefs.delete()
+        self.objects_with_weakrefs = new_with_weakref
+
+    def forward_deque(self, deque):
+        new_deque = self.AddressDeque()
+        while deque.non_empty():
+            obj = deque.popleft()
+            new_deque.append(self.get_forwarding_address(obj))
+        deque.delete()
+        return new_deque
+
+    # ____________________________________________________________
+    # step 3
+
+    def update_references(self):
+        self.root_walker.walk_roots(
+            MarkCompactGC._update_root,  # stack roots
+            MarkCompactGC._update_root,  # static in prebuilt non-gc structures
+            MarkCompactGC._update_root)  # static in prebuilt gc objects
+        size_gc_header = self.gcheaderbuilder.size_gc_header
+        fromaddr = self.space
+        while fromaddr < self.free:
+            obj = fromaddr + size_gc_header
+            if self.header(obj).tid < 0:
+                self.trace(obj, self._update_ref, None)
+            fromaddr += size_gc_header + self.get_size(obj)
+
+    def _update_root(self, root):
+        root.address[0] = self.get_forwarding_address(root.address[0])
+
+    def _update_ref(self, pointer, ignored):
+        if pointer.address[0] != NULL:
+            pointer.address[0] = self.get_forwarding_address(
+                pointer.address[0])
+
+    # ____________________________________________________________
+    # step 4
+
+    def compact(self):
+        size_gc_header = self.gcheaderbuilder.size_gc_header
+        fromaddr = self.space
+        while fromaddr < self.free:
+            obj = fromaddr + size_gc_header
+            hdr = self.header(obj)
+            tid = hdr.tid
+            if tid < 0:
+                newobj = self.get_forwarding_address(obj)
+                hdr.tid = self.tid_backup[~tid]
+                totalsize = size_gc_header + self.get_size(obj)
+                raw_memmove(fromaddr, newobj - size_gc_header, totalsize)
+            else:
+                totalsize = size_gc_header + self.get_size(obj)
+            fromaddr += totalsize
+
+    # ____________________________________________________________
+
+    def debug_check_object(self, obj):
+        """Check the invariants about 'obj' that should be true
+        between collections."""
+        tid = self.header(obj).tid
+        ll_assert(tid >= 0, "bug: forwarded object")
+        if tid & GCFLAG_EXTERNAL:
+            ll_assert(not (self.space <= obj < self.free),
+                      "external flag but object inside the space")
+        else:
+            ll_assert(self.space <= obj < self.free,
+                      "!external flag but object outside the space")
+        ll_assert(not (tid & GCFLAG_MARKBIT), "unexpected GCFLAG_MARKBIT")
+        ll_assert(not (tid & GCFLAG_FINALIZATION_ORDERING),
+                  "unexpected GCFLAG_FINALIZATION_ORDERING")
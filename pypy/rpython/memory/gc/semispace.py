@@ -10,9 +10,11 @@ from pypy.rlib.objectmodel import free_non_gc_object
 from pypy.rlib.debug import ll_assert
 from pypy.rpython.lltypesystem.lloperation import llop
 from pypy.rlib.rarithmetic import ovfcheck
+from pypy.rlib.rgc import COLLECTION_STATS_FIELDS, ALLOC_SITE_FIELDS
 from pypy.rpython.memory.gc.base import MovingGCBase
+from pypy.rpython.memory.gc import gcstats
 
-import sys, os
+import sys, os, time
 
 TYPEID_MASK = 0xffff
 first_gcflag = 1 << 16
@@ -25,6 +27,21 @@ GCFLAG_FINALIZATION_ORDERING = first_gcflag << 2
 DEBUG_PRINT = False
 memoryError = MemoryError()
 
+NUM_STATS = len(COLLECTION_STATS_FIELDS)
+STAT_GENERATION        = COLLECTION_STATS_FIELDS.index('generation')
+STAT_BYTES_COPIED      = COLLECTION_STATS_FIELDS.index('bytes_copied')
+STAT_SURVIVORS         = COLLECTION_STATS_FIELDS.index('survivors')
+STAT_PAUSE_US          = COLLECTION_STATS_FIELDS.index('pause_us')
+STAT_NURSERY_SIZE      = COLLECTION_STATS_FIELDS.index('nursery_size')
+STAT_FINALIZERS        = COLLECTION_STATS_FIELDS.index('finalizers')
+STAT_RAWMALLOCED_BYTES = COLLECTION_STATS_FIELDS.index('rawmalloced_bytes')
+STAT_HEAP_SIZE         = COLLECTION_STATS_FIELDS.index('heap_size')
+
+NUM_SITE_STATS = len(ALLOC_SITE_FIELDS)
+SITE_COUNT     = ALLOC_SITE_FIELDS.index('count')
+SITE_BYTES     = ALLOC_SITE_FIELDS.index('bytes')
+SITE_SURVIVORS = ALLOC_SITE_FIELDS.index('survivors')
+
 class SemiSpaceGC(MovingGCBase):
     _alloc_flavor_ = "raw"
     inline_simple_malloc = True
@@ -56,10 +73,23 @@ class SemiSpaceGC(MovingGCBase):
         self.red_zone = 0
         self.id_free_list = self.AddressStack()
         self.next_free_id = 1
+        self.stats_enabled = False
+        self.stats_events = lltype.nullptr(gcstats.EVENTS)
+        self.stats_count = 0
+        self.stats_log = -1
+        self.stats_generation = 0
+        self.stats_start_time = 0.0
+        self.stats_survivors = 0
+        self.stats_finalizers = 0
+        self.alloc_sites = lltype.nullptr(gcstats.EVENTS)
+        self.alloc_sites_length = 0
+        self.young_objects_with_site = self.AddressStack()
+        self.young_sites = lltype.nullptr(gcstats.EVENTS)
+        self.young_sites_length = 0
+        self.young_sites_count = 0
 
     def setup(self):
         if DEBUG_PRINT:
-            import time
             self.program_start_time = time.time()
         self.tospace = llarena.arena_malloc(self.space_size, True)
         ll_assert(bool(self.tospace), "couldn't allocate tospace")
@@ -71,6 +101,16 @@ class SemiSpaceGC(MovingGCBase):
         self.run_finalizers = self.AddressDeque()
         self.objects_with_weakrefs = self.AddressStack()
         self.objects_with_id = self.AddressDict()
+        self.setup_collection_stats()
+
+    def setup_collection_stats(self):
+        self.stats_log = gcstats.open_log_from_env()
+        if self.stats_log < 0 and not gcstats.stats_enabled_from_env():
+            return
+        self.stats_enabled = True
+        self.stats_events = lltype.malloc(gcstats.EVENTS,
+                                          gcstats.RING_SIZE * NUM_STATS,
+                                          flavor='raw')
 
     # This class only defines the malloc_{fixed,var}size_clear() methods
     # because the spaces are filled with zeroes in advance.
@@ -206,8 +246,9 @@ class SemiSpaceGC(MovingGCBase):
         # (this is also a hook for the HybridGC)
 
     def semispace_collect(self, size_changing=False):
+        if self.stats_enabled:
+            self.stats_start_collection(2)
         if DEBUG_PRINT:
-            import time
             llop.debug_print(lltype.Void)
             llop.debug_print(lltype.Void,
                              ".----------- Full collection ------------------")
@@ -233,8 +274,12 @@ class SemiSpaceGC(MovingGCBase):
         if self.objects_with_weakrefs.non_empty():
             self.invalidate_weakrefs()
         self.update_objects_with_id()
+        if self.young_objects_with_site.non_empty():
+            self.update_young_objects_with_site()
         self.finished_full_collect()
         self.debug_check_consistency()
+        if self.stats_enabled:
+            self.stats_end_collection(self.free - tospace)
         if not size_changing:
             llarena.arena_reset(fromspace, self.space_size, True)
             self.record_red_zone()
@@ -318,6 +363,8 @@ class SemiSpaceGC(MovingGCBase):
             self.debug_check_can_copy(obj)
         if self.is_forwarded(obj):
             #llop.debug_print(lltype.Void, obj, "already copied to", self.get_forwarding_address(obj))
+            if self.header(obj).tid & GCFLAG_EXTERNAL:
+                self.visit_external_object(obj)
             return self.get_forwarding_address(obj)
         else:
             objsize = self.get_size(obj)
@@ -332,6 +379,8 @@ class SemiSpaceGC(MovingGCBase):
         totalsize = self.size_gc_header() + objsize
         newaddr = self.free
         self.free += totalsize
+        if self.stats_enabled:
+            self.stats_survivors += 1
         llarena.arena_reserve(newaddr, totalsize)
         raw_memcopy(obj - self.size_gc_header(), newaddr, totalsize)
         newobj = newaddr + self.size_gc_header()
@@ -359,7 +408,6 @@ class SemiSpaceGC(MovingGCBase):
     def get_forwarding_address(self, obj):
         tid = self.header(obj).tid
         if tid & GCFLAG_EXTERNAL:
-            self.visit_external_object(obj)
             return obj      # external or prebuilt objects are "forwarded"
                             # to themselves
         else:
@@ -367,7 +415,7 @@ class SemiSpaceGC(MovingGCBase):
             return stub.forw
 
     def visit_external_object(self, obj):
-        pass    # hook for the HybridGC
+        pass    # hook for the HybridGC, called when copy() reaches 'obj'
 
     def set_forwarding_address(self, obj, newobj, objsize):
         # To mark an object as forwarded, we set the GCFLAG_FORWARDED and
@@ -460,6 +508,8 @@ class SemiSpaceGC(MovingGCBase):
             newx = self.get_forwarding_address(x)
             if state == 2:
                 self.run_finalizers.append(newx)
+                if self.stats_enabled:
+                    self.stats_finalizers += 1
                 # we must also fix the state from 2 to 3 here, otherwise
                 # we leave the GCFLAG_FINALIZATION_ORDERING bit behind
                 # which will confuse the next collection
@@ -645,5 +695,107 @@ class SemiSpaceGC(MovingGCBase):
         ll_assert(not (self.tospace <= obj < self.free),
                   "copy() on already-copied object")
 
+    # ____________________________________________________________
+    # Statistics about the last collections, in a ring buffer of
+    # gcstats.RING_SIZE entries of NUM_STATS numbers each.  Only
+    # recorded if self.stats_enabled (see setup_collection_stats()).
+
+    def stats_start_collection(self, generation):
+        self.stats_generation = generation
+        self.stats_start_time = time.time()
+        self.stats_survivors = 0
+        self.stats_finalizers = 0
+
+    def stats_end_collection(self, bytes_copied):
+        pause = time.time() - self.stats_start_time
+        events = self.stats_events
+        i = (self.stats_count % gcstats.RING_SIZE) * NUM_STATS
+        events[i + STAT_GENERATION] = self.stats_generation
+        events[i + STAT_BYTES_COPIED] = bytes_copied
+        events[i + STAT_SURVIVORS] = self.stats_survivors
+        events[i + STAT_PAUSE_US] = int(pause * 1000000.0)
+        events[i + STAT_NURSERY_SIZE] = self.stats_nursery_size()
+        events[i + STAT_FINALIZERS] = self.stats_finalizers
+        events[i + STAT_RAWMALLOCED_BYTES] = self.stats_rawmalloced_bytes()
+        events[i + STAT_HEAP_SIZE] = self.space_size
+        if self.stats_log >= 0:
+            gcstats.write_log_line(self.stats_log, self.stats_count,
+                                   events, i)
+        self.stats_count += 1
+        return pause
+
+    def stats_nursery_size(self):
+        return 0      # overridden in GenerationGC
+
+    def stats_rawmalloced_bytes(self):
+        return 0      # overridden in HybridGC
+
+    def collection_stats(self, index, field):
+        if not self.stats_enabled:
+            return -1
+        if index < 0:
+            return self.stats_count
+        if (index >= self.stats_count or
+            index < self.stats_count - gcstats.RING_SIZE or
+            not (0 <= field < NUM_STATS)):
+            return -1
+        i = (index % gcstats.RING_SIZE) * NUM_STATS
+        return self.stats_events[i + field]
+
+    # ____________________________________________________________
+    # Statistics per allocation site, only if the GC transformer was
+    # asked for them (--gc-alloc-sites).  The objects allocated since
+    # the last collection are remembered together with their site, to
+    # count how many survive their first collection.
+
+    def record_alloc_site(self, site, obj):
+        if site >= self.alloc_sites_length:
+            newlength = max(site + 1, self.alloc_sites_length * 2)
+            self.alloc_sites = gcstats.grow_array(
+                self.alloc_sites, self.alloc_sites_length * NUM_SITE_STATS,
+                newlength * NUM_SITE_STATS)
+            self.alloc_sites_length = newlength
+        size = self.size_gc_header() + self.get_size(obj)
+        i = site * NUM_SITE_STATS
+        self.alloc_sites[i + SITE_COUNT] += 1
+        self.alloc_sites[i + SITE_BYTES] += raw_malloc_usage(size)
+        if self.young_sites_count == self.young_sites_length:
+            newlength = max(64, self.young_sites_length * 2)
+            self.young_sites = gcstats.grow_array(
+                self.young_sites, self.young_sites_length, newlength)
+            self.young_sites_length = newlength
+        self.young_sites[self.young_sites_count] = site
+        self.young_sites_count += 1
+        self.young_objects_with_site.append(obj)
+
+    def update_young_objects_with_site(self):
+        # must be called during a collection, before the dead objects
+        # are overwritten or freed
+        objects = self.young_objects_with_site
+        i = self.young_sites_count
+        while objects.non_empty():
+            obj = objects.pop()
+            i -= 1
+            if self.young_object_survives(obj):
+                site = self.young_sites[i]
+                self.alloc_sites[site * NUM_SITE_STATS + SITE_SURVIVORS] += 1
+        self.young_sites_count = 0
+
+    def young_object_survives(self, obj):
+        return self.surviving(obj)     # overridden in GenerationGC
+
+    def dump_alloc_sites(self):
+        if not self.alloc_sites:
+            return
+        fd = gcstats.open_alloc_sites_file()
+        site = 0
+        while site < self.alloc_sites_length:
+            i = site * NUM_SITE_STATS
+            if self.alloc_sites[i + SITE_COUNT] > 0:
+                gcstats.write_alloc_site_line(fd, site, self.alloc_sites, i)
+            site += 1
+        if fd != 2:
+            os.close(fd)
+
     STATISTICS_NUMBERS = 0
 
@@ -0,0 +1,265 @@
+"""
+A segregated-fits allocator for the small external objects of the
+HybridGC, i.e. the objects that it would otherwise get from raw_malloc().
+
+Memory is obtained from the system in arenas of 'arena_size' bytes,
+which are split into pages of 'page_size' bytes.  Each page is used for
+the blocks of a single size class: the sizes are rounded up to a
+multiple of the word size, up to 'small_request_threshold' bytes.  A
+page starts with a PAGE_HEADER:
+
+    +------------+-------+-------+-------+-------+-----+
+    |page header | block | block | block | block | ... |
+    +------------+-------+-------+-------+-------+-----+
+
+The freed blocks are chained in a list per page, via their first word.
+The pages of each size class that have free blocks are chained in the
+list 'page_for_size[sizeclass]'.  Fully free pages are only given back
+to their arena by release_free_pages(), to be called at the end of a
+sweep, which also returns the completely free arenas to the system.
+"""
+
+from pypy.rpython.lltypesystem import lltype, llmemory, llarena
+from pypy.rpython.lltypesystem.llmemory import raw_malloc_usage
+from pypy.rlib.objectmodel import we_are_translated
+from pypy.rlib.rarithmetic import LONG_BIT
+from pypy.rlib.debug import ll_assert
+
+WORD = LONG_BIT // 8
+NULL = llmemory.NULL
+
+ARENA = lltype.ForwardReference()
+ARENA_PTR = lltype.Ptr(ARENA)
+PAGE_HEADER = lltype.ForwardReference()
+PAGE_PTR = lltype.Ptr(PAGE_HEADER)
+
+PAGE_HEADER.become(lltype.Struct('PageHeader',
+    # the next page in the same list: either the pages of the same size
+    # class that have free blocks, or the free pages of the arena
+    ('nextpage', PAGE_PTR),
+    ('arena', ARENA_PTR),
+    ('sizeclass', lltype.Signed),
+    # the number of free blocks, including the never-used ones
+    ('nfree', lltype.Signed),
+    # the chained list of the blocks that have been freed
+    ('freeblock', llmemory.Address),
+    # the number of blocks at the end of the page that were never used
+    ('nuninitialized', lltype.Signed)))
+
+ARENA.become(lltype.Struct('Arena',
+    ('base', llmemory.Address),
+    ('firstpage', llmemory.Address),
+    ('totalpages', lltype.Signed),
+    # the number of free pages, including the never-used ones
+    ('nfreepages', lltype.Signed),
+    # the chained list of the pages that have been freed
+    ('freepages', PAGE_PTR),
+    # the number of pages at the end of the arena that were never used
+    ('nuninitializedpages', lltype.Signed),
+    ('nextarena', ARENA_PTR)))
+
+PAGE_PTRS = lltype.Array(PAGE_PTR, hints={'nolength': True})
+NULL_PAGE = lltype.nullptr(PAGE_HEADER)
+NULL_ARENA = lltype.nullptr(ARENA)
+
+
+def start_of_page(addr, page_size):
+    """Return the address of the start of the page that contains 'addr'.
+    The pages are aligned to multiples of 'page_size'."""
+    if we_are_translated():
+        offset = llmemory.cast_adr_to_int(addr) & (page_size - 1)
+    else:
+        # the arenas are aligned when not translated
+        addr = llarena._getfakearenaaddress(addr)
+        offset = addr.offset % page_size
+    return addr - offset
+
+def _arena_address(addr):
+    # when not translated, turn the address of an object into an address
+    # inside its arena, on which arithmetic is possible
+    if not we_are_translated():
+        addr = llarena._getfakearenaaddress(addr)
+    return addr
+
+def _page_address(page):
+    return _arena_address(llmemory.cast_ptr_to_adr(page))
+
+
+class SizeClassAllocator(object):
+    _alloc_flavor_ = "raw"
+
+    def __init__(self, arena_size, page_size, small_request_threshold):
+        assert page_size & (page_size - 1) == 0, "page_size not a power of 2"
+        assert small_request_threshold % WORD == 0
+        self.arena_size = arena_size
+        self.page_size = page_size
+        self.small_request_threshold = small_request_threshold
+        hdrsize = raw_malloc_usage(llmemory.sizeof(PAGE_HEADER))
+        self.hdrsize = (hdrsize + WORD - 1) & ~(WORD - 1)
+        assert self.page_size - self.hdrsize >= small_request_threshold
+        assert arena_size >= 2 * page_size
+        length = small_request_threshold // WORD + 1
+        self.page_for_size = lltype.malloc(PAGE_PTRS, length,
+                                           flavor='raw', zero=True)
+        self.all_arenas = NULL_ARENA
+        self.current_arena = NULL_ARENA
+        self.arena_cursor = NULL_ARENA
+
+    def nblocks_for_size(self, sizeclass):
+        return (self.page_size - self.hdrsize) // (sizeclass * WORD)
+
+    def malloc(self, size):
+        """Allocate a block for an object of the given 'size', which
+        must not be larger than 'small_request_threshold'.  Returns NULL
+        if out of memory.  The block is not zero-filled."""
+        nsize = raw_malloc_usage(size)
+        ll_assert(nsize > 0, "malloc: size is null or negative")
+        ll_assert(nsize <= self.small_request_threshold,"malloc: size too big")
+        sizeclass = (nsize + WORD - 1) // WORD
+        page = self.page_for_size[sizeclass]
+        if not page:
+            page = self.allocate_new_page(sizeclass)
+            if not page:
+                return NULL
+        result = page.freeblock
+        if result:
+            # reuse a block from the chained list of freed blocks
+            page.freeblock = result.address[0]
+            llarena.arena_reset(result, llmemory.sizeof(llmemory.Address),
+                                False)
+        else:
+            # use the next block that was never used so far
+            ll_assert(page.nuninitialized > 0, "malloc: page is full")
+            index = self.nblocks_for_size(sizeclass) - page.nuninitialized
+            result = (_page_address(page) + self.hdrsize +
+                      index * (sizeclass * WORD))
+            page.nuninitialized -= 1
+        page.nfree -= 1
+        if page.nfree == 0:
+            # the page is full: remove it from the list
+            self.page_for_size[sizeclass] = page.nextpage
+            page.nextpage = NULL_PAGE
+        llarena.arena_reserve(result, size)
+        return result
+
+    def free(self, addr, size):
+        """Free the block at 'addr', which was returned by malloc(size)."""
+        nsize = raw_malloc_usage(size)
+        sizeclass = (nsize + WORD - 1) // WORD
+        addr = _arena_address(addr)
+        page = llmemory.cast_adr_to_ptr(start_of_page(addr, self.page_size),
+                                        PAGE_PTR)
+        ll_assert(page.sizeclass == sizeclass, "free: wrong size class")
+        llarena.arena_reset(addr, sizeclass * WORD, False)
+        llarena.arena_reserve(addr, llmemory.sizeof(llmemory.Address))
+        addr.address[0] = page.freeblock
+        page.freeblock = addr
+        if page.nfree == 0:
+            # the page was full: put it back in the list
+            page.nextpage = self.page_for_size[sizeclass]
+            self.page_for_size[sizeclass] = page
+        page.nfree += 1
+
+    def allocate_new_page(self, sizeclass):
+        arena = self.current_arena
+        if not arena or arena.nfreepages == 0:
+            arena = self.pick_arena()
+            if not arena:
+                return NULL_PAGE
+            self.current_arena = arena
+        page = arena.freepages
+        if page:
+            arena.freepages = page.nextpage
+        else:
+            ll_assert(arena.nuninitializedpages > 0,
+                      "allocate_new_page: arena is full")
+            index = arena.totalpages - arena.nuninitializedpages
+            pageaddr = arena.firstpage + index * self.page_size
+            llarena.arena_reserve(pageaddr, llmemory.sizeof(PAGE_HEADER))
+            page = llmemory.cast_adr_to_ptr(pageaddr, PAGE_PTR)
+            page.arena = arena
+            arena.nuninitializedpages -= 1
+        arena.nfreepages -= 1
+        nblocks = self.nblocks_for_size(sizeclass)
+        page.nextpage = NULL_PAGE
+        page.sizeclass = sizeclass
+        page.nfree = nblocks
+        page.freeblock = NULL
+        page.nuninitialized = nblocks
+        self.page_for_size[sizeclass] = page
+        return page
+
+    def pick_arena(self):
+        # continue looking for free pages in the arenas after the
+        # previously picked one; the arenas only get more free pages
+        # in release_free_pages(), which restarts from the first one.
+        arena = self.arena_cursor
+        while arena:
+            self.arena_cursor = arena.nextarena
+            if arena.nfreepages > 0:
+                return arena
+            arena = arena.nextarena
+        return self.allocate_new_arena()
+
+    def allocate_new_arena(self):
+        base = llarena.arena_malloc(self.arena_size, False)
+        if not base:
+            return NULL_ARENA
+        # skip the beginning of the arena up to the first aligned page
+        firstpage = start_of_page(base + (self.page_size - 1), self.page_size)
+        npages = (self.arena_size - (firstpage - base)) // self.page_size
+        arena = lltype.malloc(ARENA, flavor='raw')
+        arena.base = base
+        arena.firstpage = firstpage
+        arena.totalpages = npages
+        arena.nfreepages = npages
+        arena.freepages = NULL_PAGE
+        arena.nuninitializedpages = npages
+        arena.nextarena = self.all_arenas
+        self.all_arenas = arena
+        return arena
+
+    def release_free_pages(self):
+        """Give the pages without any used block back to their arena, and
+        the arenas without any used page back to the system."""
+        sizeclass = 1
+        while sizeclass <= self.small_request_threshold // WORD:
+            nblocks = self.nblocks_for_size(sizeclass)
+            page = self.page_for_size[sizeclass]
+            remaining = NULL_PAGE
+            while page:
+                nextpage = page.nextpage
+                if page.nfree == nblocks:
+                    self.free_page(page)
+                else:
+                    page.nextpage = remaining
+                    remaining = page
+                page = nextpage
+            self.page_for_size[sizeclass] = remaining
+            sizeclass += 1
+        #
+        arena = self.all_arenas
+        remaining_arenas = NULL_ARENA
+        while arena:
+            nextarena = arena.nextarena
+            if arena.nfreepages == arena.totalpages:
+                llarena.arena_free(arena.base)
+                lltype.free(arena, flavor='raw')
+            else:
+                arena.nextarena = remaining_arenas
+                remaining_arenas = arena
+            arena = nextarena
+        self.all_arenas = remaining_arenas
+        self.current_arena = NULL_ARENA
+        self.arena_cursor = remaining_arenas
+
+    def free_page(self, page):
+        arena = page.arena
+        pageaddr = _page_address(page)
+        llarena.arena_reset(pageaddr, self.page_size, False)
+        llarena.arena_reserve(pageaddr, llmemory.sizeof(PAGE_HEADER))
+        page = llmemory.cast_adr_to_ptr(pageaddr, PAGE_PTR)
+        page.arena = arena
+        page.nextpage = arena.freepages
+        arena.freepages = page
+        arena.nfreepages += 1
@@ -84,7 +84,11 @@ class DirectGCTest(object):
         setattr(p, fieldname, newvalue)
 
     def writearray(self, p, index, newvalue):
-        if self.gc.needs_write_barrier:
+        if self.gc.needs_write_barrier_from_array:
+            newaddr = llmemory.cast_ptr_to_adr(newvalue)
+            addr_array = llmemory.cast_ptr_to_adr(p)
+            self.gc.write_barrier_from_array(newaddr, addr_array, index)
+        elif self.gc.needs_write_barrier:
             newaddr = llmemory.cast_ptr_to_adr(newvalue)
             addr_struct = llmemory.cast_ptr_to_adr(p)
             self.gc.write_barrier(newaddr, addr_struct)
@@ -266,9 +270,170 @@ class DirectGCTest(object):
 class TestSemiSpaceGC(DirectGCTest):
     from pypy.rpython.memory.gc.semispace import SemiSpaceGC as GCClass
 
+    def test_collection_stats(self):
+        from pypy.rlib.rgc import COLLECTION_STATS_FIELDS
+        p = self.malloc(S)
+        self.stackroots.append(p)
+        count = self.gc.collection_stats(-1, 0)
+        self.gc.collect()
+        index = self.gc.collection_stats(-1, 0) - 1
+        assert index >= count
+        stats = {}
+        for i, name in enumerate(COLLECTION_STATS_FIELDS):
+            stats[name] = self.gc.collection_stats(index, i)
+        assert stats['generation'] >= 2
+        assert stats['survivors'] >= 1
+        assert stats['bytes_copied'] > 0
+        assert stats['pause_us'] >= 0
+        assert stats['heap_size'] == self.gc.space_size
+        assert self.gc.collection_stats(index + 1, 0) == -1
+
+    def test_collection_stats_disabled(self):
+        import os
+        os.environ['PYPY_GC_STATS'] = '0'
+        try:
+            self.setup_method(None)
+        finally:
+            del os.environ['PYPY_GC_STATS']
+        assert not self.gc.stats_enabled
+        p = self.malloc(S)
+        self.stackroots.append(p)
+        self.gc.collect()
+        assert self.gc.collection_stats(-1, 0) == -1
+        assert self.gc.stats_survivors == 0
+
+    def test_collection_stats_log(self):
+        import os
+        from pypy.tool.udir import udir
+        path = udir.join('test_collection_stats_log')
+        fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0666)
+        self.gc.stats_log = fd
+        try:
+            self.gc.collect()
+        finally:
+            self.gc.stats_log = -1
+            os.close(fd)
+        line = path.read().splitlines()[-1]
+        assert line.startswith('collection ')
+        assert ' heap_size=%d ' % (self.gc.space_size,) not in line
+        assert line.endswith(' heap_size=%d' % (self.gc.space_size,))
+
+    def test_alloc_sites(self):
+        import os
+        from pypy.tool.udir import udir
+        for i in range(3):
+            p = self.malloc(S)
+            self.gc.record_alloc_site(2, llmemory.cast_ptr_to_adr(p))
+        self.stackroots.append(p)
+        p = self.malloc(S)
+        self.gc.record_alloc_site(0, llmemory.cast_ptr_to_adr(p))
+        self.gc.collect()
+        self.gc.collect()
+        path = udir.join('test_alloc_sites')
+        os.environ['PYPY_GC_ALLOC_SITES'] = str(path)
+        try:
+            self.gc.dump_alloc_sites()
+        finally:
+            del os.environ['PYPY_GC_ALLOC_SITES']
+        size = llmemory.raw_malloc_usage(self.gc.size_gc_header() +
+                                         llmemory.sizeof(S))
+        assert path.read().splitlines() == [
+            'site 0: count=1 bytes=%d survivors=0' % (size,),
+            'site 2: count=3 bytes=%d survivors=1' % (3 * size,)]
+
 class TestGenerationGC(TestSemiSpaceGC):
     from pypy.rpython.memory.gc.generation import GenerationGC as GCClass
 
+    def test_adapt_nursery_size(self):
+        gc = self.gc
+        gc.adaptive_nursery = True
+        size = gc.nursery_size
+        # half of the nursery survived: grow it
+        gc.nursery_collections = 2
+        gc.nursery_survived = size
+        gc.collect()
+        assert gc.nursery_size == size * 2
+        # the nursery collections are too slow: shrink it
+        gc.max_nursery_pause = 0.5
+        gc.nursery_collections = 1
+        gc.nursery_pauses = 1.0
+        gc.collect()
+        assert gc.nursery_size == size
+        # nothing survived, but the nursery is already at its initial size
+        gc.nursery_collections = 10
+        gc.collect()
+        assert gc.nursery_size == size
+
+class TestGenerationGCCardMarking(TestGenerationGC):
+    GC_PARAMS = {'card_page_indices': 4}
+
+    def test_card_marking(self):
+        from pypy.rpython.memory.gc.generation import GCFLAG_NO_YOUNG_PTRS
+        from pypy.rpython.memory.gc.generation import GCFLAG_HAS_CARDS
+        from pypy.rpython.memory.gc.generation import CARDS
+        self.stackroots.append(self.malloc(VAR, 18))
+        self.gc.collect()
+        self.gc.collect_nursery()     # get a nursery again
+        a = self.stackroots[0]
+        addr_array = llmemory.cast_ptr_to_adr(a)
+        assert not self.gc.is_in_nursery(addr_array)
+        for i in [1, 13, 14]:
+            p = self.malloc(S)
+            p.x = i
+            self.writearray(a, i, p)
+        hdr = self.gc.header(addr_array)
+        assert hdr.tid & GCFLAG_NO_YOUNG_PTRS
+        assert hdr.tid & GCFLAG_HAS_CARDS
+        assert not self.gc.old_objects_pointing_to_young.non_empty()
+        cards = llmemory.cast_adr_to_ptr(
+            self.gc.card_tables.get(addr_array), CARDS)
+        assert [cards[i] for i in range(5)] == ['\x01', '\x00', '\x00',
+                                                '\x01', '\x00']
+        self.gc.collect_nursery()
+        assert not hdr.tid & GCFLAG_HAS_CARDS
+        assert not self.gc.old_arrays_with_cards.non_empty()
+        for i in [1, 13, 14]:
+            assert not self.gc.is_in_nursery(llmemory.cast_ptr_to_adr(a[i]))
+            assert a[i].x == i
+        self.gc.collect()
+        a = self.stackroots[0]
+        for i in [1, 13, 14]:
+            assert a[i].x == i
+
+class TestGenerationGCWithTLABs(TestGenerationGC):
+    GC_PARAMS = {'tlab_size': 64}
+
+    def test_thread_local_buffers(self):
+        from pypy.rpython.lltypesystem import llarena
+        gc = self.gc
+        THREAD = lltype.Struct('THREAD')
+        aid1 = llmemory.cast_ptr_to_adr(lltype.malloc(THREAD, flavor='raw'))
+        aid2 = llmemory.cast_ptr_to_adr(lltype.malloc(THREAD, flavor='raw'))
+        def offset(p):
+            addr = llarena._getfakearenaaddress(llmemory.cast_ptr_to_adr(p))
+            return addr - gc.nursery
+        size_s = llmemory.raw_malloc_usage(gc.size_gc_header() +
+                                           llmemory.sizeof(S))
+        gc.set_current_thread(aid1)
+        p1 = self.malloc(S)
+        p1.x = 1
+        self.stackroots.append(p1)
+        gc.set_current_thread(aid2)
+        p2 = self.malloc(S)
+        p2.x = 2
+        self.stackroots.append(p2)
+        gc.set_current_thread(aid1)
+        p3 = self.malloc(S)
+        p3.x = 3
+        self.stackroots.append(p3)
+        # each thread allocates in its own chunk of the nursery
+        assert offset(p2) == offset(p1) + 64
+        assert offset(p3) == offset(p1) + size_s
+        gc.forget_thread(aid2)
+        gc.set_current_thread(aid2)
+        gc.collect()
+        assert [p.x for p in self.stackroots] == [1, 2, 3]
+
 class TestHybridGC(TestGenerationGC):
     from pypy.rpython.memory.gc.hybrid import HybridGC as GCClass
 
@@ -279,3 +444,268 @@ class TestHybridGC(TestGenerationGC):
                  'large_object_gcptrs': 12,
                  'generation3_collect_threshold': 5,
                  }
+
+class TestHybridGCIncremental(TestHybridGC):
+    GC_PARAMS = TestHybridGC.GC_PARAMS.copy()
+    GC_PARAMS['space_size'] = 768
+    GC_PARAMS['nursery_size'] = 192    # big enough for the S objects
+    GC_PARAMS['generation3_collect_threshold'] = 2
+    GC_PARAMS['generation3_pause_budget'] = 1e-6
+    GC_PARAMS['generation3_step_chunk'] = 2
+
+    def fake_clock(self, tick):
+        now = [0.0]
+        def gen3_time():
+            now[0] += tick
+            return now[0]
+        self.gc.gen3_time = gen3_time
+
+    def record_frees(self, addrs):
+        gc = self.gc
+        freed = []
+        def free_rawmalloced_object(obj):
+            for i in range(len(addrs)):
+                if i not in freed and obj == addrs[i]:
+                    freed.append(i)
+            gc.__class__.free_rawmalloced_object(gc, obj)
+        gc.free_rawmalloced_object = free_rawmalloced_object
+        return freed
+
+    def make_gen3_objects(self, n):
+        gc = self.gc
+        for i in range(n):
+            p = self.malloc(S)
+            p.x = i
+            self.stackroots.append(p)
+        # full collections until the objects are all in generation 3
+        for i in range(10):
+            gc.collect()
+            for p in self.stackroots:
+                if not gc.is_last_generation(llmemory.cast_ptr_to_adr(p)):
+                    break
+            else:
+                break
+        addrs = [llmemory.cast_ptr_to_adr(p) for p in self.stackroots]
+        for addr in addrs:
+            assert gc.is_last_generation(addr)
+        return addrs
+
+    def to_list(self, stack):
+        objs = []
+        stack.foreach(lambda obj, arg: objs.append(obj), None)
+        return objs
+
+    def test_partial_sweep_steps(self):
+        gc = self.gc
+        self.fake_clock(1.0)
+        def to_sweep():
+            return self.to_list(gc.gen3_objects_to_sweep)
+        for i in range(4):
+            a = self.malloc(VAR, 3)
+            p = self.malloc(S)
+            p.x = i
+            self.writearray(a, 0, p)
+            self.stackroots.append(a)
+        # full collections until the arrays are all in generation 3
+        for i in range(10):
+            gc.collect()
+            if not gc.gen2_rawmalloced_objects.non_empty():
+                break
+        addrs = [llmemory.cast_ptr_to_adr(a) for a in self.stackroots]
+        for addr in addrs:
+            assert gc.is_last_generation(addr)
+        freed = self.record_frees(addrs)
+        # drop two of them and mark generation 3, without sweeping: the
+        # first full collection starts the marking, the next one ends it
+        del self.stackroots[1], self.stackroots[2]
+        gc.count_semispaceonly_collects = gc.generation3_collect_threshold
+        gc.semispace_collect()
+        assert not to_sweep()
+        gc.semispace_collect()
+        objs = to_sweep()
+        for addr in addrs:
+            assert addr in objs
+        assert freed == []
+        # each nursery collection sweeps 2 objects
+        step = 0
+        while objs:
+            p = self.malloc(S)
+            p.x = 10 + step
+            self.writearray(self.stackroots[1], 1, p)
+            self.stackroots.append(self.malloc(VAR, 3))
+            objs = to_sweep()      # the mallocs may collect the nursery too
+            gc.collect_nursery()
+            assert len(to_sweep()) == max(len(objs) - 2, 0)
+            objs = to_sweep()
+            assert self.stackroots[0][0].x == 0
+            assert self.stackroots[1][0].x == 2
+            assert self.stackroots[1][1].x == 10 + step
+            step += 1
+        assert step > 1
+        assert sorted(freed) == [1, 3]
+        assert [llmemory.cast_ptr_to_adr(a)
+                for a in self.stackroots[:2]] == [addrs[0], addrs[2]]
+
+    def test_marking_steps(self):
+        gc = self.gc
+        gc.generation3_step_chunk = 1
+        addrs = self.make_gen3_objects(8)
+        gc.count_semispaceonly_collects = gc.generation3_collect_threshold
+        gc.semispace_collect()
+        # the objects are only marked by the full collection
+        marked = self.to_list(gc.gen3_objects_to_mark)
+        assert len(marked) == len(addrs)
+        for addr in addrs:
+            assert addr in marked
+        # each nursery collection traces 3 of them: it looks at the
+        # clock before, then after each object
+        self.fake_clock(1.0)
+        gc.generation3_pause_budget = 2.5
+        lengths = []
+        while gc.gen3_objects_to_mark.non_empty():
+            gc.collect_nursery()
+            lengths.append(len(self.to_list(gc.gen3_objects_to_mark)))
+        assert lengths == [5, 2, 0]
+
+    def test_marking_write_barrier(self):
+        gc = self.gc
+        gc.generation3_step_chunk = 1
+        self.fake_clock(1.0)
+        addrs = self.make_gen3_objects(4)
+        a, b, c, d = self.stackroots
+        self.write(a, 'next', b)
+        self.write(b, 'next', c)
+        del self.stackroots[1:]           # 'd' is dead
+        freed = self.record_frees(addrs)
+        gc.count_semispaceonly_collects = gc.generation3_collect_threshold
+        gc.semispace_collect()
+        assert self.to_list(gc.gen3_objects_to_mark) == [addrs[0]]
+        # a nursery collection traces 'a' and marks 'b'
+        gc.collect_nursery()
+        assert self.to_list(gc.gen3_objects_to_mark) == [addrs[1]]
+        # now 'c' is only reachable from 'a', which was already traced:
+        # the write barrier must mark it
+        self.write(a, 'prev', c)
+        self.write(b, 'next', lltype.nullptr(S))
+        while gc.gen3_objects_to_mark.non_empty():
+            gc.collect_nursery()
+        # the next full collection finishes the marking
+        gc.semispace_collect()
+        gc.finish_gen3_sweep()
+        assert freed == [3]
+        a = self.stackroots[0]
+        assert a.x == 0
+        assert a.next.x == 1
+        assert a.prev.x == 2
+        assert not a.next.next
+
+    def test_marking_old_objects_pointing_to_young(self):
+        gc = self.gc
+        gc.generation3_step_chunk = 1
+        self.fake_clock(1.0)
+        addrs = self.make_gen3_objects(3)
+        a, b, c = self.stackroots
+        self.write(a, 'next', b)
+        self.write(b, 'next', c)
+        del self.stackroots[1:]
+        freed = self.record_frees(addrs)
+        gc.count_semispaceonly_collects = gc.generation3_collect_threshold
+        gc.semispace_collect()
+        gc.collect_nursery()      # traces 'a'
+        # once 'a' points to a young object, the write barrier no
+        # longer sees the writes into it: the next nursery collection
+        # must trace it again to find 'c'
+        self.write(a, 'next', self.malloc(S))
+        self.write(a, 'prev', c)
+        self.write(b, 'next', lltype.nullptr(S))
+        while gc.gen3_objects_to_mark.non_empty():
+            gc.collect_nursery()
+        gc.semispace_collect()
+        gc.finish_gen3_sweep()
+        assert freed == []        # 'b' is only freed by the next marking
+        assert self.stackroots[0].prev.x == 2
+
+    def test_marking_dead_gen3_roots(self):
+        gc = self.gc
+        addrs = self.make_gen3_objects(3)
+        a, b, c = self.stackroots
+        # a dead cycle, in last_generation_root_objects because 'a'
+        # points to a young object
+        self.write(a, 'next', b)
+        self.write(b, 'next', a)
+        self.write(a, 'prev', self.malloc(S))
+        del self.stackroots[:2]
+        freed = self.record_frees(addrs)
+        gc.count_semispaceonly_collects = gc.generation3_collect_threshold
+        gc.semispace_collect()
+        gc.semispace_collect()
+        gc.finish_gen3_sweep()
+        assert sorted(freed) == [0, 1]
+        assert self.stackroots[0].x == 2
+
+    def test_marking_ids(self):
+        gc = self.gc
+        for i in range(2):
+            p = self.malloc(S)
+            p.x = i
+            self.stackroots.append(p)
+        ids = [gc.id(p) for p in self.stackroots]
+        addrs = self.make_gen3_objects(0)
+        del self.stackroots[1]
+        freed = self.record_frees(addrs)
+        # the full collection that starts the marking keeps the ids of
+        # all the gen3 objects, but must not mark them because of that
+        gc.count_semispaceonly_collects = gc.generation3_collect_threshold
+        gc.semispace_collect()
+        assert self.to_list(gc.gen3_objects_to_mark) == [addrs[0]]
+        gc.semispace_collect()
+        gc.finish_gen3_sweep()
+        assert freed == [1]
+        assert gc.id(self.stackroots[0]) == ids[0]
+
+    def test_marking_finished_by_collect(self):
+        gc = self.gc
+        addrs = self.make_gen3_objects(3)
+        self.write(self.stackroots[0], 'next', self.stackroots[1])
+        del self.stackroots[1:]
+        freed = self.record_frees(addrs)
+        gc.count_semispaceonly_collects = gc.generation3_collect_threshold
+        gc.semispace_collect()
+        assert gc.gen3_objects_to_mark.non_empty()
+        assert freed == []
+        gc.collect()
+        assert not gc.gen3_objects_to_mark.non_empty()
+        assert freed == [2]
+        assert self.stackroots[0].next.x == 1
+
+class TestHybridGCSizeClasses(TestHybridGC):
+    GC_PARAMS = TestHybridGC.GC_PARAMS.copy()
+    GC_PARAMS['small_request_threshold'] = 64
+
+    def test_external_objects_in_pages(self):
+        a = self.malloc(VAR, 5)
+        assert not self.gc.can_move(llmemory.cast_ptr_to_adr(a))
+        assert self.gc.sizeclasses.all_arenas
+        p = self.malloc(S)
+        p.x = 42
+        self.writearray(a, 2, p)
+        self.stackroots.append(a)
+        self.gc.collect()
+        assert self.stackroots[0][2].x == 42
+        assert self.gc.sizeclasses.all_arenas
+        self.stackroots.pop()
+        self.gc.collect()
+        assert not self.gc.sizeclasses.all_arenas
+
+class TestHybridGCCardMarking(TestHybridGC):
+    GC_PARAMS = TestHybridGC.GC_PARAMS.copy()
+    GC_PARAMS['space_size'] = 768
+    GC_PARAMS['nursery_size'] = 192    # big enough for the S objects
+    GC_PARAMS['card_page_indices'] = 4
+
+    test_card_marking = TestGenerationGCCardMarking.test_card_marking.im_func
+
+class TestMarkCompactGC(TestSemiSpaceGC):
+    from pypy.rpython.memory.gc.markcompact import MarkCompactGC as GCClass
+
+    GC_PARAMS = {'space_size': 192}
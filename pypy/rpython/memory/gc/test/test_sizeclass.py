@@ -0,0 +1,77 @@
+from pypy.rpython.lltypesystem import lltype, llmemory
+from pypy.rpython.memory.gc.sizeclass import SizeClassAllocator, WORD
+from pypy.rpython.memory.gc.sizeclass import start_of_page
+
+PAGE_SIZE = 256
+S = lltype.Struct('S', ('x', lltype.Signed), ('y', lltype.Signed))
+SIZE_S = llmemory.sizeof(S)
+T = lltype.Struct('T', ('a', lltype.FixedSizeArray(lltype.Signed, 7)))
+SIZE_T = llmemory.sizeof(T)
+
+
+def new_allocator():
+    return SizeClassAllocator(arena_size=4*PAGE_SIZE, page_size=PAGE_SIZE,
+                              small_request_threshold=16*WORD)
+
+def nblocks(ac, size):
+    sizeclass = (llmemory.raw_malloc_usage(size) + WORD - 1) // WORD
+    return ac.nblocks_for_size(sizeclass)
+
+def test_malloc_free():
+    ac = new_allocator()
+    a = ac.malloc(SIZE_S)
+    b = ac.malloc(SIZE_S)
+    assert a != b
+    llmemory.cast_adr_to_ptr(a, lltype.Ptr(S)).x = 42
+    llmemory.cast_adr_to_ptr(b, lltype.Ptr(S)).x = 43
+    assert start_of_page(a, PAGE_SIZE) == start_of_page(b, PAGE_SIZE)
+    ac.free(a, SIZE_S)
+    c = ac.malloc(SIZE_S)
+    assert c == a          # the freed block is reused
+    assert llmemory.cast_adr_to_ptr(b, lltype.Ptr(S)).x == 43
+
+def test_size_classes_use_different_pages():
+    ac = new_allocator()
+    a = ac.malloc(SIZE_S)
+    b = ac.malloc(SIZE_T)
+    assert start_of_page(a, PAGE_SIZE) != start_of_page(b, PAGE_SIZE)
+
+def test_full_pages():
+    ac = new_allocator()
+    n = nblocks(ac, SIZE_T)
+    blocks = [ac.malloc(SIZE_T) for i in range(n + 1)]
+    pages = [start_of_page(addr, PAGE_SIZE) for addr in blocks]
+    assert pages[:n] == [pages[0]] * n
+    assert pages[n] != pages[0]
+    # freeing a block of the full page makes it available again
+    ac.free(blocks[3], SIZE_T)
+    assert ac.malloc(SIZE_T) == blocks[3]
+
+def test_release_free_pages():
+    ac = new_allocator()
+    n = nblocks(ac, SIZE_S)
+    blocks = [ac.malloc(SIZE_S) for i in range(2 * n)]
+    arena = ac.all_arenas
+    assert arena.nfreepages == arena.totalpages - 2
+    for addr in blocks[:n]:
+        ac.free(addr, SIZE_S)
+    ac.release_free_pages()
+    assert ac.all_arenas == arena
+    assert arena.nfreepages == arena.totalpages - 1
+    # the free page is reused for another size class
+    ac.malloc(SIZE_T)
+    assert arena.nfreepages == arena.totalpages - 2
+    assert arena.nuninitializedpages == arena.totalpages - 2
+
+def test_release_free_arenas():
+    ac = new_allocator()
+    n = nblocks(ac, SIZE_S)
+    blocks = [ac.malloc(SIZE_S) for i in range(5 * n)]
+    assert ac.all_arenas.nextarena     # needed two arenas
+    for addr in blocks:
+        ac.free(addr, SIZE_S)
+    ac.release_free_pages()
+    assert not ac.all_arenas
+    a = ac.malloc(SIZE_S)
+    llmemory.cast_adr_to_ptr(a, lltype.Ptr(S)).y = 5
+    assert ac.all_arenas
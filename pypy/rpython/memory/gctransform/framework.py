@@ -3,6 +3,7 @@ from pypy.rpython.memory.gctransform.support import find_gc_ptrs_in_type, \
      get_rtti, ll_call_destructor, type_contains_pyobjs, var_ispyobj
 from pypy.rpython.lltypesystem import lltype, llmemory
 from pypy.rpython import rmodel
+from pypy.objspace.flow.model import Constant
 from pypy.rpython.memory import gctypelayout
 from pypy.rpython.memory.gc import marksweep
 from pypy.rpython.memory.gcheader import GCHeaderBuilder
@@ -15,6 +16,7 @@ from pypy.rpython import annlowlevel
 from pypy.rpython.rbuiltin import gen_cast
 from pypy.rpython.memory.gctypelayout import ll_weakref_deref, WEAKREF
 from pypy.rpython.memory.gctypelayout import convert_weakref_to, WEAKREFPTR
+from pypy.rpython.memory.gctypelayout import is_gcarrayofgcptr
 from pypy.rpython.memory.gctransform.log import log
 from pypy.tool.sourcetools import func_with_new_name
 from pypy.rpython.lltypesystem.lloperation import llop, LL_OPERATIONS
@@ -329,11 +331,50 @@ class FrameworkGCTransformer(GCTransformer):
                                             annmodel.SomeAddress()],
                                            annmodel.s_None,
                                            inline=True)
+            if GCClass.needs_write_barrier_from_array:
+                self.write_barrier_from_array_ptr = getfn(
+                    GCClass.write_barrier_from_array.im_func,
+                    [s_gc,
+                     annmodel.SomeAddress(),
+                     annmodel.SomeAddress(),
+                     annmodel.SomeInteger(nonneg=True)],
+                    annmodel.s_None,
+                    inline=True)
+            else:
+                self.write_barrier_from_array_ptr = None
         else:
             self.write_barrier_ptr = None
+            self.write_barrier_from_array_ptr = None
         self.statistics_ptr = getfn(GCClass.statistics.im_func,
                                     [s_gc, annmodel.SomeInteger()],
                                     annmodel.SomeInteger())
+        self.collection_stats_ptr = getfn(
+            GCClass.collection_stats.im_func,
+            [s_gc, annmodel.SomeInteger(), annmodel.SomeInteger()],
+            annmodel.SomeInteger())
+        # statistics per allocation site: a list of (graph, TYPE) whose
+        # index is the site number passed to record_alloc_site()
+        self.alloc_sites = []
+        self.curr_graph = None
+        if translator.config.translation.gcallocsites:
+            self.record_alloc_site_ptr = getfn(
+                GCClass.record_alloc_site.im_func,
+                [s_gc, annmodel.SomeInteger(nonneg=True),
+                 annmodel.SomeAddress()],
+                annmodel.s_None)
+            self.dump_alloc_sites_ptr = getfn(
+                GCClass.dump_alloc_sites.im_func, [s_gc], annmodel.s_None)
+        else:
+            self.record_alloc_site_ptr = None
+            self.dump_alloc_sites_ptr = None
+        if translator.config.translation.backendopt.heap2stack:
+            self.init_stack_object_ptr = getfn(
+                GCClass.init_gc_object_immortal.im_func,
+                [s_gc, annmodel.SomeAddress(),
+                 annmodel.SomeInteger(nonneg=True)],
+                annmodel.s_None, inline=True)
+        else:
+            self.init_stack_object_ptr = None
 
         # experimental gc_x_* operations
         s_x_pool  = annmodel.SomePtr(marksweep.X_POOL_PTR)
@@ -442,6 +483,8 @@ class FrameworkGCTransformer(GCTransformer):
         newgcdependencies = []
         newgcdependencies.append(ll_static_roots_inside)
         self.write_typeid_list()
+        if self.record_alloc_site_ptr is not None:
+            self.write_alloc_site_list()
         return newgcdependencies
 
     def write_typeid_list(self):
@@ -456,11 +499,21 @@ class FrameworkGCTransformer(GCTransformer):
             f.write("%s %s\n" % (typeid, TYPE))
         f.close()
 
+    def write_alloc_site_list(self):
+        """write out the list of allocation sites, for --gc-alloc-sites"""
+        from pypy.tool.udir import udir
+        f = udir.join("allocsites.txt").open("w")
+        for site, (graph, TYPE) in enumerate(self.alloc_sites):
+            f.write("%s %s %s\n" % (site, graph and graph.name, TYPE))
+        f.close()
+
     def transform_graph(self, graph):
         if self.write_barrier_ptr:
             self.initializing_stores = find_initializing_stores(
                 self.collect_analyzer, graph)
+        self.curr_graph = graph
         super(FrameworkGCTransformer, self).transform_graph(graph)
+        self.curr_graph = None
         if self.write_barrier_ptr:
             self.initializing_stores = None
 
@@ -532,10 +585,49 @@ class FrameworkGCTransformer(GCTransformer):
         v_result = hop.genop("direct_call", [malloc_ptr] + args,
                              resulttype=llmemory.GCREF)
         self.pop_roots(hop, livevars)
+        if self.record_alloc_site_ptr is not None:
+            c_site = rmodel.inputconst(lltype.Signed, len(self.alloc_sites))
+            self.alloc_sites.append((self.curr_graph, TYPE))
+            v_addr = hop.genop("cast_ptr_to_adr", [v_result],
+                               resulttype=llmemory.Address)
+            hop.genop("direct_call", [self.record_alloc_site_ptr,
+                                      self.c_const_gc, c_site, v_addr])
         return v_result
 
     gct_fv_gc_malloc_varsize = gct_fv_gc_malloc
 
+    def gct_fv_stack_malloc(self, hop, flags, TYPE, c_size):
+        return self.stack_malloc_with_header(hop, TYPE, llmemory.sizeof(TYPE))
+
+    def gct_fv_stack_malloc_varsize(self, hop, flags, TYPE, v_length,
+                                    c_const_size, c_item_size,
+                                    c_offset_to_length):
+        assert isinstance(v_length, Constant)
+        v_obj = self.stack_malloc_with_header(
+            hop, TYPE, llmemory.sizeof(TYPE, v_length.value))
+        if c_offset_to_length is not None:
+            self.store_stack_array_length(hop, v_obj, v_length,
+                                          c_offset_to_length)
+        return v_obj
+
+    def stack_malloc_with_header(self, hop, TYPE, size):
+        # The objects moved to the stack by backendopt.heap2stack get the
+        # same header as the prebuilt objects: if the GC finds them from
+        # its roots, it leaves them alone.  They contain no GC pointers,
+        # so the GC never needs to trace them.
+        assert self.init_stack_object_ptr is not None
+        assert not find_gc_ptrs_in_type(TYPE)
+        size_gc_header = self.gcdata.gc.size_gc_header()
+        c_size = rmodel.inputconst(lltype.Signed, size_gc_header + size)
+        v_hdr = hop.genop("stack_malloc", [c_size],
+                          resulttype=llmemory.Address)
+        c_type_id = rmodel.inputconst(lltype.Signed, self.get_type_id(TYPE))
+        hop.genop("direct_call", [self.init_stack_object_ptr,
+                                  self.c_const_gc, v_hdr, c_type_id])
+        c_size_gc_header = rmodel.inputconst(lltype.Signed, size_gc_header)
+        return hop.genop("adr_add", [v_hdr, c_size_gc_header],
+                         resulttype=llmemory.Address)
+
     def gct_gc__collect(self, hop):
         op = hop.spaceop
         livevars = self.push_roots(hop)
@@ -650,6 +742,18 @@ class FrameworkGCTransformer(GCTransformer):
                                   self.c_const_gc,
                                   v_size])
 
+    def gct_gc_collection_stats(self, hop):
+        [v_index, v_field] = hop.spaceop.args
+        hop.genop("direct_call", [self.collection_stats_ptr,
+                                  self.c_const_gc,
+                                  v_index, v_field],
+                  resultvar=hop.spaceop.result)
+
+    def gct_gc_dump_alloc_sites(self, hop):
+        if self.dump_alloc_sites_ptr is not None:
+            hop.genop("direct_call", [self.dump_alloc_sites_ptr,
+                                      self.c_const_gc])
+
     def gct_gc_thread_prepare(self, hop):
         assert self.translator.config.translation.thread
         hop.genop("direct_call", [self.thread_prepare_ptr])
@@ -694,10 +798,21 @@ class FrameworkGCTransformer(GCTransformer):
                                    resulttype = llmemory.Address)
             v_structaddr = hop.genop("cast_ptr_to_adr", [v_struct],
                                      resulttype = llmemory.Address)
-            hop.genop("direct_call", [self.write_barrier_ptr,
-                                      self.c_const_gc,
-                                      v_newvalue,
-                                      v_structaddr])
+            if (opname == 'setarrayitem' and
+                self.write_barrier_from_array_ptr is not None and
+                is_gcarrayofgcptr(v_struct.concretetype.TO)):
+                # card marking: tell the GC which item is modified
+                v_index = hop.spaceop.args[1]
+                hop.genop("direct_call", [self.write_barrier_from_array_ptr,
+                                          self.c_const_gc,
+                                          v_newvalue,
+                                          v_structaddr,
+                                          v_index])
+            else:
+                hop.genop("direct_call", [self.write_barrier_ptr,
+                                          self.c_const_gc,
+                                          v_newvalue,
+                                          v_structaddr])
         hop.rename('bare_' + opname)
 
     def var_needs_set_transform(self, var):
@@ -913,6 +1028,7 @@ class ShadowStackRootWalker(BaseRootWalker):
         from pypy.rpython.memory.support import AddressDict
         from pypy.rpython.memory.support import copy_without_null_values
         gcdata = self.gcdata
+        gc = self.gc
         # the interfacing between the threads and the GC is done via
         # three completely ad-hoc operations at the moment:
         # gc_thread_prepare, gc_thread_run, gc_thread_die.
@@ -927,6 +1043,7 @@ class ShadowStackRootWalker(BaseRootWalker):
             aid = get_aid()
             gcdata.main_thread = aid
             gcdata.active_thread = aid
+            gc.set_current_thread(aid)
             gcdata.thread_stacks = AddressDict()     # {aid: root_stack_top}
             gcdata._fresh_rootstack = llmemory.NULL
             gcdata.dead_threads_count = 0
@@ -960,6 +1077,7 @@ class ShadowStackRootWalker(BaseRootWalker):
             """
             aid = get_aid()
             gcdata.thread_stacks.setitem(aid, llmemory.NULL)
+            gc.forget_thread(aid)
             old = gcdata.root_stack_base
             if gcdata._fresh_rootstack == llmemory.NULL:
                 gcdata._fresh_rootstack = old
@@ -1002,6 +1120,7 @@ class ShadowStackRootWalker(BaseRootWalker):
                 gcdata.root_stack_base = self.pop_stack()
             # done
             gcdata.active_thread = new_aid
+            gc.set_current_thread(new_aid)
 
         def collect_stack(aid, stacktop, callback):
             if stacktop != llmemory.NULL and aid != get_aid():
@@ -520,6 +520,30 @@ class GCTransformer(BaseGCTransformer):
             hop.genop("raw_memclear", [v_raw, c_size])
         return v_raw        
 
+    def gct_fv_stack_malloc_varsize(self, hop, flags, TYPE, v_length,
+                                    c_const_size, c_item_size,
+                                    c_offset_to_length):
+        # only arrays of a constant length are moved to the stack, see
+        # translator/backendopt/escape.py.  The memory is zero-filled.
+        assert isinstance(v_length, Constant)
+        c_size = rmodel.inputconst(lltype.Signed,
+                                   llmemory.sizeof(TYPE, v_length.value))
+        v_raw = hop.genop("stack_malloc", [c_size],
+                          resulttype=llmemory.Address)
+        if c_offset_to_length is not None:
+            self.store_stack_array_length(hop, v_raw, v_length,
+                                          c_offset_to_length)
+        return v_raw
+
+    def store_stack_array_length(self, hop, v_addr, v_length,
+                                 c_offset_to_length):
+        v_lengthaddr = hop.genop("adr_add", [v_addr, c_offset_to_length],
+                                 resulttype=llmemory.Address)
+        hop.genop("raw_store", [v_lengthaddr,
+                                rmodel.inputconst(lltype.Void, lltype.Signed),
+                                rmodel.inputconst(lltype.Signed, 0),
+                                v_length])
+
     def gct_malloc_varsize(self, hop, add_flags=None):
         flags = hop.spaceop.args[1].value
         if add_flags:
@@ -671,3 +695,9 @@ class GCTransformer(BaseGCTransformer):
 
     def gct_gc_can_move(self, hop):
         return hop.cast_result(rmodel.inputconst(lltype.Bool, False))
+
+    def gct_gc_collection_stats(self, hop):
+        return hop.cast_result(rmodel.inputconst(lltype.Signed, -1))
+
+    def gct_gc_dump_alloc_sites(self, hop):
+        pass
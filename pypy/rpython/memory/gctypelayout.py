@@ -108,6 +108,11 @@ T_IS_FIXSIZE          = 0x4
 T_NO_GCPTR_IN_VARSIZE = 0x2
 T_NOT_SIMPLE_GCARRAY  = 0x1
 
+def is_gcarrayofgcptr(TYPE):
+    return (isinstance(TYPE, lltype.GcArray)
+            and isinstance(TYPE.OF, lltype.Ptr)
+            and TYPE.OF.TO._gckind == 'gc')
+
 def get_typeid_bitmask(TYPE):
     """Return the bits that we would like to be set or cleared in the type_id
     corresponding to TYPE.  This returns (mask, expected_value), where
@@ -116,9 +121,7 @@ def get_typeid_bitmask(TYPE):
     if not TYPE._is_varsize():
         return (T_IS_FIXSIZE, T_IS_FIXSIZE)     # not var-sized
 
-    if (isinstance(TYPE, lltype.GcArray)
-        and isinstance(TYPE.OF, lltype.Ptr)
-        and TYPE.OF.TO._gckind == 'gc'):
+    if is_gcarrayofgcptr(TYPE):
         # a simple GcArray(gcptr)
         return (T_IS_FIXSIZE|T_NO_GCPTR_IN_VARSIZE|T_NOT_SIMPLE_GCARRAY, 0)
 
@@ -90,7 +90,14 @@ class GCManagedHeap(object):
         ARRAY = lltype.typeOf(array).TO
         addr = llmemory.cast_ptr_to_adr(array)
         addr += llmemory.itemoffsetof(ARRAY, index)
-        self.setinterior(array, addr, ARRAY.OF, newitem)
+        if (self.gc.needs_write_barrier_from_array and
+            gctypelayout.is_gcarrayofgcptr(ARRAY)):
+            self.gc.write_barrier_from_array(
+                llmemory.cast_ptr_to_adr(newitem),
+                llmemory.cast_ptr_to_adr(array), index)
+            llheap.setinterior(array, addr, ARRAY.OF, newitem)
+        else:
+            self.setinterior(array, addr, ARRAY.OF, newitem)
 
     def setinterior(self, toplevelcontainer, inneraddr, INNERTYPE, newvalue):
         if (lltype.typeOf(toplevelcontainer).TO._gckind == 'gc' and
@@ -105,6 +112,12 @@ class GCManagedHeap(object):
     def can_move(self, addr):
         return self.gc.can_move(addr)
 
+    def collection_stats(self, index, field):
+        return self.gc.collection_stats(index, field)
+
+    def dump_alloc_sites(self):
+        self.gc.dump_alloc_sites()
+
     def weakref_create_getlazy(self, objgetter):
         # we have to be lazy in reading the llinterp variable containing
         # the 'obj' pointer, because the gc.malloc() call below could
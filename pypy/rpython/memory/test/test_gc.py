@@ -452,6 +452,12 @@ class TestSemiSpaceGC(GCTest, snippet.SemiSpaceGCTests):
 class TestGrowingSemiSpaceGC(TestSemiSpaceGC):
     GC_PARAMS = {'space_size': 64}
 
+class TestMarkCompactGC(TestSemiSpaceGC):
+    from pypy.rpython.memory.gc.markcompact import MarkCompactGC as GCClass
+
+class TestGrowingMarkCompactGC(TestMarkCompactGC):
+    GC_PARAMS = {'space_size': 64}
+
 class TestGenerationalGC(TestSemiSpaceGC):
     from pypy.rpython.memory.gc.generation import GenerationGC as GCClass
 
@@ -798,6 +798,47 @@ class TestSemiSpaceGC(GenericMovingGCTests):
             GC_PARAMS = {'space_size': 2048}
             root_stack_depth = 200
 
+    def test_dump_alloc_sites(self):
+        import os
+        from pypy.rlib import rgc
+        from pypy.tool.udir import udir
+        class A(object):
+            pass
+        def f():
+            a = None
+            i = 0
+            while i < 7:
+                a = A()
+                i += 1
+            rgc.collect()
+            rgc.dump_alloc_sites()
+            return a is not None
+        run, transformer = self.runner(f, transformer=True, gcallocsites=True)
+        [site] = [i for i, (graph, TYPE) in enumerate(transformer.alloc_sites)
+                    if graph.name == 'f']
+        path = udir.join('test_dump_alloc_sites')
+        os.environ['PYPY_GC_ALLOC_SITES'] = str(path)
+        try:
+            res = run([])
+        finally:
+            del os.environ['PYPY_GC_ALLOC_SITES']
+        assert res
+        lines = [line for line in path.read().splitlines()
+                      if line.startswith('site %d: ' % site)]
+        assert len(lines) == 1
+        assert lines[0].startswith('site %d: count=7 ' % site)
+        assert lines[0].endswith(' survivors=1')
+
+class TestMarkCompactGC(GenericMovingGCTests):
+    gcname = "markcompact"
+
+    class gcpolicy(gc.FrameworkGcPolicy):
+        class transformerclass(framework.FrameworkGCTransformer):
+            from pypy.rpython.memory.gc.markcompact import MarkCompactGC \
+                                                           as GCClass
+            GC_PARAMS = {'space_size': 2048}
+            root_stack_depth = 200
+
 class TestGenerationGC(GenericMovingGCTests):
     gcname = "generation"
 
@@ -524,6 +524,11 @@ def rtype_raw_memcopy(hop):
     hop.exception_cannot_occur()
     return hop.genop('raw_memcopy', v_list)
 
+def rtype_raw_memmove(hop):
+    v_list = hop.inputargs(llmemory.Address, llmemory.Address, lltype.Signed)
+    hop.exception_cannot_occur()
+    return hop.genop('raw_memmove', v_list)
+
 def rtype_raw_memclear(hop):
     v_list = hop.inputargs(llmemory.Address, lltype.Signed)
     return hop.genop('raw_memclear', v_list)
@@ -533,6 +538,7 @@ BUILTIN_TYPER[llmemory.raw_malloc_usage] = rtype_raw_malloc_usage
 BUILTIN_TYPER[llmemory.raw_free] = rtype_raw_free
 BUILTIN_TYPER[llmemory.raw_memclear] = rtype_raw_memclear
 BUILTIN_TYPER[llmemory.raw_memcopy] = rtype_raw_memcopy
+BUILTIN_TYPER[llmemory.raw_memmove] = rtype_raw_memmove
 
 def rtype_offsetof(hop):
     TYPE, field = hop.inputargs(lltype.Void, lltype.Void)
@@ -71,6 +71,7 @@ class RPythonTyper(object):
         self.cache_dummy_values = {}
         self.typererrors = []
         self.typererror_count = 0
+        self.graphs_done_in_workers = 0   # see config.translation.rtype_jobs
         # make the primitive_to_repr constant mapping
         self.primitive_to_repr = {}
         if self.type_system.offers_exceptiondata:
@@ -205,12 +206,21 @@ class RPythonTyper(object):
             newtext = ''
         blockcount = 0
         self.annmixlevel = None
+        jobs = self.getconfig().translation.rtype_jobs
         while True:
             # look for blocks not specialized yet
             pending = [block for block in self.annotator.annotated
                              if block not in self.already_seen]
             if not pending:
                 break
+            if (jobs > 1 and not self.already_seen and hasattr(os, 'fork')
+                and self.type_system is LowLevelTypeSystem.instance):
+                # first specialize what can be done in parallel
+                from pypy.rpython.forkspecialize import specialize_in_workers
+                self.graphs_done_in_workers += specialize_in_workers(
+                    self, pending, jobs)
+                pending = [block for block in pending
+                                 if block not in self.already_seen]
             # shuffle blocks a bit
             if self.seed:
                 import random
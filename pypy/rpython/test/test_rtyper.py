@@ -162,3 +162,43 @@ def test_missing_gvflavor_bug():
     t.checkgraphs()
     graph = graphof(t, fn)
     assert graph.getreturnvar().concretetype == Void
+
+def test_rtype_jobs():
+    import os
+    if not hasattr(os, 'fork'):
+        py.test.skip("requires fork()")
+    from pypy.rpython.llinterp import LLInterpreter
+    class A(object):
+        def __init__(self, x):
+            self.x = x
+    def f1(x):
+        return x + 1
+    def f2(x):
+        return A(f1(x)).x * 2
+    def f3(x):
+        return str(f2(x))
+    def f4(x):
+        return len(f3(x)) + f1(x)
+    def f5(x):
+        return [f4(x), f2(x)]
+    def main(x):
+        lst = f5(x)
+        return lst[0] + lst[1]
+    results = []
+    for jobs in [1, 2]:
+        t = TranslationContext()
+        t.config.translation.rtype_jobs = jobs
+        t.buildannotator().build_types(main, [int])
+        t.buildrtyper().specialize()
+        t.checkgraphs()
+        if jobs == 1:
+            assert t.rtyper.graphs_done_in_workers == 0
+        else:
+            # the small local graphs, e.g. f1(), are rtyped in the workers
+            assert t.rtyper.graphs_done_in_workers > 0
+        for graph in t.graphs:
+            for v in graph.getargs() + [graph.getreturnvar()]:
+                assert isinstance(v.concretetype, LowLevelType)
+        interp = LLInterpreter(t.rtyper)
+        results.append(interp.eval_graph(graphof(t, main), [41]))
+    assert results == [128, 128]
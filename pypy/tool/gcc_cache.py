@@ -3,8 +3,10 @@ from pypy.tool.autopath import pypydir
 from pypy.translator.tool.cbuild import build_executable
 from pypy.translator.tool.cbuild import ExternalCompilationInfo
 from pypy.translator.tool.cbuild import CompilationError
+from pypy.translator.tool.cbuild import log
 from pypy.tool.compat import md5
-import py
+from py.compat import subprocess
+import py, os, sys, threading, Queue
 
 cache_dir_root = py.path.local(pypydir).join('_cache').ensure(dir=1)
 
@@ -44,3 +46,155 @@ def try_compile_cache(c_files, eci):
         assert data.startswith('FAIL\n')
         msg = data[len('FAIL\n'):]
         raise CompilationError(msg.strip())
+
+# ____________________________________________________________
+# Content-addressed cache of object files.  The key of an object file
+# is the md5 of its preprocessed source together with the compiler and
+# the flags that influence code generation; the include directories only
+# matter through the preprocessed text, so that the same generated C
+# code compiled in two different usession directories shares the entry.
+
+def object_cache_key(c_file, compiler_exe, compile_args, include_args):
+    c_file = py.path.local(c_file)
+    cmd = [compiler_exe, '-E', '-P'] + compile_args + include_args
+    cmd.append(c_file.basename)
+    p = subprocess.Popen(cmd, cwd=str(c_file.dirpath()),
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    preprocessed, _ = p.communicate()
+    if p.returncode != 0:
+        return None     # let the real compilation report the error
+    key = repr((preprocessed, compiler_exe, compile_args))
+    return md5.md5(key).hexdigest()
+
+def compile_object(c_file, compiler_exe, compile_args, include_args,
+                   use_cache=False):
+    c_file = py.path.local(c_file)
+    o_file = c_file.new(ext='o')
+    # the output of -fprofile-use depends on the .gcda files, which are
+    # not part of the key: never cache profile-based builds
+    for arg in compile_args:
+        if arg.startswith('-fprofile-'):
+            use_cache = False
+    key = None
+    if use_cache:
+        key = object_cache_key(c_file, compiler_exe, compile_args,
+                               include_args)
+    if key is not None:
+        cache_dir = cache_dir_root.join('object_cache').ensure(dir=1)
+        cached = cache_dir.join(key + '.o')
+        if cached.check():
+            log.objcache('%s (cached)' % (c_file.basename,))
+            cached.copy(o_file)
+            return o_file
+    cmd = ([compiler_exe] + compile_args + include_args +
+           ['-c', c_file.basename, '-o', o_file.basename])
+    log.execute(' '.join(cmd))
+    p = subprocess.Popen(cmd, cwd=str(c_file.dirpath()),
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output, _ = p.communicate()
+    if output:
+        sys.stdout.write(output)
+    if p.returncode != 0:
+        raise CompilationError('%s\ncommand %r failed with exit status %d' % (
+            output.rstrip(), ' '.join(cmd), p.returncode))
+    if key is not None:
+        # write under a temporary name first: several builds may be
+        # filling the same cache concurrently
+        tmp = cache_dir.join('%s.%d.tmp' % (key, os.getpid()))
+        o_file.copy(tmp)
+        tmp.rename(cached)
+    return o_file
+
+def compile_objects(units, jobs=1, use_cache=False):
+    """Compile each (c_file, compiler_exe, compile_args, include_args)
+    of 'units' to an object file next to it, running up to 'jobs'
+    compilers at the same time.  Returns the list of object files, in
+    the order of 'units'.
+    """
+    results = [None] * len(units)
+    todo = range(len(units))
+    todo.reverse()
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            lock.acquire()
+            try:
+                if errors or not todo:
+                    return
+                i = todo.pop()
+            finally:
+                lock.release()
+            c_file, compiler_exe, compile_args, include_args = units[i]
+            try:
+                results[i] = compile_object(c_file, compiler_exe,
+                                            compile_args, include_args,
+                                            use_cache)
+            except:
+                # any exception, not only CompilationError: it is
+                # re-raised in the caller with its original traceback
+                errors.append(sys.exc_info())
+
+    jobs = max(1, min(jobs, len(units)))
+    if jobs == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for i in range(jobs)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    if errors:
+        exc_type, exc_value, tb = errors[0]
+        raise exc_type, exc_value, tb
+    return results
+
+class BackgroundCompiler(object):
+    """Compile C files into the object cache while the caller goes on,
+    e.g. while the rest of the source is being generated.  The real
+    compilation then finds the object files in the cache.  Compilation
+    errors are ignored here: the real compilation reports them.  Any
+    other exception is re-raised by wait()."""
+
+    def __init__(self, compiler_exe, compile_args, include_args, jobs=1):
+        self.compiler_exe = compiler_exe
+        self.compile_args = compile_args
+        self.include_args = include_args
+        self.queue = Queue.Queue()
+        self.errors = []
+        self.threads = []
+        for i in range(max(1, jobs)):
+            t = threading.Thread(target=self._worker)
+            t.setDaemon(True)
+            t.start()
+            self.threads.append(t)
+
+    def _worker(self):
+        while True:
+            c_file = self.queue.get()
+            if c_file is None:
+                return
+            try:
+                compile_object(c_file, self.compiler_exe, self.compile_args,
+                               self.include_args, use_cache=True)
+            except CompilationError:
+                pass
+            except:
+                # e.g. an OSError from Popen or from the cache: keep
+                # going, so that wait() does not block, and report it there
+                self.errors.append(sys.exc_info())
+
+    def add(self, c_file):
+        self.queue.put(c_file)
+
+    def wait(self):
+        """Wait until all the files added so far are compiled."""
+        for t in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+        if self.errors:
+            exc_type, exc_value, tb = self.errors[0]
+            raise exc_type, exc_value, tb
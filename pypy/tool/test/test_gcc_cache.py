@@ -62,3 +62,99 @@ def test_gcc_ask():
     print '<<<'
     print err
     print '>>>'
+
+def test_compile_objects_cache():
+    dir = udir.join('test_compile_objects_cache').ensure(dir=1)
+    f1 = dir.join('a.c')
+    f1.write('int a(int x) { return x + ANSWER; }\n')
+    f2 = dir.join('b.c')
+    f2.write('int b(int x) { return x * 2; }\n')
+    dir.join('answer.h').write('#define ANSWER 42\n')
+    args = ['-O0', '-include', 'answer.h']
+    units = [(f1, 'gcc', args, []), (f2, 'gcc', args, [])]
+    keys = [object_cache_key(f, 'gcc', args, []) for f in [f1, f2]]
+    for key in keys:
+        cached = cache_dir_root.join('object_cache', key + '.o')
+        if cached.check():
+            cached.remove()
+    objects = compile_objects(units, jobs=2, use_cache=True)
+    assert objects == [f1.new(ext='o'), f2.new(ext='o')]
+    for key in keys:
+        assert cache_dir_root.join('object_cache', key + '.o').check()
+    # the key depends on the preprocessed source, not on the file itself
+    dir.join('answer.h').write('#define ANSWER 43\n')
+    assert object_cache_key(f1, 'gcc', args, []) != keys[0]
+    assert object_cache_key(f2, 'gcc', args, []) == keys[1]
+    assert object_cache_key(f2, 'gcc', ['-O2'], []) != keys[1]
+    f1.new(ext='o').remove()
+    f2.new(ext='o').remove()
+    compile_objects(units, jobs=2, use_cache=True)
+    assert f1.new(ext='o').check()
+    assert f2.new(ext='o').check()
+
+def test_compile_objects_error():
+    dir = udir.join('test_compile_objects_error').ensure(dir=1)
+    f1 = dir.join('ok.c')
+    f1.write('int ok(void) { return 0; }\n')
+    f2 = dir.join('boom.c')
+    f2.write('#error BOOM\n')
+    units = [(f1, 'gcc', [], []), (f2, 'gcc', [], [])]
+    err = py.test.raises(CompilationError, compile_objects, units, jobs=2)
+    assert 'BOOM' in str(err.value)
+
+def test_compile_objects_other_error():
+    from pypy.tool import gcc_cache
+    def compile_object(c_file, *args):
+        if c_file == 'bad.c':
+            raise ValueError('not a compilation error')
+        return c_file + '.o'
+    units = [('good.c', 'gcc', [], []), ('bad.c', 'gcc', [], [])]
+    original = gcc_cache.compile_object
+    gcc_cache.compile_object = compile_object
+    try:
+        for jobs in [1, 2]:
+            err = py.test.raises(ValueError, compile_objects, units, jobs=jobs)
+            assert str(err.value) == 'not a compilation error'
+    finally:
+        gcc_cache.compile_object = original
+
+def test_background_compiler():
+    dir = udir.join('test_background_compiler').ensure(dir=1)
+    files = []
+    for i in range(3):
+        f = dir.join('f%d.c' % i)
+        f.write('int f%d(int x) { return x + %d; }\n' % (i, i))
+        files.append(f)
+    dir.join('bad.c').write('#error BOOM\n')
+    args = ['-O0']
+    keys = [object_cache_key(f, 'gcc', args, []) for f in files]
+    for key in keys:
+        cached = cache_dir_root.join('object_cache', key + '.o')
+        if cached.check():
+            cached.remove()
+    bg = BackgroundCompiler('gcc', args, [], jobs=2)
+    bg.add(dir.join('bad.c'))     # errors are left to the real compilation
+    for f in files:
+        bg.add(f)
+    bg.wait()
+    for key in keys:
+        assert cache_dir_root.join('object_cache', key + '.o').check()
+
+def test_background_compiler_other_error():
+    from pypy.tool import gcc_cache
+    def compile_object(c_file, *args, **kwds):
+        if c_file == 'bad.c':
+            raise OSError(2, 'No such file or directory')
+        compiled.append(c_file)
+    compiled = []
+    original = gcc_cache.compile_object
+    gcc_cache.compile_object = compile_object
+    try:
+        bg = BackgroundCompiler('gcc', [], [], jobs=1)
+        bg.add('bad.c')
+        bg.add('good.c')
+        err = py.test.raises(OSError, bg.wait)
+        assert err.value.errno == 2
+    finally:
+        gcc_cache.compile_object = original
+    assert compiled == ['good.c']
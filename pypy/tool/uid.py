@@ -59,6 +59,25 @@ class Hashable(object):
     def __hash__(self):
         return hash(self.key)
 
+    def __getstate__(self):
+        # the key may be based on id(), which pickling does not preserve
+        state = {}
+        for cls in self.__class__.__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name not in ('key', 'value') and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        state.update(getattr(self, '__dict__', {}))
+        return self.value, type(self.key) is not tuple, state
+
+    def __setstate__(self, (value, key_is_id, state)):
+        self.value = value
+        if key_is_id:
+            self.key = id(value)
+        else:
+            self.key = type(value), value
+        for name, x in state.items():
+            setattr(self, name, x)
+
     def __repr__(self):
         return '(%s)' % (self,)
 
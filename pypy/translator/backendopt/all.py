@@ -36,6 +36,8 @@ def backend_optimizations(translator, graphs=None, secondary=False, **kwds):
     # raisingop2direct_call, inline_threshold, mallocs
     # merge_if_blocks, constfold, heap2stack
     # clever_malloc_removal, remove_asserts
+    # returns a dict with the number of inlined calls, removed mallocs
+    # and operations removed by constant folding
 
     config = translator.config.translation.backendopt.copy(as_default=True)
     config.set(**kwds)
@@ -68,6 +70,9 @@ def backend_optimizations(translator, graphs=None, secondary=False, **kwds):
             print_statistics(translator.graphs[0], translator)
 
     remove_obvious_noops()
+    stats = {'inlined_calls': 0,
+             'removed_mallocs': 0,
+             'folded_operations': 0}
 
     if config.inline or config.mallocs:
         heuristic = get_function(config.inline_heuristic)
@@ -75,10 +80,26 @@ def backend_optimizations(translator, graphs=None, secondary=False, **kwds):
             threshold = config.inline_threshold
         else:
             threshold = 0
-        inline_malloc_removal_phase(config, translator, graphs,
-                                    threshold,
-                                    inline_heuristic=heuristic)
-        constfold(config, graphs)
+        inlined, removed = inline_malloc_removal_phase(
+            config, translator, graphs, threshold, inline_heuristic=heuristic)
+        stats['inlined_calls'] += inlined
+        stats['removed_mallocs'] += removed
+        stats['folded_operations'] += constfold(config, graphs)
+
+    # the call counts of the profiling run drive both the clever malloc
+    # removal and the profile based inlining phase: cold call-sites are
+    # not inlined at all
+    call_count_pred = None
+    if config.profile_based_inline and not secondary:
+        threshold = config.profile_based_inline_threshold
+        inline.instrument_inline_candidates(graphs, threshold)
+        if config.profile_based_inline_runner == 'llinterp':
+            counters = translator.driver_llinterp_instrument_result()
+        else:
+            counters = translator.driver_instrument_result(
+                config.profile_based_inline)
+        call_count_pred = make_call_count_pred(
+            counters, config.profile_based_inline_hot_calls)
 
     if config.clever_malloc_removal:
         threshold = config.clever_malloc_removal_threshold
@@ -89,30 +110,25 @@ def backend_optimizations(translator, graphs=None, secondary=False, **kwds):
         count = mallocprediction.clever_inlining_and_malloc_removal(
             translator, graphs,
             threshold = threshold,
-            heuristic=heuristic)
+            heuristic=heuristic,
+            call_count_pred=call_count_pred)
         log.inlineandremove("removed %d simple mallocs in total" % count)
-        constfold(config, graphs)
+        stats['removed_mallocs'] += count
+        stats['folded_operations'] += constfold(config, graphs)
         if config.print_statistics:
             print "after clever inlining and malloc removal"
             print_statistics(translator.graphs[0], translator)        
 
 
-    if config.profile_based_inline and not secondary:
+    if call_count_pred is not None:
         threshold = config.profile_based_inline_threshold
         heuristic = get_function(config.profile_based_inline_heuristic)
-        inline.instrument_inline_candidates(graphs, threshold)
-        counters = translator.driver_instrument_result(
-            config.profile_based_inline)
-        n = len(counters)
-        def call_count_pred(label):
-            if label >= n:
-                return False
-            return counters[label] > 250 # xxx introduce an option for this
-        inline_malloc_removal_phase(config, translator, graphs,
-                                    threshold,
-                                    inline_heuristic=heuristic,
-                                    call_count_pred=call_count_pred)
-    constfold(config, graphs)
+        inlined, removed = inline_malloc_removal_phase(
+            config, translator, graphs, threshold, inline_heuristic=heuristic,
+            call_count_pred=call_count_pred)
+        stats['inlined_calls'] += inlined
+        stats['removed_mallocs'] += removed
+    stats['folded_operations'] += constfold(config, graphs)
 
     if config.remove_asserts:
         remove_asserts(translator, graphs)
@@ -134,26 +150,49 @@ def backend_optimizations(translator, graphs=None, secondary=False, **kwds):
 
     for graph in graphs:
         checkgraph(graph)
+    return stats
+
+def make_call_count_pred(counters, hot_calls):
+    n = len(counters)
+    def call_count_pred(label):
+        if label >= n:
+            return False
+        return counters[label] > hot_calls
+    return call_count_pred
+
+def count_operations(graphs):
+    count = 0
+    for graph in graphs:
+        for block in graph.iterblocks():
+            count += len(block.operations)
+    return count
 
 def constfold(config, graphs):
-    if config.constfold:
-        for graph in graphs:
-            constant_fold_graph(graph)    
+    # returns the number of operations that disappeared
+    if not config.constfold:
+        return 0
+    before = count_operations(graphs)
+    for graph in graphs:
+        constant_fold_graph(graph)
+    return before - count_operations(graphs)
 
 def inline_malloc_removal_phase(config, translator, graphs, inline_threshold,
                                 inline_heuristic,
                                 call_count_pred=None):
 
+    # returns the number of inlined calls and of removed mallocs
     type_system = translator.rtyper.type_system.name
+    inlined = removed = 0
     # inline functions in each other
     if inline_threshold:
         log.inlining("phase with threshold factor: %s" % inline_threshold)
         log.inlining("heuristic: %s.%s" % (inline_heuristic.__module__,
                                            inline_heuristic.__name__))
 
-        inline.auto_inline_graphs(translator, graphs, inline_threshold,
-                                  heuristic=inline_heuristic,
-                                  call_count_pred=call_count_pred)
+        inlined = inline.auto_inline_graphs(translator, graphs,
+                                            inline_threshold,
+                                            heuristic=inline_heuristic,
+                                            call_count_pred=call_count_pred)
 
         if config.print_statistics:
             print "after inlining:"
@@ -162,8 +201,9 @@ def inline_malloc_removal_phase(config, translator, graphs, inline_threshold,
     # vaporize mallocs
     if config.mallocs:
         log.malloc("starting malloc removal")
-        remove_mallocs(translator, graphs, type_system)
+        removed = remove_mallocs(translator, graphs, type_system)
 
         if config.print_statistics:
             print "after malloc removal:"
             print_statistics(translator.graphs[0], translator)    
+    return inlined, removed
@@ -377,18 +377,34 @@ def multicontains(l1, l2):
             return False
     return True
 
+# arrays of a constant length up to this one are also moved to the stack
+MAX_STACK_ARRAY_LENGTH = 64
+
 def malloc_to_stack(t):
+    from pypy.rpython.memory.gctransform.support import find_gc_ptrs_in_type
     adi = AbstractDataFlowInterpreter(t)
     for graph in t.graphs:
         if graph.startblock not in adi.flown_blocks:
             adi.schedule_function(graph)
             adi.complete()
+    # the framework GCs see the objects on the stack as prebuilt objects
+    # when they find them from their roots, but cannot trace them
+    no_gc_pointers = t.config.translation.gctransformer == "framework"
     for graph in t.graphs:
         loop_blocks = support.find_loop_blocks(graph)
         for block, op in graph.iterblockops():
-            if op.opname != 'malloc':
+            if op.opname == 'malloc_varsize':
+                v_length = op.args[2]
+                if not (isinstance(v_length, Constant) and
+                        0 <= v_length.value <= MAX_STACK_ARRAY_LENGTH):
+                    continue
+            elif op.opname != 'malloc':
+                continue
+            if op.args[1].value != {'flavor': 'gc'}:
                 continue
             STRUCT = op.args[0].value
+            if no_gc_pointers and find_gc_ptrs_in_type(STRUCT):
+                continue
             # must not remove mallocs of structures that have a RTTI with a destructor
             try:
                 destr_ptr = lltype.getRuntimeTypeInfo(STRUCT)._obj.destructor_funcptr
@@ -402,8 +418,6 @@ def malloc_to_stack(t):
             if not crep.escapes:
                 if block not in loop_blocks:
                     print "moving object from heap to stack %s in %s" % (op, graph.name)
-                    flags = op.args[1].value
-                    assert flags == {'flavor': 'gc'}
                     op.args[1] = Constant({'flavor': 'stack'}, lltype.Void)
                 else:
                     print "%s in %s is a non-escaping malloc in a loop" % (op, graph.name)
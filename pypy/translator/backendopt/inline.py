@@ -206,13 +206,15 @@ class BaseInliner(object):
                 raise CannotInline("inlining a recursive function")
             else:
                 non_recursive[subgraph] = True
-            if call_count_pred:
+            if call_count_pred and index_operation > 0:
                 countop = block.operations[index_operation-1]
-                assert countop.opname == 'instrument_count'
-                assert countop.args[0].value == 'inline'
-                label = countop.args[1].value
-                if not call_count_pred(label):
-                    continue
+                # call-sites without a counter were not profiled, e.g.
+                # because the callee was too big to be a candidate
+                if (countop.opname == 'instrument_count' and
+                    countop.args[0].value == 'inline'):
+                    label = countop.args[1].value
+                    if not call_count_pred(label):
+                        continue
             operation = block.operations[index_operation]
             self.inline_once(block, index_operation)
             count += 1
@@ -781,3 +783,4 @@ def auto_inline_graphs(translator, graphs, threshold, call_count_pred=None,
         for graph in graphs:
             removenoops.remove_superfluous_keep_alive(graph)
             removenoops.remove_duplicate_casts(graph, translator)
+        return count
@@ -127,14 +127,16 @@ def find_malloc_removal_candidates(t, graphs):
     return callgraph, caller_candidates
 
 def inline_and_remove(t, graphs, threshold=BIG_THRESHOLD,
-                      heuristic=inline.inlining_heuristic):
+                      heuristic=inline.inlining_heuristic,
+                      call_count_pred=None):
     callgraph, caller_candidates = find_malloc_removal_candidates(t, graphs)
     log.inlineandremove("found %s malloc removal candidates" %
                         len(caller_candidates))
     if callgraph:
         count = inline.auto_inlining(t, callgraph=callgraph,
                                      threshold=threshold,
-                                     heuristic=heuristic)
+                                     heuristic=heuristic,
+                                     call_count_pred=call_count_pred)
         if not count:
             return False
         log.inlineandremove('inlined %d callsites.'% (count,))
@@ -154,13 +156,15 @@ def preparation(translator, graphs, threshold=SMALL_THRESHOLD,
 
 def clever_inlining_and_malloc_removal(translator, graphs=None,
                                        threshold=BIG_THRESHOLD,
-                                       heuristic=inline.inlining_heuristic):
+                                       heuristic=inline.inlining_heuristic,
+                                       call_count_pred=None):
     if graphs is None:
         graphs = translator.graphs
     count = 0
     while 1:
         newcount = inline_and_remove(translator, graphs, threshold=threshold,
-                                     heuristic=heuristic)
+                                     heuristic=heuristic,
+                                     call_count_pred=call_count_pred)
         if not newcount:
             break
         count += newcount
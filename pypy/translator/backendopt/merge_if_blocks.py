@@ -1,6 +1,7 @@
 from pypy.objspace.flow.model import Block, Constant, Variable, flatten
 from pypy.objspace.flow.model import checkgraph, mkentrymap
 from pypy.translator.backendopt.support import log
+from pypy.translator.simplify import eliminate_empty_blocks
 
 log = log.mergeifblocks
 
@@ -106,6 +107,10 @@ def merge_if_blocks_once(graph):
     return True
 
 def merge_if_blocks(graph, verbose=True):
+    # constant folding, e.g. after inlining, can leave empty blocks
+    # between the blocks of a chain of comparisons; remove them first
+    # so that they don't cut the chain
+    eliminate_empty_blocks(graph)
     merge = False
     while merge_if_blocks_once(graph):
         merge = True
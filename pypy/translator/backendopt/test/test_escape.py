@@ -2,6 +2,7 @@ from pypy.translator.translator import TranslationContext, graphof
 from pypy.translator.backendopt.escape import AbstractDataFlowInterpreter, malloc_to_stack
 from pypy.translator.backendopt.support import find_backedges, find_loop_blocks
 from pypy.rpython.llinterp import LLInterpreter
+from pypy.rpython.lltypesystem import lltype
 from pypy.rlib.objectmodel import instantiate
 from pypy import conftest
 
@@ -479,3 +480,36 @@ def test_dont_remove_del_objects():
     assert graph.startblock.operations[0].opname == "malloc"
    
 
+
+def test_array_with_constant_length():
+    A = lltype.GcArray(lltype.Signed)
+    def f(n):
+        a = lltype.malloc(A, 10)
+        for i in range(10):
+            a[i] = i * n
+        return a[n]
+    t = check_malloc_removal(f, [int], [3], 9, must_remove=False)
+    graph = graphof(t, f)
+    op = graph.startblock.operations[0]
+    assert op.opname == "malloc_varsize"
+    assert op.args[1].value['flavor'] == 'stack'
+
+def test_framework_keeps_gc_pointers_on_the_heap():
+    S = lltype.GcStruct('S', ('x', lltype.Signed))
+    T = lltype.GcStruct('T', ('s', lltype.Ptr(S)), ('x', lltype.Signed))
+    U = lltype.GcStruct('U', ('x', lltype.Signed))
+    def f(n):
+        t = lltype.malloc(T)
+        t.x = n
+        u = lltype.malloc(U)
+        u.x = n + 1
+        return t.x + u.x
+    t = TranslationContext()
+    t.config.translation.gctransformer = "framework"
+    t.buildannotator().build_types(f, [int])
+    t.buildrtyper().specialize()
+    malloc_to_stack(t)
+    graph = graphof(t, f)
+    flavors = [op.args[1].value['flavor'] for op in graph.startblock.operations
+                                          if op.opname == 'malloc']
+    assert flavors == ['gc', 'stack']
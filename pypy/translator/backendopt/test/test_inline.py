@@ -453,6 +453,31 @@ class BaseTestInline:
         result = eval_func([15])
         assert result == -1
 
+    def test_auto_inlining_profiled_call_sites(self):
+        def leaf(n):
+            return n * 3 + 1
+        def g(n):
+            return leaf(n) * leaf(n + 1)
+        def f(n):
+            return g(n) + leaf(n)
+        t = self.translate(f, [int])
+        threshold = INLINE_THRESHOLD_FOR_TEST
+        instrument_inline_candidates([graphof(t, g)], threshold)
+        interp = LLInterpreter(t.rtyper)
+        assert interp.eval_graph(graphof(t, f), [4]) == f(4)
+        assert interp.instrument_counters == {0: 1, 1: 1}
+        # only the call-site with label 0 is hot; the call-site in 'f'
+        # has no counter, so inlining it does not depend on the profile
+        auto_inlining(t, threshold, call_count_pred=lambda label: label == 0)
+        g_graph = graphof(t, g)
+        calls = [op for block in g_graph.iterblocks()
+                    for op in block.operations
+                    if op.opname == 'direct_call']
+        assert len(calls) == 1
+        assert collect_called_graphs(g_graph, t).keys() == [graphof(t, leaf)]
+        interp = LLInterpreter(t.rtyper)
+        assert interp.eval_graph(graphof(t, f), [4]) == f(4)
+
     def test_inline_exception_catching(self):
         def f3():
             raise CustomError1
@@ -183,3 +183,33 @@ def test_same_cases():
         actual = interp.eval_graph(graph, [i])
         assert actual == expected
 
+
+def test_merge_across_empty_blocks():
+    from pypy.translator.unsimplify import insert_empty_block
+    def fn(x):
+        if x == 1:
+            return 10
+        elif x == 2:
+            return 20
+        elif x == 3:
+            return 30
+        return 40
+    t = TranslationContext()
+    a = t.buildannotator()
+    a.build_types(fn, [int])
+    rtyper = t.buildrtyper()
+    rtyper.specialize()
+    graph = tgraphof(t, fn)
+    remove_same_as(graph)
+    # put an empty block on the False link of the first comparison,
+    # as left behind e.g. by constant folding
+    falselink = graph.startblock.exits[0]
+    assert not falselink.exitcase
+    insert_empty_block(None, falselink)
+    merge_if_blocks(graph)
+    assert len(graph.startblock.exits) == 4
+    interp = LLInterpreter(rtyper)
+    for i in range(5):
+        expected = fn(i)
+        actual = interp.eval_graph(graph, [i])
+        assert actual == expected
@@ -20,6 +20,10 @@ LOCALVAR = 'l_%s'
 
 KEEP_INLINED_GRAPHS = False
 
+# see FunctionCodeGenerator.use_computed_goto()
+COMPUTED_GOTO_MIN_CASES = 8
+COMPUTED_GOTO_MAX_SPAN_FACTOR = 4
+
 class FunctionCodeGenerator(object):
     """
     Collects information about a function which we have to generate
@@ -268,6 +272,10 @@ class FunctionCodeGenerator(object):
                     #                       self.genc.nameofvalue(link.exitcase, ct))
                     for op in self.gen_link(link):
                         yield op
+                elif (TYPE in (Signed, Unsigned) and
+                      self.use_computed_goto(block)):
+                    for line in self.gen_computed_goto(block):
+                        yield line
                 elif TYPE in (Signed, Unsigned, SignedLongLong,
                               UnsignedLongLong, Char, UniChar):
                     defaultlink = None
@@ -295,6 +303,80 @@ class FunctionCodeGenerator(object):
                     raise TypeError("exitswitch type not supported"
                                     "  Got %r" % (TYPE,))
 
+    def use_computed_goto(self, block):
+        # only for the switches with enough cases that are not too sparse,
+        # e.g. the one that dispatches on the opcode in the interpreter
+        translator = self.db.translator
+        if (translator is None or
+            not translator.config.translation.computed_goto):
+            return False
+        values = [int(link.llexitcase) for link in block.exits
+                                       if link.exitcase != 'default']
+        if len(values) < COMPUTED_GOTO_MIN_CASES:
+            return False
+        if min(values) < -2**31 or max(values) >= 2**31:
+            return False
+        span = max(values) - min(values) + 1
+        return span <= COMPUTED_GOTO_MAX_SPAN_FACTOR * len(values)
+
+    def gen_computed_goto(self, block):
+        # a switch compiled to a table of label addresses, using GCC's
+        # "labels as values" extension; other compilers get the same
+        # labels reached from a regular switch.  The range check makes
+        # the cost of the dispatch independent of the number of cases.
+        #
+        #       static void *blockN_table[] = { &&blockN_case0, ... };
+        #       index = (unsigned long)expr - (unsigned long)min;
+        #       if (index < size) goto *blockN_table[index];
+        #       goto blockN_default;
+        #
+        myblocknum = self.blocknum[block]
+        expr = self.expr(block.exitswitch)
+        defaultlabel = 'block%d_default' % myblocknum
+        defaultlink = None
+        cases = []
+        for link in block.exits:
+            if link.exitcase == 'default':
+                defaultlink = link
+            else:
+                label = 'block%d_case%d' % (myblocknum, len(cases))
+                cases.append((int(link.llexitcase), label, link))
+        minvalue = min([value for value, label, link in cases])
+        maxvalue = max([value for value, label, link in cases])
+        table = [defaultlabel] * (maxvalue - minvalue + 1)
+        for value, label, link in cases:
+            table[value - minvalue] = label
+        yield '{'
+        yield '#ifdef __GNUC__'
+        yield 'static void *block%d_table[%d] = {' % (myblocknum, len(table))
+        for label in table:
+            yield '\t&&%s,' % (label,)
+        yield '};'
+        yield 'unsigned long block%d_index = (unsigned long)%s - ' \
+              '(unsigned long)%dL;' % (myblocknum, expr, minvalue)
+        yield 'if (block%d_index < %dUL)' % (myblocknum, len(table))
+        yield '\tgoto *block%d_table[block%d_index];' % (myblocknum,
+                                                         myblocknum)
+        yield '#else'
+        yield 'switch (%s) {' % expr
+        for value, label, link in cases:
+            yield 'case %s: goto %s;' % (self.db.get(link.llexitcase), label)
+        yield 'default: break;'
+        yield '}'
+        yield '#endif'
+        yield 'goto %s;' % defaultlabel
+        yield '}'
+        for value, label, link in cases:
+            yield '%s:' % label
+            for op in self.gen_link(link):
+                yield op
+        yield '%s:' % defaultlabel
+        if defaultlink is None:
+            yield 'assert(!"bad switch!!");'
+        else:
+            for op in self.gen_link(defaultlink):
+                yield op
+
     def gen_link(self, link, linklocalvars=None):
         "Generate the code to jump across the given Link."
         is_alive = {}
@@ -143,10 +143,12 @@ class CBuilder(object):
             self.eci = self.eci.merge(ExternalCompilationInfo(
                 include_dirs=[python_inc, pypy_include_dir],
             ))
+            self.precompiler = self.start_precompiler()
             cfile, extra = gen_source_standalone(db, modulename, targetdir,
                                                  self.eci,
                                                  entrypointname = pfname,
-                                                 defines = defines)
+                                                 defines = defines,
+                                                 precompiler=self.precompiler)
         self.c_source_filename = py.path.local(cfile)
         self.extrafiles = extra
         if self.standalone:
@@ -287,6 +289,7 @@ _rpython_startup()
 class CStandaloneBuilder(CBuilder):
     standalone = True
     executable_name = None
+    precompiler = None
 
     def getprofbased(self):
         profbased = None
@@ -328,13 +331,37 @@ class CStandaloneBuilder(CBuilder):
             [self.c_source_filename] + extrafiles,
             self.eci, compiler_exe = cc, profbased = self.getprofbased())
 
+    def start_precompiler(self):
+        # with the object cache and several jobs, start compiling the
+        # split C files while the rest of the source is being generated;
+        # compile() then finds them in the cache.  Not with --instrument,
+        # because gen_source_standalone() adds INSTRUMENT_NCOUNTER to the
+        # common header after the split files are written: a file would
+        # be compiled against a different header than its cache key.
+        if (not self.config.translation.objcache or
+            self.config.translation.make_jobs <= 1 or
+            self.config.translation.instrument or
+            self.config.translation.gcrootfinder == "asmgcc" or
+            self.getprofbased() is not None or
+            sys.platform == 'win32'):
+            return None
+        cc = self.config.translation.cc
+        compiler = CCompiler([self.targetdir.join(self.modulename + '.c')],
+                             self.eci, compiler_exe = cc)
+        self.adaptflags(compiler)
+        return compiler.start_background_compiler()
+
     def compile(self):
         assert self.c_source_filename
         assert not self._compiled
+        if self.precompiler is not None:
+            self.precompiler.wait()
+            self.precompiler = None
         compiler = self.getccompiler()
         if self.config.translation.gcrootfinder == "asmgcc":
             # as we are gcc-only anyway, let's just use the Makefile.
-            cmdline = "make -C '%s'" % (self.targetdir,)
+            cmdline = "make -j %d -C '%s'" % (
+                self.config.translation.make_jobs, self.targetdir)
             err = os.system(cmdline)
             if err != 0:
                 raise OSError("failed (see output): " + cmdline)
@@ -360,6 +387,8 @@ class CStandaloneBuilder(CBuilder):
             compiler.compile_extra.append(self.config.translation.compilerflags)
         if self.config.translation.linkerflags:
             compiler.link_extra.append(self.config.translation.linkerflags)
+        compiler.jobs = self.config.translation.make_jobs
+        compiler.use_object_cache = self.config.translation.objcache
 
     def gen_makefile(self, targetdir):
         def write_list(lst, prefix):
@@ -473,6 +502,7 @@ MARKER = '/*/*/' # provide an easy way to split after generating
 
 class SourceGenerator:
     one_source_file = True
+    precompiler = None    # gets the split .c files as soon as written
 
     def __init__(self, database, preimplementationlines=[]):
         self.database = database
@@ -509,6 +539,10 @@ class SourceGenerator:
             self.extrafiles.append(filepath)
         return filepath.open('w')
 
+    def filedone(self, name):
+        if self.precompiler is not None:
+            self.precompiler.add(self.path.join(name))
+
     def getextrafiles(self):
         return self.extrafiles
 
@@ -590,6 +624,7 @@ class SourceGenerator:
 
         print >> fc, '/***********************************************************/'
         fc.close()
+        self.filedone(name)
 
         nextralines = 11 + 1
         for name, nodeiter in self.splitnodesimpl('nonfuncnodes.c',
@@ -613,6 +648,7 @@ class SourceGenerator:
                 print >> fc, MARKER
             print >> fc, '/***********************************************************/'
             fc.close()
+            self.filedone(name)
 
         nextralines = 8 + len(self.preimpl) + 4 + 1
         for name, nodeiter in self.splitnodesimpl('implement.c',
@@ -640,6 +676,7 @@ class SourceGenerator:
                 print >> fc, MARKER
             print >> fc, '/***********************************************************/'
             fc.close()
+            self.filedone(name)
         print >> f
 
 
@@ -729,7 +766,7 @@ def gen_startupcode(f, database):
     print >> f, '}'
 
 def gen_source_standalone(database, modulename, targetdir, eci,
-                          entrypointname, defines={}): 
+                          entrypointname, defines={}, precompiler=None):
     assert database.standalone
     if isinstance(targetdir, str):
         targetdir = py.path.local(targetdir)
@@ -770,6 +807,7 @@ def gen_source_standalone(database, modulename, targetdir, eci,
     #
     sg = SourceGenerator(database, preimplementationlines)
     sg.set_strategy(targetdir)
+    sg.precompiler = precompiler
     database.prepare_inline_helpers()
     sg.gen_readable_parts_of_source(f)
 
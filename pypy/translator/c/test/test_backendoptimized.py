@@ -1,4 +1,4 @@
-import py
+import py, sys
 from pypy.translator.c.test.test_typed import TestTypedTestCase as _TestTypedTestCase
 from pypy.translator.backendopt.all import backend_optimizations
 from pypy.rlib.rarithmetic import r_uint, r_longlong, r_ulonglong
@@ -207,6 +207,88 @@ class TestTypedOptimizedSwitchTestCase:
             assert fn(y) == f(y)
 
 
+class TestTypedOptimizedComputedGotoTestCase(TestTypedOptimizedSwitchTestCase):
+
+    class CodeGenerator(_TestTypedTestCase):
+        def process(self, t):
+            _TestTypedTestCase.process(self, t)
+            self.t = t
+            t.config.translation.computed_goto = True
+            backend_optimizations(t, merge_if_blocks=True)
+
+        def compilefunc(self, t, func):
+            from pypy.translator.c import genc
+            builder = genc.CExtModuleBuilder(t, func, config=t.config)
+            builder.generate_source()
+            self.c_source = ''.join([f.read() for f in
+                                     builder.targetdir.listdir('*.c')])
+            builder.compile()
+            return builder.get_entry_point()
+
+    def check_computed_goto(self, codegenerator):
+        import re
+        source = codegenerator.c_source
+        match = re.search(r'static void \*(block\d+_table)\[(\d+)\] = {',
+                          source)
+        assert match, "no table of labels in the generated C source"
+        table, size = match.groups()
+        assert '&&' in source[match.end():source.index('};', match.end())]
+        assert ('goto *%s[' % table) in source
+        return int(size)
+
+    def test_dense_int_switch(self):
+        def f(x):
+            if x == 100:
+                return 1
+            elif x == 101:
+                return 7
+            elif x == 102:
+                return 5
+            elif x == 104:
+                return 11
+            elif x == 105:
+                return 2
+            elif x == 106:
+                return 8
+            elif x == 107:
+                return 3
+            elif x == 109:
+                return 4
+            elif x == 110:
+                return 6
+            return 0
+        codegenerator = self.CodeGenerator()
+        fn = codegenerator.getcompiled(f, [int])
+        assert self.check_computed_goto(codegenerator) == 11   # 100..110
+        for x in range(95, 115) + [-100, 0, sys.maxint, -sys.maxint-1]:
+            assert fn(x) == f(x)
+
+    def test_dense_uint_switch(self):
+        def f(x):
+            if x == r_uint(0):
+                return 1
+            elif x == r_uint(1):
+                return 7
+            elif x == r_uint(2):
+                return 5
+            elif x == r_uint(3):
+                return 11
+            elif x == r_uint(4):
+                return 2
+            elif x == r_uint(5):
+                return 8
+            elif x == r_uint(6):
+                return 3
+            elif x == r_uint(8):
+                return 4
+            return 0
+        codegenerator = self.CodeGenerator()
+        fn = codegenerator.getcompiled(f, [r_uint])
+        assert self.check_computed_goto(codegenerator) == 9    # 0..8
+        for x in range(12) + [sys.maxint]:
+            assert fn(r_uint(x)) == f(r_uint(x))
+
+
 class TestTypedOptimizedRaisingOps:
 
     class CodeGenerator(_TestTypedTestCase):
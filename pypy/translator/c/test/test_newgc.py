@@ -1017,6 +1017,10 @@ class TestSemiSpaceGC(TestUsingFramework, snippet.SemiSpaceGCTests):
         res = c_fn()
         assert res[1000] == 'y'
 
+class TestMarkCompactGC(TestSemiSpaceGC):
+    gcpolicy = "markcompact"
+    should_be_moving = True
+
 class TestGenerationalGC(TestSemiSpaceGC):
     gcpolicy = "generation"
     should_be_moving = True
@@ -226,3 +226,15 @@ def test_separate_files():
     assert "  ll_strtod.h" in makefile
     assert "  ll_strtod.o" in makefile
 
+
+def test_no_precompiler_with_instrument():
+    from pypy.config.pypyoption import get_pypy_config
+    class FakeBuilder:
+        pass
+    builder = FakeBuilder()
+    builder.config = get_pypy_config(translating=True)
+    builder.config.translation.objcache = True
+    builder.config.translation.make_jobs = 4
+    builder.config.translation.instrument = True
+    # INSTRUMENT_NCOUNTER is only added to the header at the end
+    assert CStandaloneBuilder.start_precompiler.im_func(builder) is None
@@ -8,6 +8,7 @@ from pypy.annotation import model as annmodel
 from pypy.annotation.listdef import s_list_of_strings
 from pypy.annotation import policy as annpolicy
 from py.compat import optparse
+from pypy.config.config import Config
 from pypy.tool.udir import udir
 
 import py
@@ -89,6 +90,7 @@ class TranslationDriver(SimpleTaskEngine):
         self.extmod_name = extmod_name
 
         self.done = {}
+        self.graphswap = None
 
         self.disable(disable)
 
@@ -201,6 +203,11 @@ class TranslationDriver(SimpleTaskEngine):
         self.libdef = None
 
         self.translator.driver_instrument_result = self.instrument_result
+        self.translator.driver_llinterp_instrument_result = (
+            self.llinterp_instrument_result)
+
+        if self.config.translation.resume_from:
+            self.resume_state(self.config.translation.resume_from)
 
     def setup_library(self, libdef, policy=None, extra={}, empty_translator=None):
         self.setup(None, None, policy, extra, empty_translator)
@@ -239,6 +246,22 @@ class TranslationDriver(SimpleTaskEngine):
             datafile.close()
             return counters
 
+    def llinterp_instrument_result(self):
+        # count the calls by running the program in the llinterpreter,
+        # with the same arguments as the 'llinterpret' goal
+        from pypy.rpython.llinterp import LLInterpreter
+        translator = self.translator
+        interp = LLInterpreter(translator.rtyper, tracing=False)
+        bk = translator.annotator.bookkeeper
+        graph = bk.getdesc(self.entry_point).getuniquegraph()
+        interp.eval_graph(graph, self.extra.get('get_llinterp_args',
+                                                lambda: [])())
+        counts = interp.instrument_counters
+        counters = [0] * (max(counts.keys() + [-1]) + 1)
+        for label, count in counts.items():
+            counters[label] = count
+        return counters
+
     def info(self, msg):
         log.info(msg)
 
@@ -251,6 +274,74 @@ class TranslationDriver(SimpleTaskEngine):
         KCacheGrind(prof).output(open(goal + ".out", "w"))
         return d['res']
 
+    # persistent state support
+    SAVED_STATE_GOALS = ['annotate', 'rtype', 'backendopt']
+
+    def _state_filename(self, goal):
+        statedir = self.config.translation.save_state
+        if statedir is None:
+            raise Exception("--resume-from requires --save-state=DIR")
+        return py.path.local(statedir).join(goal + '.state')
+
+    def _state_externals(self):
+        # the config of the current translation replaces the one that
+        # was saved, so that the remaining steps can use new options
+        externals = {'driver': self}
+        def add_config(config, path):
+            externals[path] = config
+            for name, value in config._cfgimpl_values.items():
+                if isinstance(value, Config):
+                    add_config(value, '%s.%s' % (path, name))
+        add_config(self.config, 'config')
+        return externals
+
+    def save_state(self, goal):
+        from pypy.translator.tool.statepickle import dump_state
+        filename = self._state_filename(goal)
+        filename.dirpath().ensure(dir=1)
+        state = {'done': self.done.keys(),
+                 'translator': self.translator,
+                 'entry_point': self.entry_point,
+                 'inputtypes': self.inputtypes,
+                 'standalone': self.standalone,
+                 'policy': self.policy,
+                 'libdef': self.libdef,
+                 }
+        self.log.info("saving translation state to %s" % (filename,))
+        dump_state(filename, state, self._state_externals())
+
+    def resume_state(self, goal):
+        from pypy.translator.tool.statepickle import load_state
+        goal, = self.backend_select_goals([goal])
+        filename = self._state_filename(goal)
+        self.log.info("resuming translation from %s" % (filename,))
+        state = load_state(filename, self._state_externals())
+        translator = state['translator']
+        translator.config = self.config
+        translator.create_flowspace_config()
+        self.translator = translator
+        self.entry_point = state['entry_point']
+        self.inputtypes = state['inputtypes']
+        self.standalone = state['standalone']
+        self.policy = state['policy']
+        self.libdef = state['libdef']
+        for done in state['done']:
+            self.done[done] = True
+        annotator = translator.annotator
+        changed = annotator.find_changed_graphs()
+        if changed:
+            if goal != 'annotate':
+                self.log.WARNING("%d functions changed since the state was "
+                                 "saved; they are not translated again"
+                                 % (len(changed),))
+            else:
+                self.log.info("%d functions changed, annotating them again"
+                              % (len(changed),))
+                annmodel.DEBUG = self.config.translation.debug
+                reflowed = annotator.reflow_changed_graphs(changed)
+                self.log.info("%d graphs reflowed" % (len(reflowed),))
+                self.sanity_check_annotation()
+
     def _do(self, goal, func, *args, **kwds):
         title = func.task_title
         if goal in self.done:
@@ -270,13 +361,31 @@ class TranslationDriver(SimpleTaskEngine):
                 instrument = True
             if not func.task_idempotent:
                 self.done[goal] = True
+            if self.config.translation.timing_report:
+                self.timer.add_stats(self.graph_statistics())
             if instrument:
                 self.proceed('compile')
                 assert False, 'we should not get here'
         finally:
             self.timer.end_event(goal)
+            if self.config.translation.timing_report:
+                self.timer.write_json(self.config.translation.timing_report)
+        if (self.config.translation.save_state and
+            goal in self.backend_select_goals(self.SAVED_STATE_GOALS)):
+            self.save_state(goal)
         return res
 
+    def graph_statistics(self):
+        graphs = blocks = operations = 0
+        for graph in self.translator.graphs:
+            if getattr(graph, 'startblock', None) is None:
+                continue    # released, see release_graphs()
+            graphs += 1
+            for block in graph.iterblocks():
+                blocks += 1
+                operations += len(block.operations)
+        return {'graphs': graphs, 'blocks': blocks, 'operations': operations}
+
     def task_annotate(self):
         # includes annotation and annotatation simplifications
         translator = self.translator
@@ -295,6 +404,7 @@ class TranslationDriver(SimpleTaskEngine):
                                 "int (and not, e.g., None or always raise an "
                                 "exception).")
             annotator.simplify()
+            self.report_annotation_profile()
             return s
         else:
             assert self.libdef is not None
@@ -302,10 +412,18 @@ class TranslationDriver(SimpleTaskEngine):
                 annotator.build_types(func, inputtypes)
             self.sanity_check_annotation()
             annotator.simplify()
+            self.report_annotation_profile()
     #
     task_annotate = taskdef(task_annotate, [], "Annotating&simplifying")
 
 
+    def report_annotation_profile(self):
+        profile = self.translator.annotator.profile
+        if profile is not None:
+            self.log.info("annotation profile:")
+            for line in profile.format_report():
+                self.log.info(line)
+
     def sanity_check_annotation(self):
         translator = self.translator
         irreg = query.qoutput(query.check_exceptblocks_qgen(translator))
@@ -352,12 +470,13 @@ class TranslationDriver(SimpleTaskEngine):
 
     def task_prehannotatebackendopt_lltype(self):
         from pypy.translator.backendopt.all import backend_optimizations
-        backend_optimizations(self.translator,
-                              inline_threshold=0,
-                              merge_if_blocks=True,
-                              constfold=True,
-                              raisingop2direct_call=False,
-                              remove_asserts=True)
+        stats = backend_optimizations(self.translator,
+                                      inline_threshold=0,
+                                      merge_if_blocks=True,
+                                      constfold=True,
+                                      raisingop2direct_call=False,
+                                      remove_asserts=True)
+        self.timer.add_stats(stats)
     #
     task_prehannotatebackendopt_lltype = taskdef(
         task_prehannotatebackendopt_lltype,
@@ -421,7 +540,8 @@ class TranslationDriver(SimpleTaskEngine):
 
     def task_backendopt_lltype(self):
         from pypy.translator.backendopt.all import backend_optimizations
-        backend_optimizations(self.translator)
+        stats = backend_optimizations(self.translator)
+        self.timer.add_stats(stats)
     #
     task_backendopt_lltype = taskdef(task_backendopt_lltype,
                                      [RTYPE,
@@ -431,7 +551,8 @@ class TranslationDriver(SimpleTaskEngine):
 
     def task_backendopt_ootype(self):
         from pypy.translator.backendopt.all import backend_optimizations
-        backend_optimizations(self.translator)
+        stats = backend_optimizations(self.translator)
+        self.timer.add_stats(stats)
     #
     task_backendopt_ootype = taskdef(task_backendopt_ootype, 
                                         [OOTYPE], "ootype back-end optimisations")
@@ -491,9 +612,21 @@ class TranslationDriver(SimpleTaskEngine):
         database = self.database
         c_source_filename = cbuilder.generate_source(database)
         self.log.info("written: %s" % (c_source_filename,))
+        if self.config.translation.release_graphs != 'keep':
+            self.release_graphs(database)
     #
     task_source_c = taskdef(task_source_c, ['database_c'], "Generating c source")
 
+    def release_graphs(self, database):
+        from pypy.translator.tool.graphswap import GraphSwap
+        filename = None
+        if self.config.translation.release_graphs == 'swap':
+            filename = self.cbuilder.targetdir.join('graphs.swap')
+        graphs = self.translator.graphs + database.all_graphs()
+        self.graphswap = GraphSwap(self.translator, filename)
+        count = self.graphswap.release(graphs)
+        self.log.info("released %d graphs" % (count,))
+
     def create_exe(self):
         if self.exe_name is not None:
             import shutil
@@ -540,6 +673,8 @@ class TranslationDriver(SimpleTaskEngine):
         py.log.setconsumer("llinterp operation", None)
         
         translator = self.translator
+        if self.graphswap is not None:
+            self.graphswap.restore_all()
         interp = LLInterpreter(translator.rtyper)
         bk = translator.annotator.bookkeeper
         graph = bk.getdesc(self.entry_point).getuniquegraph()
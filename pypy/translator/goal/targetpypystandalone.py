@@ -72,6 +72,8 @@ def create_entry_point(space, w_dict):
 
 def call_finish(space):
     space.finish()
+    from pypy.rlib import rgc
+    rgc.dump_alloc_sites()     # only if translated with --gc-alloc-sites
 
 def call_startup(space):
     space.startup()
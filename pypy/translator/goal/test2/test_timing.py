@@ -15,3 +15,37 @@ def test_timing():
     assert t.events == [('x', 1), ('y', 1), ('z', 1)]
     assert t.ttime() == 5
     
+
+def test_records_and_json():
+    from pypy.translator.goal.timing import to_json
+    from pypy.tool.udir import udir
+    cpu = [(0.5, 0.0), (2.0, 1.5), (2.0, 1.5), (2.25, 1.5)]
+    t = Timer(list(reversed([1, 4, 4, 5])).pop,
+              cputimer=list(reversed(cpu)).pop, rss=lambda: 1000)
+    t.start_event('annotate')
+    t.add_stats({'graphs': 3})
+    t.end_event('annotate')
+    t.start_event('source_c')
+    t.end_event('source_c')
+    assert t.records == [
+        {'event': 'annotate', 'wall_time': 3, 'cpu_time': 1.5,
+         'children_cpu_time': 1.5, 'peak_rss_kb': 1000, 'graphs': 3},
+        {'event': 'source_c', 'wall_time': 1, 'cpu_time': 0.25,
+         'children_cpu_time': 0.0, 'peak_rss_kb': 1000}]
+    filename = udir.join('test_timing.json')
+    t.write_json(filename)
+    assert filename.read() == (
+        '[\n'
+        '  {"children_cpu_time": 1.5, "cpu_time": 1.5, "event": "annotate", '
+        '"graphs": 3, "peak_rss_kb": 1000, "wall_time": 3},\n'
+        '  {"children_cpu_time": 0.0, "cpu_time": 0.25, "event": "source_c", '
+        '"peak_rss_kb": 1000, "wall_time": 1}\n'
+        ']\n')
+    assert to_json([None, True, 'a"\\\n']) == '[null, true, "a\\"\\\\\\u000a"]'
+
+def test_json_nonfinite_floats():
+    from pypy.translator.goal.timing import to_json
+    from pypy.rlib.rarithmetic import INFINITY, NAN
+    assert to_json(1.5) == '1.5'
+    assert to_json([INFINITY, -INFINITY, NAN]) == '[null, null, null]'
+    assert to_json({'cpu_time': NAN}) == '{"cpu_time": null}'
@@ -3,17 +3,42 @@
 times of certain driver parts
 """
 
-import time
+import time, os, sys
 import py
+try:
+    import resource
+except ImportError:
+    resource = None
 from pypy.tool.ansi_print import ansi_log
+from pypy.rlib.rarithmetic import isinf, isnan
 log = py.log.Producer("Timer")
 py.log.setconsumer("Timer", ansi_log)
 
+def cpu_times():
+    """Return the CPU time used by the process and by its finished
+    children (e.g. the C compiler)."""
+    user, system, children_user, children_system, _ = os.times()
+    return user + system, children_user + children_system
+
+def peak_rss():
+    """Return the peak resident set size of the process in KB, or None
+    if it is not available."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss //= 1024        # in bytes there
+    return maxrss or None
+
+
 class Timer(object):
-    def __init__(self, timer=time.time):
+    def __init__(self, timer=time.time, cputimer=cpu_times, rss=peak_rss):
         self.events = []
+        self.records = []     # one dict per event, see end_event()
         self.next_even = None
         self.timer = timer
+        self.cputimer = cputimer
+        self.rss = rss
         self.t0 = None
 
     def start_event(self, event):
@@ -22,14 +47,40 @@ class Timer(object):
             self.t0 = now
         self.next_event = event
         self.start_time = now
+        self.start_cpu = self.cputimer()
+        self.stats = {}
+
+    def add_stats(self, stats):
+        """Record more numbers about the current event."""
+        self.stats.update(stats)
 
     def end_event(self, event):
         assert self.next_event == event
         now = self.timer()
+        cpu, children_cpu = self.cputimer()
         self.events.append((event, now - self.start_time))
+        record = {'event': event,
+                  'wall_time': now - self.start_time,
+                  'cpu_time': cpu - self.start_cpu[0],
+                  'children_cpu_time': children_cpu - self.start_cpu[1],
+                  'peak_rss_kb': self.rss()}
+        record.update(self.stats)
+        self.records.append(record)
         self.next_event = None
         self.tk = now
 
+    def write_json(self, filename):
+        """Write the records of all the events so far to a file, as a
+        JSON list of objects."""
+        f = open(str(filename), 'w')
+        try:
+            f.write('[\n')
+            f.write(',\n'.join(['  ' + to_json(record)
+                                  for record in self.records]))
+            f.write('\n]\n')
+        finally:
+            f.close()
+
     def ttime(self):
         try:
             return self.tk - self.t0
@@ -51,3 +102,40 @@ class Timer(object):
         log.bold("=" * len(total))
         log.bold(total)
 
+
+def to_json(obj):
+    """Minimal JSON encoder for the records: dicts, lists, strings,
+    numbers, booleans and None.  JSON has no infinite or NaN numbers,
+    so these are written as null."""
+    if obj is None:
+        return 'null'
+    if obj is True:
+        return 'true'
+    if obj is False:
+        return 'false'
+    if isinstance(obj, (int, long)):
+        return str(obj)
+    if isinstance(obj, float):
+        if isinf(obj) or isnan(obj):
+            return 'null'
+        return repr(obj)
+    if isinstance(obj, str):
+        result = ['"']
+        for c in obj:
+            if c == '"' or c == '\\':
+                result.append('\\' + c)
+            elif ' ' <= c < '\x7f':
+                result.append(c)
+            else:
+                result.append('\\u%04x' % ord(c))
+        result.append('"')
+        return ''.join(result)
+    if isinstance(obj, (list, tuple)):
+        return '[%s]' % ', '.join([to_json(x) for x in obj])
+    if isinstance(obj, dict):
+        items = obj.items()
+        items.sort()
+        return '{%s}' % ', '.join(['%s: %s' % (to_json(str(key)),
+                                               to_json(value))
+                                   for key, value in items])
+    raise TypeError("cannot encode %r as JSON" % (obj,))
@@ -283,6 +283,10 @@ def main():
                                                        empty_translator=t,
                                                        disable=translateconfig.skipped_goals,
                                                        default_goal='compile')
+        if drv.translator is not t:
+            # the translator was reloaded by --resume-from
+            t = drv.translator
+            pdb_plus_show.translator = t
         log_config(translateconfig, "translate.py configuration")
         if translateconfig.goal_options.jit:
             if 'portal' not in targetspec_dic:
@@ -56,3 +56,50 @@ def test_ctr():
                 'run_c', 'prehannotatebackendopt', 'hintannotate', 'timeshift']
 
     assert set(td.exposed) == set(expected)
+
+def test_save_and_resume_state():
+    from pypy.tool.udir import udir
+    from pypy.translator.translator import graphof
+    from pypy.rpython.llinterp import LLInterpreter
+    statedir = udir.join('test_save_and_resume_state')
+
+    def g(n):
+        return n * 3
+    def f(n):
+        return g(n) + 1
+
+    td = TranslationDriver(setopts={'save_state': str(statedir)})
+    td.setup(f, [int])
+    td.rtype()
+    assert statedir.join('annotate.state').check()
+    assert statedir.join('rtype_lltype.state').check()
+
+    td = TranslationDriver(setopts={'save_state': str(statedir),
+                                    'resume_from': 'rtype'})
+    td.setup(f, [int])
+    assert 'annotate' in td.done and 'rtype_lltype' in td.done
+    assert td.entry_point is not f      # rebuilt from the saved state
+    td.backendopt()
+    graph = graphof(td.translator, td.entry_point)
+    interp = LLInterpreter(td.translator.rtyper)
+    assert interp.eval_graph(graph, [5]) == 16
+
+def test_graph_statistics_only_for_timing_report():
+    from pypy.tool.udir import udir
+    def task():
+        return 42
+    task.task_title = 'Test task'
+    task.task_idempotent = True
+
+    td = TranslationDriver()
+    calls = []
+    td.graph_statistics = lambda: calls.append(1) or {}
+    assert td._do('test', task) == 42
+    assert calls == []
+
+    report = udir.join('test_graph_statistics_report.json')
+    td = TranslationDriver(setopts={'timing_report': str(report)})
+    td.graph_statistics = lambda: calls.append(1) or {}
+    assert td._do('test', task) == 42
+    assert calls == [1]
+    assert report.check()
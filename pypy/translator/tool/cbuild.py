@@ -517,6 +517,8 @@ class CompilationError(Exception):
 
 class CCompiler:
     fix_gcc_random_seed = False
+    jobs = 1                   # number of compilers to run in parallel
+    use_object_cache = False   # see pypy.tool.gcc_cache.compile_object()
 
     def __init__(self, cfilenames, eci, outputfilename=None,
                  compiler_exe=None, profbased=None):
@@ -610,44 +612,84 @@ class CCompiler:
                 print >>sys.stderr, data
             raise
 
-    def _build(self):
+    def _new_compiler(self):
         from distutils.ccompiler import new_compiler
         compiler = new_compiler(force=1)
         if self.compiler_exe is not None:
             for c in '''compiler compiler_so compiler_cxx
                         linker_exe linker_so'''.split():
                 compiler.executables[c][0] = self.compiler_exe
+        return compiler
+
+    def _build(self):
+        compiler = self._new_compiler()
         compiler.spawn = log_spawned_cmd(compiler.spawn)
-        objects = []
-        for cfile in self.cfilenames:
-            cfile = py.path.local(cfile)
-            compile_extra = self.compile_extra[:]
-            # -frandom-seed is only to try to be as reproducable as possible
-            if self.fix_gcc_random_seed:
-                compile_extra.append('-frandom-seed=%s' % (cfile.basename,))
-                # XXX horrible workaround for a bug of profiling in gcc on
-                # OS X with functions containing a direct call to fork()
-                if '/*--no-profiling-for-this-file!--*/' in cfile.read():
-                    compile_extra = [arg for arg in compile_extra
-                                     if not arg.startswith('-fprofile-')]
-
-            old = cfile.dirpath().chdir()
-            try:
-                res = compiler.compile([cfile.basename],
-                                       include_dirs=self.eci.include_dirs,
-                                       extra_preargs=compile_extra)
-                assert len(res) == 1
-                cobjfile = py.path.local(res[0])
-                assert cobjfile.check()
-                objects.append(str(cobjfile))
-            finally:
-                old.chdir()
+        if ((self.jobs > 1 or self.use_object_cache) and
+            sys.platform != 'win32'):
+            objects = self._compile_objects_in_parallel(compiler)
+        else:
+            objects = []
+            for cfile in self.cfilenames:
+                cfile = py.path.local(cfile)
+                compile_extra = self._get_compile_extra(cfile)
+                old = cfile.dirpath().chdir()
+                try:
+                    res = compiler.compile([cfile.basename],
+                                           include_dirs=self.eci.include_dirs,
+                                           extra_preargs=compile_extra)
+                    assert len(res) == 1
+                    cobjfile = py.path.local(res[0])
+                    assert cobjfile.check()
+                    objects.append(str(cobjfile))
+                finally:
+                    old.chdir()
 
         compiler.link_executable(objects, str(self.outputfilename),
                                  libraries=self.eci.libraries,
                                  extra_preargs=self.link_extra,
                                  library_dirs=self.eci.library_dirs)
 
+    def _get_compile_extra(self, cfile):
+        compile_extra = self.compile_extra[:]
+        # -frandom-seed is only to try to be as reproducable as possible
+        if self.fix_gcc_random_seed:
+            compile_extra.append('-frandom-seed=%s' % (cfile.basename,))
+            # XXX horrible workaround for a bug of profiling in gcc on
+            # OS X with functions containing a direct call to fork()
+            if '/*--no-profiling-for-this-file!--*/' in cfile.read():
+                compile_extra = [arg for arg in compile_extra
+                                 if not arg.startswith('-fprofile-')]
+        return compile_extra
+
+    def _compile_objects_in_parallel(self, compiler):
+        # bypass distutils, which only knows how to compile one file
+        # after the other; we build the same command line as its
+        # UnixCCompiler does
+        from pypy.tool.gcc_cache import compile_objects
+        compiler_exe = compiler.executables['compiler_so'][0]
+        include_args = self._get_include_args()
+        units = []
+        for cfile in self.cfilenames:
+            cfile = py.path.local(cfile)
+            units.append((cfile, compiler_exe, self._get_compile_extra(cfile),
+                          include_args))
+        objects = compile_objects(units, jobs=self.jobs,
+                                  use_cache=self.use_object_cache)
+        return [str(ofile) for ofile in objects]
+
+    def _get_include_args(self):
+        return ['-I%s' % (dir,) for dir in self.eci.include_dirs]
+
+    def start_background_compiler(self):
+        """Return a BackgroundCompiler that puts in the object cache the
+        object files that build() will need, for the C files that are
+        given to it as soon as they are written."""
+        from pypy.tool.gcc_cache import BackgroundCompiler
+        assert not self.fix_gcc_random_seed and self.profbased is None
+        compiler_exe = self._new_compiler().executables['compiler_so'][0]
+        return BackgroundCompiler(compiler_exe, self.compile_extra[:],
+                                  self._get_include_args(), self.jobs)
+
 def build_executable(*args, **kwds):
     noerr = kwds.pop('noerr', False)
     compiler = CCompiler(*args, **kwds)
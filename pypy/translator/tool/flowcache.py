@@ -0,0 +1,359 @@
+"""
+On-disk cache of the simplified flow graphs of functions.
+
+The flow graph of a function depends on more than its bytecode: the flow
+object space looks up the globals and the built-ins, the attributes of
+constant classes and modules, the items of constant tuples and dicts...
+and folds all these lookups into Constants at flow time.  While building
+a graph to be cached, the flow space records all these constant-folded
+operations in its 'foldlog' (see FlowObjSpace.record_fold()).  The cache
+entry stores this log next to the pickled graph.
+
+The entry is found with a key made of the bytecode of the function (and
+of its nested code objects), its name, the options of the flow space and
+of simplify, and a hash of the sources of the flow object space and of
+the bytecode interpreter.  Before using the entry, the recorded
+operations are replayed on the objects of the current process, starting
+from the globals, the built-ins and the closure of the function.  The
+entry is only used if each of them gives the same result again: an equal
+value for numbers, strings and tuples of them, and an object of the same
+type and name for the rest.  The objects that the graph refers to are
+loaded as the results of these replayed operations, or as global names
+if the flow space itself introduced them.
+
+A graph that refers to any other kind of object (e.g. an instance built
+by a specialcase), or whose flowing used an operation that cannot be
+replayed, is not cached.
+"""
+
+import sys, os, types, marshal, cPickle
+from cStringIO import StringIO
+import py
+from pypy.tool.autopath import pypydir
+from pypy.tool.compat import md5
+from pypy.objspace.flow.model import Variable, Constant, SpaceOperation
+from pypy.objspace.flow.model import Block, Link, FunctionGraph
+from pypy.objspace.flow.flowcontext import SpamBlock, EggBlock
+from pypy.objspace.flow.operation import FunctionByName
+from pypy.translator.tool.statepickle import StatePickler, StateUnpickler
+from pypy.translator.tool.statepickle import _import_module
+
+MAGIC = 'pypy-flowgraph-cache-1\n'
+
+PRIMITIVE_TYPES = dict.fromkeys([int, long, float, complex, str, unicode,
+                                 bool, types.NoneType])
+
+SAVED_BY_VALUE = dict.fromkeys([Block, SpamBlock, EggBlock, Link,
+                                SpaceOperation, Variable, Constant,
+                                list, tuple, dict])
+SAVED_BY_VALUE.update(PRIMITIVE_TYPES)
+
+REPLAY = FunctionByName.copy()
+REPLAY.update({'is_true': bool,
+               'unpack':  tuple,
+               'import':  __import__,
+               'str':     str,
+               'repr':    repr,
+               })
+
+# the sources that the flow graphs depend on, apart from the function
+TOOLCHAIN_SOURCES = ['objspace/flow', 'interpreter', 'translator/simplify.py',
+                     'translator/tool/flowcache.py', 'rlib/unroll.py']
+
+
+class NotCacheable(Exception):
+    pass
+
+class InvalidEntry(Exception):
+    pass
+
+
+class FlowGraphCache(object):
+
+    def __init__(self, cachedir=None):
+        if cachedir is None:
+            cachedir = py.path.local(pypydir).join('_cache', 'flowgraph_cache')
+        self.cachedir = py.path.local(cachedir)
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.invalid = 0
+
+    def getkey(self, func, space, options):
+        class_ = getattr(func, 'class_', None)
+        if class_ is not None:
+            class_ = (class_.__module__, class_.__name__)
+        if func.func_closure is None:
+            nclosure = None
+        else:
+            nclosure = len(func.func_closure)
+        key = (toolchain_hash(),
+               func.__module__, func.func_name, class_,
+               marshal.dumps(func.func_code), nclosure,
+               space.do_imports_immediately,
+               space.config.translation.builtins_can_raise_exceptions,
+               space.config.objspace.honor__builtins__,
+               options)
+        return md5.md5(repr(key)).hexdigest()
+
+    def load(self, func, key):
+        """Return the cached graph for 'func', or None if there is none
+        or if it is no longer valid."""
+        path = self.cachedir.join(key)
+        try:
+            f = open(str(path), 'rb')
+        except IOError:
+            self.misses += 1
+            return None
+        try:
+            try:
+                if f.readline() != MAGIC:
+                    raise InvalidEntry
+                foldlog = cPickle.load(f)
+                objects = replay(func, foldlog)
+                graph = GraphUnpickler(f, objects).load()
+            finally:
+                f.close()
+        except Exception:
+            # InvalidEntry, or anything going wrong while replaying the
+            # operations or loading the graph: flow the function again
+            self.misses += 1
+            self.invalid += 1
+            return None
+        graph.func = func
+        graph.defaults = func.func_defaults or ()
+        fix_variables(graph)
+        self.hits += 1
+        return graph
+
+    def store(self, func, key, graph, foldlog):
+        """Save the graph of 'func', built while recording 'foldlog' in
+        the flow space.  Returns False if it cannot be cached."""
+        try:
+            table = {}
+            encodedlog = record(func, foldlog, table)
+            f = StringIO()
+            GraphPickler(f, table).dump(graph)
+            data = f.getvalue()
+        except NotCacheable:
+            return False
+        self.cachedir.ensure(dir=1)
+        # write the entry under a temporary name and rename it, so that
+        # concurrent translations never see a half-written entry
+        path = self.cachedir.join(key)
+        tmppath = self.cachedir.join('%s.%d' % (key, os.getpid()))
+        f = open(str(tmppath), 'wb')
+        try:
+            f.write(MAGIC)
+            cPickle.dump(encodedlog, f, 2)
+            f.write(data)
+        finally:
+            f.close()
+        os.rename(str(tmppath), str(path))
+        self.stored += 1
+        return True
+
+# ____________________________________________________________
+
+_toolchain_hash = None
+
+def toolchain_hash():
+    global _toolchain_hash
+    if _toolchain_hash is None:
+        root = py.path.local(pypydir)
+        files = []
+        for name in TOOLCHAIN_SOURCES:
+            path = root.join(name)
+            if path.check(dir=1):
+                files.extend(path.listdir('*.py'))
+            else:
+                files.append(path)
+        files.sort()
+        m = md5.md5()
+        for path in files:
+            m.update(path.relto(root))
+            m.update(path.read('rb'))
+        _toolchain_hash = m.hexdigest()
+    return _toolchain_hash
+
+NUM_GLOBAL_ROOTS = 3
+
+def roots_of(func):
+    import __builtin__
+    roots = [func.func_globals, __builtin__.__dict__, sys.__dict__]
+    if func.func_closure is not None:
+        from pypy.objspace.flow.objspace import extract_cell_content
+        for cell in func.func_closure:
+            roots.append(extract_cell_content(cell))
+    return roots
+
+def register(obj, table, objects):
+    # give the next numbers to 'obj' and to the items of the tuples.  The
+    # numbering only depends on the fingerprints, not on which objects
+    # happen to be identical in this process.
+    if type(obj) in PRIMITIVE_TYPES:
+        return
+    table.setdefault(id(obj), (obj, len(objects)))
+    objects.append(obj)
+    if type(obj) is tuple:
+        for item in obj:
+            register(item, table, objects)
+
+def fingerprint(obj):
+    T = type(obj)
+    if T in PRIMITIVE_TYPES:
+        return T.__name__, repr(obj)
+    if T is tuple:
+        return 'tuple', tuple([fingerprint(item) for item in obj])
+    modname = getattr(obj, '__module__', None)
+    name = getattr(obj, '__name__', None)
+    if not isinstance(modname, str):
+        modname = None
+    if not isinstance(name, str):
+        name = None
+    return 'object', T.__module__, T.__name__, modname, name
+
+def encode(obj, table):
+    try:
+        return 'obj', table[id(obj)][1]
+    except KeyError:
+        pass
+    T = type(obj)
+    if T in PRIMITIVE_TYPES:
+        return 'value', obj
+    if T is tuple:
+        return 'tuple', tuple([encode(item, table) for item in obj])
+    raise NotCacheable(obj)
+
+def decode(data, objects):
+    kind, value = data
+    if kind == 'obj':
+        return objects[value]
+    elif kind == 'value':
+        return value
+    else:
+        return tuple([decode(item, objects) for item in value])
+
+def record(func, foldlog, table):
+    """Encode the foldlog of the flow space, with the arguments of the
+    operations as references to the roots or to previous results."""
+    objects = []
+    roots = roots_of(func)
+    for root in roots:
+        register(root, table, objects)
+    # the flow space reads the closure directly
+    result = [fingerprint(value) for value in roots[NUM_GLOBAL_ROOTS:]]
+    for opname, args, ok, value in foldlog:
+        if opname not in REPLAY:
+            raise NotCacheable(opname)
+        args = tuple([encode(arg, table) for arg in args])
+        if ok:
+            result.append((opname, args, True, fingerprint(value)))
+            register(value, table, objects)
+        else:
+            result.append((opname, args, False, value.__name__))
+    return result
+
+def replay(func, encodedlog):
+    """Redo the operations of the log.  Returns the list of objects,
+    numbered as in record(), or raises InvalidEntry."""
+    table = {}
+    objects = []
+    roots = roots_of(func)
+    for root in roots:
+        register(root, table, objects)
+    closure = roots[NUM_GLOBAL_ROOTS:]
+    for i in range(len(closure)):
+        if fingerprint(closure[i]) != encodedlog[i]:
+            raise InvalidEntry
+    for opname, args, ok, expected in encodedlog[len(closure):]:
+        args = [decode(arg, objects) for arg in args]
+        try:
+            value = REPLAY[opname](*args)
+        except Exception, e:
+            if ok or e.__class__.__name__ != expected:
+                raise InvalidEntry
+        else:
+            if not ok or fingerprint(value) != expected:
+                raise InvalidEntry
+            register(value, table, objects)
+    return objects
+
+
+class GraphPickler(StatePickler):
+    """Saves the graph objects by value, the objects found by the
+    recorded operations as their number, and the global names that the
+    flow space introduced by name.  Raises NotCacheable for anything
+    else."""
+
+    def __init__(self, file, table):
+        StatePickler.__init__(self, file, registry={})
+        self.table = table
+
+    def dump(self, graph):
+        state = graph.__dict__.copy()
+        del state['func']
+        del state['defaults']
+        StatePickler.dump(self, (graph.startblock, graph.returnblock,
+                                 graph.exceptblock, state))
+
+    def persistent_id(self, obj):
+        try:
+            return 'obj', self.table[id(obj)][1]
+        except KeyError:
+            pass
+        if type(obj) in SAVED_BY_VALUE:
+            return None
+        if isinstance(obj, types.ModuleType):
+            if sys.modules.get(obj.__name__) is obj:
+                return 'module', obj.__name__
+        else:
+            modname = getattr(obj, '__module__', None)
+            name = getattr(obj, '__name__', None)
+            if (isinstance(modname, str) and isinstance(name, str) and
+                getattr(sys.modules.get(modname), name, None) is obj):
+                return 'global', modname, name
+        raise NotCacheable(obj)
+
+
+class GraphUnpickler(StateUnpickler):
+
+    def __init__(self, file, objects):
+        StateUnpickler.__init__(self, file)
+        self.objects = objects
+
+    def persistent_load(self, pid):
+        if pid[0] == 'obj':
+            return self.objects[pid[1]]
+        elif pid[0] == 'module':
+            return _import_module(pid[1])
+        else:
+            return getattr(_import_module(pid[1]), pid[2])
+
+    def load(self):
+        startblock, returnblock, exceptblock, state = StateUnpickler.load(self)
+        graph = FunctionGraph.__new__(FunctionGraph)
+        graph.startblock = startblock
+        graph.returnblock = returnblock
+        graph.exceptblock = exceptblock
+        graph.__dict__.update(state)
+        return graph
+
+
+def fix_variables(graph):
+    # the Variables get their number from this process' counter, and
+    # the strings that are normally interned are interned again
+    namesdict = Variable.namesdict
+    blocks = list(graph.iterblocks())
+    for block in [graph.returnblock, graph.exceptblock]:
+        if block not in blocks:
+            blocks.append(block)
+    for block in blocks:
+        variables = block.getvariables()
+        for link in block.exits:
+            variables.extend(link.getextravars())
+        for v in variables:
+            v._name = namesdict.setdefault(v._name, (v._name, 0))[0]
+            v._nr = -1
+        for op in block.operations:
+            op.opname = intern(op.opname)
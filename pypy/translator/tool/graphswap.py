@@ -0,0 +1,163 @@
+"""
+Release the flow graphs once the backend does not need them any more.
+
+After the C source is written, the blocks, links, operations and
+variables of the graphs are only kept alive by the translator, the
+annotator's and rtyper's tables and the function nodes of the database,
+but for a whole-program translation they are a large part of the memory
+of the process.  A GraphSwap detaches the body of the graphs (their
+start, return and except blocks) and forgets them in these tables, so
+that they can be freed before compiling.  The FunctionGraph objects
+themselves stay, with their name and other attributes, because
+function pointers and database nodes refer to them.
+
+Optionally the bodies are first written to a swap file, from which
+restore() puts them back, e.g. to run the llinterpreter afterwards.
+Only the flow graph objects are written to the file; everything else
+they refer to (the values of the constants, the low-level types...) is
+kept in memory and written as a reference.  The annotator's and
+rtyper's tables are not restored.
+"""
+
+import types
+from cStringIO import StringIO
+from pypy.objspace.flow.model import Variable, Constant, SpaceOperation
+from pypy.objspace.flow.model import Block, Link
+from pypy.translator.tool.statepickle import StatePickler, StateUnpickler
+
+BODY = ['startblock', 'returnblock', 'exceptblock']
+
+SAVED_BY_VALUE = dict.fromkeys([Block, Link, SpaceOperation, Variable,
+                                Constant, list, tuple, dict, str, unicode,
+                                int, long, float, bool, types.NoneType])
+
+
+class GraphSwap(object):
+
+    def __init__(self, translator, filename=None):
+        self.translator = translator
+        self.filename = filename
+        self.released = {}    # {graph: (offset, size) in the file, or None}
+        self.refs = {}        # {id: object saved by reference}
+        self.size = 0
+
+    def release(self, graphs):
+        """Detach the body of the given graphs.  Returns the number of
+        graphs released."""
+        seen = {}
+        lst = []
+        for graph in graphs:
+            if (graph not in seen and graph not in self.released and
+                getattr(graph, 'startblock', None) is not None):
+                seen[graph] = True
+                lst.append(graph)
+        graphs = lst
+        f = None
+        if self.filename is not None:
+            if self.size == 0:
+                f = open(str(self.filename), 'wb')
+            else:
+                f = open(str(self.filename), 'ab')
+        try:
+            blocks = {}
+            for graph in graphs:
+                for block in graph.iterblocks():
+                    blocks[block] = True
+                if f is not None:
+                    data = self.dump_body(graph)
+                    f.write(data)
+                    self.released[graph] = self.size, len(data)
+                    self.size += len(data)
+                else:
+                    self.released[graph] = None
+        finally:
+            if f is not None:
+                f.close()
+        self.forget(blocks)
+        for graph in graphs:
+            for name in BODY:
+                delattr(graph, name)
+        return len(graphs)
+
+    def dump_body(self, graph):
+        f = StringIO()
+        pickler = SwapPickler(f, self.refs)
+        pickler.dump([getattr(graph, name) for name in BODY])
+        return f.getvalue()
+
+    def forget(self, blocks):
+        """Remove the blocks and what they contain from the tables of the
+        annotator and the rtyper."""
+        annotator = self.translator.annotator
+        rtyper = self.translator.rtyper
+        tables = []
+        if annotator is not None:
+            tables += [annotator.annotated, annotator.notify,
+                       annotator.blocked_blocks, annotator.dead_blocks]
+        if rtyper is not None:
+            tables.append(rtyper.already_seen)
+        for block in blocks:
+            for table in tables:
+                table.pop(block, None)
+            if annotator is not None:
+                bindings = annotator.bindings
+                for v in block.getvariables():
+                    bindings.pop(v, None)
+                for link in block.exits:
+                    annotator.links_followed.pop(link, None)
+                    for v in link.getextravars():
+                        bindings.pop(v, None)
+
+    def restore(self, graph):
+        """Put back the body of a released graph."""
+        try:
+            position = self.released[graph]
+        except KeyError:
+            return     # not released
+        if position is None:
+            raise ValueError("%s was released without being saved" % (graph,))
+        offset, size = position
+        f = open(str(self.filename), 'rb')
+        try:
+            f.seek(offset)
+            data = f.read(size)
+        finally:
+            f.close()
+        body = StateUnpickler(StringIO(data), self.refs).load()
+        for name, block in zip(BODY, body):
+            setattr(graph, name, block)
+        fix_names(graph)
+        del self.released[graph]
+
+    def restore_all(self):
+        for graph in self.released.keys():
+            self.restore(graph)
+
+
+class SwapPickler(StatePickler):
+    """Saves the flow graph objects by value and everything else as a
+    reference to an object kept in memory."""
+
+    def __init__(self, file, refs):
+        StatePickler.__init__(self, file, registry={})
+        self.refs = refs
+
+    def persistent_id(self, obj):
+        if type(obj) in SAVED_BY_VALUE:
+            return None
+        key = id(obj)
+        self.refs[key] = obj
+        return key
+
+
+def fix_names(graph):
+    # the strings that are normally interned are interned again
+    namesdict = Variable.namesdict
+    for block in graph.iterblocks():
+        variables = block.getvariables()
+        for link in block.exits:
+            variables.extend(link.getextravars())
+        for v in variables:
+            v._name = namesdict.setdefault(v._name, (v._name, 0))[0]
+        for op in block.operations:
+            op.opname = intern(op.opname)
@@ -0,0 +1,419 @@
+"""
+Pickling of the whole translation state (flow graphs, annotator,
+rtyper...) to a file, so that a later translate.py can resume from it.
+
+The standard pickle module is not enough for this: the state contains
+nested functions, dynamically created classes and objects whose hash
+depends on their content (lltype types).  The rules are:
+
+  * objects that are reachable as global names of a module (including
+    the functions and classes defined in the body of module-level
+    classes) are saved by reference, so that the resumed process shares
+    them with the modules it imported;
+
+  * other functions and classes are rebuilt from their code and their
+    contents;
+
+  * the state of instances is only saved after all the objects found so
+    far have been created, from a worklist.  This keeps the recursion
+    depth small even for the very long chains of blocks and links that
+    make up the flow graphs;
+
+  * dicts and sets whose keys do not hash by identity are only filled
+    at the very end of loading, once the state of all keys is restored.
+
+'externals' is a dict {name: object} of objects that are not saved at
+all, but replaced by the object of the same name at load time (e.g. the
+config of the new translation).
+"""
+
+import sys, types, marshal, weakref, pickle
+from pickle import MARK, OBJ, EMPTY_DICT, BUILD, REDUCE, POP, STOP, PROTO
+
+PROTOCOL = 2
+MAGIC = 'pypy-translation-state-1\n'
+
+_IMMUTABLE_TYPES = dict.fromkeys([int, long, float, complex, str, unicode,
+                                  bool, types.NoneType, tuple])
+
+def _hash_is_stable(key):
+    """Can 'key' be hashed before its state has been restored?"""
+    T = type(key)
+    if T is tuple:
+        for item in key:
+            if not _hash_is_stable(item):
+                return False
+        return True
+    if T in _IMMUTABLE_TYPES:
+        return True
+    if isinstance(key, (type, types.ClassType, types.FunctionType,
+                        types.ModuleType)):
+        return True
+    if T is types.InstanceType:
+        return not hasattr(key, '__hash__')
+    return getattr(T, '__hash__', None) is object.__hash__
+
+# ____________________________________________________________
+# helpers called at load time
+
+def _import_module(modname):
+    __import__(modname)
+    return sys.modules[modname]
+
+def _class_dict_item(cls, name):
+    # the raw function behind a method, staticmethod or classmethod
+    value = cls.__dict__[name]
+    if isinstance(value, (staticmethod, classmethod)):
+        value = value.__get__(None, cls)
+        value = getattr(value, 'im_func', value)
+    return value
+
+def _rebuild_class(metaclass, name, bases, dict):
+    # don't call metaclass.__init__(), which might register the class
+    # somewhere a second time
+    return type.__new__(metaclass, name, bases, dict)
+
+def _make_cell():
+    x = None
+    def f():
+        return x
+    return f.func_closure[0]
+
+def _fill_cell(cell, value):
+    import ctypes
+    PyCell_Set = ctypes.pythonapi.PyCell_Set
+    PyCell_Set.argtypes = [ctypes.py_object, ctypes.py_object]
+    PyCell_Set(cell, value)
+
+def _fill_dict(d, items):
+    for key, value in items:
+        d[key] = value
+
+def _fill_set(s, items):
+    s.update(items)
+
+class _Dead(object):
+    pass
+
+def _dead_weakref():
+    return weakref.ref(_Dead())
+
+def _is_global_name(obj):
+    # can the standard pickle save 'obj' as a global?
+    if not isinstance(obj, (types.FunctionType, types.BuiltinFunctionType,
+                            type, types.ClassType)):
+        return False
+    module = sys.modules.get(getattr(obj, '__module__', None))
+    return getattr(module, obj.__name__, None) is obj
+
+# ____________________________________________________________
+
+def registry_of_globals():
+    """Map the id of every object reachable as a global name to a way
+    to find the same object again: (obj, module_name, attribute_path).
+    """
+    registry = {}
+    classes = []
+    for modname, module in sys.modules.items():
+        if module is None or modname == '__main__':
+            continue
+        registry[id(module)] = (module, modname, ())
+        registry[id(module.__dict__)] = (module.__dict__, modname,
+                                         ('__dict__',))
+        for name, value in module.__dict__.items():
+            if type(value) in _IMMUTABLE_TYPES or id(value) in registry:
+                continue
+            registry[id(value)] = (value, modname, (name,))
+            if isinstance(value, (type, types.ClassType)):
+                classes.append((value, modname, (name,)))
+    while classes:
+        cls, modname, path = classes.pop()
+        for name, value in cls.__dict__.items():
+            if isinstance(value, (staticmethod, classmethod)):
+                value = _class_dict_item(cls, name)
+            if not isinstance(value, (types.FunctionType, type,
+                                      types.ClassType)):
+                continue
+            if id(value) in registry:
+                continue
+            registry[id(value)] = (value, modname, path + (name,))
+            if not isinstance(value, types.FunctionType):
+                classes.append((value, modname, path + (name,)))
+    return registry
+
+
+class StatePickler(pickle.Pickler):
+    dispatch = pickle.Pickler.dispatch.copy()
+
+    def __init__(self, file, externals={}, registry=None):
+        pickle.Pickler.__init__(self, file, PROTOCOL)
+        self.externals = {}
+        for name, obj in externals.items():
+            self.externals[id(obj)] = name
+        if registry is None:
+            registry = registry_of_globals()
+        self.registry = registry
+        self._pending = []        # [(obj, state, filler)]
+        self._pending_fills = []  # [(filler, container, items)]
+        self._final_fills = []
+
+    def persistent_id(self, obj):
+        return self.externals.get(id(obj))
+
+    def dump(self, obj):
+        self.write(PROTO + chr(self.proto))
+        self.save(obj)
+        self.flush_pending()
+        self.write(STOP)
+
+    def save(self, obj):
+        if id(obj) in self.registry and id(obj) not in self.memo:
+            if _is_global_name(obj):
+                pickle.Pickler.save_global(self, obj)
+            else:
+                self.save_by_reference(obj)
+        else:
+            pickle.Pickler.save(self, obj)
+
+    def save_by_reference(self, obj):
+        _, modname, path = self.registry[id(obj)]
+        if not path:
+            self.save_reduce(_import_module, (modname,), obj=obj)
+            return
+        parent = sys.modules[modname]
+        for name in path[:-1]:
+            parent = getattr(parent, name)
+        if isinstance(parent, types.ModuleType):
+            self.save_reduce(getattr, (parent, path[-1]), obj=obj)
+        else:
+            self.save_reduce(_class_dict_item, (parent, path[-1]), obj=obj)
+
+    def save_reduce(self, func, args, state=None, listitems=None,
+                    dictitems=None, obj=None):
+        # like the base version, but the state is saved later, and
+        # recursive reduce() arguments are supported
+        if self.proto >= 2 and getattr(func, "__name__", "") == "__newobj__":
+            cls = args[0]
+            self.save(cls)
+            self.save(args[1:])
+            self.write(pickle.NEWOBJ)
+        else:
+            self.save(func)
+            self.save(args)
+            self.write(REDUCE)
+        if obj is not None:
+            if id(obj) in self.memo:
+                # already built while saving 'args': use that one
+                self.write(POP + self.get(self.memo[id(obj)][0]))
+            else:
+                self.memoize(obj)
+        if listitems is not None:
+            self._batch_appends(listitems)
+        if dictitems is not None:
+            self._batch_setitems(dictitems)
+        if state is not None:
+            if obj is None:
+                self.save(state)
+                self.write(BUILD)
+            else:
+                self._pending.append((obj, state, None))
+
+    def flush_pending(self):
+        # first restore the state of all the objects created so far;
+        # then save the items of the dicts and sets that are not filled
+        # yet, which may create more objects; only when no state is
+        # missing any more, fill these dicts and sets.
+        while True:
+            if self._pending:
+                obj, state, filler = self._pending.pop()
+                if filler is None:
+                    self.save(obj)
+                    self.save(state)
+                    self.write(BUILD)
+                else:
+                    self.save(filler)
+                    self.save((obj, state))
+                    self.write(REDUCE)
+                self.write(POP)
+            elif self._pending_fills:
+                fill = self._pending_fills.pop()
+                self.save(fill[2])
+                self.write(POP)
+                self._final_fills.append(fill)
+            elif self._final_fills:
+                for filler, container, items in self._final_fills:
+                    self.save(filler)
+                    self.save((container, items))
+                    self.write(REDUCE)
+                    self.write(POP)
+                self._final_fills = []
+            else:
+                break
+
+    def save_dict(self, obj):
+        for key in obj:
+            if not _hash_is_stable(key):
+                break
+        else:
+            pickle.Pickler.save_dict(self, obj)
+            return
+        self.write(EMPTY_DICT)
+        self.memoize(obj)
+        self._pending_fills.append((_fill_dict, obj, obj.items()))
+    dispatch[dict] = save_dict
+
+    def save_set(self, obj):
+        for key in obj:
+            if not _hash_is_stable(key):
+                break
+        else:
+            self.save_reduce(set, (list(obj),), obj=obj)
+            return
+        self.save_reduce(set, (), obj=obj)
+        self._pending_fills.append((_fill_set, obj, list(obj)))
+    dispatch[set] = save_set
+
+    def save_inst(self, obj):
+        # old-style instances
+        if hasattr(obj, '__getinitargs__'):
+            pickle.Pickler.save_inst(self, obj)
+            return
+        self.write(MARK)
+        self.save(obj.__class__)
+        self.write(OBJ)
+        self.memoize(obj)
+        if hasattr(obj, '__getstate__'):
+            state = obj.__getstate__()
+        else:
+            state = obj.__dict__
+        self._pending.append((obj, state, None))
+    dispatch[types.InstanceType] = save_inst
+
+    def save_function(self, obj):
+        # the globals of functions defined in modules are found in the
+        # registry as the __dict__ of their module
+        args = (obj.func_code, obj.func_globals, obj.func_name,
+                obj.func_defaults, obj.func_closure)
+        state = obj.func_dict or None
+        self.save_reduce(types.FunctionType, args, state, obj=obj)
+    dispatch[types.FunctionType] = save_function
+
+    def save_cell(self, obj):
+        # a cell can be part of a cycle (e.g. a recursive nested function)
+        # so its content is only set later
+        self.save_reduce(_make_cell, (), obj=obj)
+        self._pending.append((obj, obj.cell_contents, _fill_cell))
+    dispatch[type(_make_cell())] = save_cell
+
+    def save_code(self, obj):
+        self.save_reduce(marshal.loads, (marshal.dumps(obj),), obj=obj)
+    dispatch[types.CodeType] = save_code
+
+    def save_module(self, obj):
+        self.save_reduce(_import_module, (obj.__name__,), obj=obj)
+    dispatch[types.ModuleType] = save_module
+
+    def save_method(self, obj):
+        self.save_reduce(types.MethodType, (obj.im_func, obj.im_self,
+                                            obj.im_class), obj=obj)
+    dispatch[types.MethodType] = save_method
+
+    def save_builtin_method(self, obj):
+        if obj.__self__ is None or isinstance(obj.__self__, types.ModuleType):
+            self.save_global(obj)
+        else:
+            self.save_reduce(getattr, (obj.__self__, obj.__name__), obj=obj)
+    dispatch[types.BuiltinMethodType] = save_builtin_method
+
+    def save_descriptor(self, obj):
+        self.save_reduce(_class_dict_item, (obj.__objclass__, obj.__name__),
+                         obj=obj)
+    dispatch[type(str.join)] = save_descriptor
+    dispatch[type(object.__init__)] = save_descriptor
+
+    def save_staticmethod(self, obj):
+        self.save_reduce(staticmethod, (obj.__get__(None, object),), obj=obj)
+    dispatch[staticmethod] = save_staticmethod
+
+    def save_classmethod(self, obj):
+        self.save_reduce(classmethod, (obj.__get__(None, object).im_func,),
+                         obj=obj)
+    dispatch[classmethod] = save_classmethod
+
+    def save_property(self, obj):
+        self.save_reduce(property, (obj.fget, obj.fset, obj.fdel,
+                                    obj.__doc__), obj=obj)
+    dispatch[property] = save_property
+
+    def save_weakref(self, obj):
+        target = obj()
+        if target is None:
+            self.save_reduce(_dead_weakref, (), obj=obj)
+        else:
+            self.save_reduce(weakref.ref, (target,), obj=obj)
+    dispatch[weakref.ref] = save_weakref
+
+    def save_weakdict(self, obj):
+        # weak dictionaries are only used as caches: start with an empty one
+        self.save_reduce(type(obj), (), obj=obj)
+    dispatch[weakref.WeakKeyDictionary] = save_weakdict
+    dispatch[weakref.WeakValueDictionary] = save_weakdict
+
+    def save_global(self, obj, name=None):
+        try:
+            pickle.Pickler.save_global(self, obj, name)
+        except pickle.PicklingError:
+            if not isinstance(obj, (type, types.ClassType)):
+                raise
+            self.save_dynamic_class(obj)
+    dispatch[types.ClassType] = save_global
+    dispatch[type] = save_global
+
+    def save_dynamic_class(self, cls):
+        from pypy.rpython.lltypesystem import lltype
+        if (isinstance(cls, type) and issubclass(cls, lltype._struct)
+            and cls is not lltype._struct):
+            # one of the cached varieties of _struct
+            self.save_reduce(lltype._struct_variety, (cls.__slots__,),
+                             obj=cls)
+            return
+        dict = cls.__dict__.copy()
+        dict.pop('__dict__', None)
+        dict.pop('__weakref__', None)
+        if isinstance(cls, type):
+            for name in getattr(cls, '__slots__', ()):
+                dict.pop(name, None)    # the member descriptors
+            self.save_reduce(_rebuild_class, (type(cls), cls.__name__,
+                                              cls.__bases__, dict), obj=cls)
+        else:
+            self.save_reduce(types.ClassType, (cls.__name__, cls.__bases__,
+                                               dict), obj=cls)
+
+
+class StateUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, externals={}):
+        pickle.Unpickler.__init__(self, file)
+        self.externals = externals
+
+    def persistent_load(self, name):
+        return self.externals[name]
+
+# ____________________________________________________________
+
+def dump_state(filename, state, externals={}):
+    f = open(str(filename), 'wb')
+    try:
+        f.write(MAGIC)
+        StatePickler(f, externals).dump(state)
+    finally:
+        f.close()
+
+def load_state(filename, externals={}):
+    f = open(str(filename), 'rb')
+    try:
+        if f.readline() != MAGIC:
+            raise ValueError("%s: not a saved translation state" % (filename,))
+        return StateUnpickler(f, externals).load()
+    finally:
+        f.close()
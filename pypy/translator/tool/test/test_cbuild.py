@@ -21,6 +21,28 @@ def test_simple_executable():
     out = py.process.cmdexec(testexec)
     assert out.startswith('hello world')
 
+def test_parallel_executable():
+    if sys.platform == 'win32':
+        py.test.skip("no parallel compilation on win32")
+    from pypy.translator.tool.cbuild import CCompiler
+    testpath = udir.join('testbuildparallel').ensure(dir=1)
+    t1 = testpath.join("main.c")
+    t1.write(r"""
+        #include <stdio.h>
+        int seven(void);
+        int main() {
+            printf("%d\n", seven());
+            return 0;
+        }
+""")
+    t2 = testpath.join("seven.c")
+    t2.write("int seven(void) { return 7; }\n")
+    compiler = CCompiler([t1, t2], ExternalCompilationInfo())
+    compiler.jobs = 2
+    compiler.build()
+    out = py.process.cmdexec(str(compiler.outputfilename))
+    assert out.startswith('7')
+
 class TestEci:
     def setup_class(cls):
         tmpdir = udir.ensure('testeci', dir=1)
@@ -0,0 +1,79 @@
+import py
+from pypy.objspace.flow.model import summary
+from pypy.translator.tool.flowcache import FlowGraphCache, record, replay
+from pypy.translator.tool.flowcache import InvalidEntry
+from pypy.translator.translator import TranslationContext
+from pypy.tool.udir import udir
+
+
+class Base:
+    pass
+
+FACTOR = 3
+MODES = (Base, 'a', 5)
+
+def f(x):
+    return x * FACTOR + len(MODES)
+
+def g(x):
+    if MODES[2] > 4:
+        return Base()
+    return x
+
+
+def test_record_and_replay():
+    log = [('getitem', (f.func_globals, 'FACTOR'), True, 3),
+           ('getitem', (f.func_globals, 'MODES'), True, MODES),
+           ('getitem', (MODES, 9), False, IndexError),
+           ('len', (MODES,), True, 3)]
+    table = {}
+    encoded = record(f, log, table)
+    objects = replay(f, encoded)
+    assert objects[table[id(MODES)][1]] is MODES
+    assert objects[table[id(Base)][1]] is Base
+    # a different result makes the entry invalid
+    log[0] = ('getitem', (f.func_globals, 'FACTOR'), True, 4)
+    encoded = record(f, log, {})
+    py.test.raises(InvalidEntry, replay, f, encoded)
+
+def test_closure_is_checked():
+    def make(n):
+        def h():
+            return n
+        return h
+    encoded = record(make(5), [], {})
+    replay(make(5), encoded)
+    py.test.raises(InvalidEntry, replay, make(6), encoded)
+
+def test_cached_graph():
+    cachedir = udir.join('test_cached_graph').ensure(dir=1)
+    t = TranslationContext()
+    t.config.translation.flowgraph_cache = True
+    t.flowgraph_cache = cache = FlowGraphCache(cachedir)
+    graph1 = t.buildflowgraph(g)
+    assert cache.stored == 1
+
+    t = TranslationContext()
+    t.config.translation.flowgraph_cache = True
+    t.flowgraph_cache = cache = FlowGraphCache(cachedir)
+    graph2 = t.buildflowgraph(g)
+    assert cache.hits == 1
+    assert graph2.func is g
+    assert summary(graph2) == summary(graph1)
+    [op] = graph2.startblock.operations
+    assert op.opname == 'simple_call'
+    assert op.args[0].value is Base
+
+    global MODES
+    saved = MODES
+    MODES = (Base, 'a', 3)
+    try:
+        t = TranslationContext()
+        t.config.translation.flowgraph_cache = True
+        t.flowgraph_cache = cache = FlowGraphCache(cachedir)
+        graph3 = t.buildflowgraph(g)
+        assert cache.invalid == 1
+        assert cache.stored == 1
+        assert 'simple_call' not in summary(graph3)
+    finally:
+        MODES = saved
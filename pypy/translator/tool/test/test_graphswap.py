@@ -0,0 +1,50 @@
+import py
+from pypy.objspace.flow.model import copygraph, checkgraph, summary
+from pypy.objspace.flow.model import Constant
+from pypy.objspace.flow.test.test_model import graph as sample_graph
+from pypy.translator.tool.graphswap import GraphSwap
+from pypy.translator.translator import TranslationContext
+from pypy.annotation import model as annmodel
+from pypy.tool.udir import udir
+
+
+def make_graph():
+    graph = copygraph(sample_graph)
+    graph.func = sample_graph.func
+    return graph
+
+def test_swap_and_restore():
+    t = TranslationContext()
+    graph1 = make_graph()
+    graph2 = make_graph()
+    marker = object()
+    graph2.startblock.exits[0].args[1] = Constant(marker)
+    expected = summary(graph1)
+    swap = GraphSwap(t, udir.join('test_swap_and_restore.swap'))
+    assert swap.release([graph1, graph2, graph1]) == 2
+    assert swap.release([graph1]) == 0
+    py.test.raises(AttributeError, "graph1.startblock")
+    assert graph1.name == 'f'
+    swap.restore(graph2)
+    checkgraph(graph2)
+    assert graph2.startblock.exits[0].args[1].value is marker
+    swap.restore_all()
+    checkgraph(graph1)
+    assert summary(graph1) == expected
+    assert swap.released == {}
+    for block in graph1.iterblocks():
+        for op in block.operations:
+            assert op.opname is intern(op.opname)
+
+def test_drop_forgets_annotations():
+    t = TranslationContext()
+    annotator = t.buildannotator()
+    graph = make_graph()
+    v = graph.getargs()[0]
+    annotator.bindings[v] = annmodel.SomeInteger()
+    annotator.annotated[graph.startblock] = graph
+    swap = GraphSwap(t)
+    swap.release([graph])
+    assert v not in annotator.bindings
+    assert annotator.annotated == {}
+    py.test.raises(ValueError, swap.restore, graph)
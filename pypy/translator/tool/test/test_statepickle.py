@@ -0,0 +1,159 @@
+import py
+from cStringIO import StringIO
+from pypy.translator.tool.statepickle import StatePickler, StateUnpickler
+from pypy.translator.tool.statepickle import dump_state, load_state
+from pypy.rpython.lltypesystem import lltype
+from pypy.tool.udir import udir
+
+
+def roundtrip(obj, externals={}):
+    f = StringIO()
+    StatePickler(f, externals).dump(obj)
+    f.seek(0)
+    return StateUnpickler(f, externals).load()
+
+def global_function(x):
+    return x + 1
+
+class GlobalClass(object):
+    def method(self):
+        return 42
+    def smethod(x):
+        return x * 2
+    smethod = staticmethod(smethod)
+
+class OldStyle:
+    pass
+
+def make_closure(n):
+    def f(x):
+        return x + n
+    return f
+
+def make_recursive():
+    def fact(n):
+        if n <= 1:
+            return 1
+        return n * fact(n - 1)
+    return fact
+
+def make_class(name):
+    class Dynamic(object):
+        def get(self):
+            return self.value
+    Dynamic.__name__ = name
+    return Dynamic
+
+# ____________________________________________________________
+
+def test_globals_by_reference():
+    obj = [global_function, GlobalClass, GlobalClass.__dict__['method'],
+           GlobalClass.smethod, lltype.Signed, lltype]
+    res = roundtrip(obj)
+    for x, y in zip(obj, res):
+        assert x is y
+
+def test_closures():
+    f = make_closure(5)
+    fact = make_recursive()
+    f2, fact2 = roundtrip([f, fact])
+    assert f2 is not f
+    assert f2(10) == 15
+    assert fact2 is not fact
+    assert fact2(5) == 120
+    assert fact2.func_globals is fact.func_globals
+
+def test_function_attributes():
+    f = make_closure(5)
+    f._annspecialcase_ = 'specialize:arg(0)'
+    f2 = roundtrip(f)
+    assert f2._annspecialcase_ == 'specialize:arg(0)'
+
+def test_dynamic_class_and_instances():
+    cls = make_class('Foo')
+    a = cls()
+    a.value = a
+    b = cls()
+    b.value = 7
+    old = OldStyle()
+    old.x = old
+    cls2, a2, b2, old2 = roundtrip([cls, a, b, old])
+    assert cls2 is not cls
+    assert cls2.__name__ == 'Foo'
+    assert type(a2) is cls2 and type(b2) is cls2
+    assert a2.get() is a2
+    assert b2.get() == 7
+    assert old2.x is old2
+
+def test_deep_chain():
+    class Node(object):
+        pass
+    head = node = Node()
+    for i in range(50000):
+        node.next = Node()
+        node = node.next
+    node.next = None
+    head2 = roundtrip(head)
+    count = 0
+    while head2 is not None:
+        count += 1
+        head2 = head2.next
+    assert count == 50001
+
+def test_lltype_dict_keys():
+    S = lltype.GcForwardReference()
+    S.become(lltype.GcStruct('S', ('x', lltype.Signed),
+                             ('next', lltype.Ptr(S))))
+    d = {S: 1, lltype.Ptr(S): 2}
+    S2, d2 = roundtrip((S, d))
+    assert S2 is not S and S2 == S
+    assert d2[S2] == 1
+    assert d2[lltype.Ptr(S2)] == 2
+    assert d2[S] == 1
+
+def test_lltype_containers():
+    S = lltype.GcStruct('S', ('x', lltype.Signed))
+    T = lltype.GcStruct('T', ('s', S), ('y', lltype.Signed))
+    A = lltype.GcArray(lltype.Ptr(T))
+    t = lltype.malloc(T)
+    t.s.x = 5
+    t.y = 6
+    a = lltype.malloc(A, 2)
+    a[0] = t
+    a[1] = t
+    a2 = roundtrip(a)
+    assert a2[0].y == 6
+    assert a2[0].s.x == 5
+    assert a2[0] == a2[1]
+    a2[0].s.x = 7
+    assert a2[1].s.x == 7
+    assert t.s.x == 5
+
+def test_flowgraph():
+    from pypy.objspace.flow.model import checkgraph, summary
+    from pypy.objspace.flow.test.test_model import graph, sample_function
+    graph2 = roundtrip(graph)
+    checkgraph(graph2)
+    assert summary(graph2) == summary(graph)
+    assert graph2.func is sample_function
+    assert len(list(graph2.iterblocks())) == len(list(graph.iterblocks()))
+
+def test_externals():
+    marker = object()
+    other = object()
+    obj = [marker, marker, 3]
+    res = roundtrip(obj, {'marker': marker})
+    assert res[0] is marker and res[1] is marker
+    f = StringIO()
+    StatePickler(f, {'marker': marker}).dump(obj)
+    f.seek(0)
+    res = StateUnpickler(f, {'marker': other}).load()
+    assert res == [other, other, 3]
+
+def test_dump_load_file():
+    filename = udir.join('test_dump_load_file.state')
+    dump_state(filename, {'graphs': [make_closure(3)]})
+    state = load_state(filename)
+    assert state['graphs'][0](4) == 7
+    filename.write('garbage\n')
+    py.test.raises(ValueError, load_state, filename)
@@ -43,6 +43,7 @@ class TranslationContext(object):
         self.graphs = []      # [graph]
         self.callgraph = {}   # {opaque_tag: (caller-graph, callee-graph)}
         self._prebuilt_graphs = {}   # only used by the pygame viewer
+        self.flowgraph_cache = None
 
     def create_flowspace_config(self):
         # XXX this is a hack: we create a new config, which is only used
@@ -72,11 +73,22 @@ class TranslationContext(object):
             elif hasattr(self, 'no_annotator_but_do_imports_immediately'):
                 space.do_imports_immediately = (
                     self.no_annotator_but_do_imports_immediately)
-            graph = space.build_flow(func)
-            if self.config.translation.simplifying:
-                simplify.simplify_graph(graph)
-            if self.config.translation.list_comprehension_operations:
-                simplify.detect_list_comprehension(graph)
+            graph = None
+            if self.config.translation.flowgraph_cache:
+                cache = self.get_flowgraph_cache()
+                key = cache.getkey(func, space, (
+                    self.config.translation.simplifying,
+                    self.config.translation.list_comprehension_operations))
+                graph = cache.load(func, key)
+                space.foldlog = []
+            if graph is None:
+                graph = space.build_flow(func)
+                if self.config.translation.simplifying:
+                    simplify.simplify_graph(graph)
+                if self.config.translation.list_comprehension_operations:
+                    simplify.detect_list_comprehension(graph)
+                if space.foldlog is not None:
+                    cache.store(func, key, graph, space.foldlog)
             if self.config.translation.verbose:
                 log.done(func.__name__)
             elif not mute_dot:
@@ -84,6 +96,12 @@ class TranslationContext(object):
             self.graphs.append(graph)   # store the graph in our list
         return graph
 
+    def get_flowgraph_cache(self):
+        if self.flowgraph_cache is None:
+            from pypy.translator.tool.flowcache import FlowGraphCache
+            self.flowgraph_cache = FlowGraphCache()
+        return self.flowgraph_cache
+
     def update_call_graph(self, caller_graph, callee_graph, position_tag):
         # update the call graph
         key = caller_graph, callee_graph, position_tag